@@ -0,0 +1,408 @@
+'''
+Benchmark of the analysis with synthetic RKI files.
+
+Times the stages of the analysis separately (import, download from the local feature service,
+parse, aggregate, delta update, fit, bootstrap, sliding windows, age groups, nowcast, render,
+save, overview, documentation) and optionally the full run.py pipeline for files of a given
+number of rows, counties and days, e.g.
+
+    python benchmark.py --counties 96 400 4000 --days 150 --rows 300000
+    python benchmark.py --pipeline --counties 96 --csv benchmark.csv
+'''
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from cov19_local import (RKISnapshot, ReportingTriangle, CountyFigure, NOWCAST_MAX_DELAY, nowcast, read_RKI_columns, stream_RKI, 
+                         download_RKI, rolling_loglinear_fit, bootstrap_DT, window_statistics, calendar_dates, epoch_days, plot_corona, 
+                         plot_DT, docu)
+from rki_stub import RKIStubServer
+
+HEADER = 'FID,IdBundesland,Bundesland,Landkreis,Altersgruppe,Geschlecht,AnzahlFall,AnzahlTodesfall,Meldedatum,IdLandkreis,Datenstand,NeuerFall,NeuerTodesfall,Refdatum,NeuGenesen,AnzahlGenesen,IstErkrankungsbeginn,Altersgruppe2'
+
+AGE_GROUPS = ['A00-A04', 'A05-A14', 'A15-A34', 'A35-A59', 'A60-A79', 'A80+', 'unbekannt']
+SEXES = ['M', 'W', 'unbekannt']
+
+
+def county_IDs(counties):
+    '''
+    IDs of synthetic counties, distributed over the 16 states (e.g. '09001').
+    '''
+    return ['%02d%03d' % (1 + i % 16, 1 + i // 16) for i in range(counties)]
+
+
+def write_synthetic_RKI(filename, rows, counties, days, start='2020-03-01',
+                        datenstand='26.04.2020, 00:00 Uhr', seed=0, new=0.):
+    '''
+    Writes a synthetic file in the format of the RKI database (July 2020 layout including
+    the quoted ``Datenstand`` column). Every county has at least 8 consecutive days with
+    notifications, the other rows follow an epidemic curve per county.
+
+    Input
+    =====
+
+    filename : str
+            Output csv file
+
+    rows : int
+            Number of rows (at least 8 per county)
+
+    counties : int
+            Number of counties
+
+    days : int
+            Number of days with notifications
+
+    start : str, default = '2020-03-01'
+            First notification day
+
+    datenstand : str, default = '26.04.2020, 00:00 Uhr'
+            Datenstand of all rows
+
+    seed : int, default = 0
+            Seed of the random numbers
+
+    new : float, default = 0.
+            Fraction of the rows flagged as new since the previous Datenstand (NeuerFall,
+            NeuerTodesfall and NeuGenesen 1 instead of 0)
+    '''
+    rng = np.random.RandomState(seed)
+    data = synthetic_rows(rng, rows, counties, days)
+    flag = (rng.rand(len(data['lk'])) < new).astype(int)
+    with open(filename, 'w') as f:
+        f.write(HEADER + '\n')
+        write_synthetic_rows(f, data, flag, counties, days, start=start, datenstand=datenstand)
+
+
+def write_synthetic_update(filename, rows, counties, days, start='2020-03-01',
+                           datenstand='27.04.2020, 00:00 Uhr', seed=0, new=0.01, retracted=0.001,
+                           changes_only=False):
+    '''
+    Writes the file of the Datenstand following the one written by ``write_synthetic_RKI``
+    with the same ``rows``, ``counties``, ``days``, ``start`` and ``seed`` (and ``new`` = 0):
+    the rows of that file unchanged (flags 0), a fraction of them retracted (-1, with negative
+    numbers) and additional rows of the same counties and days as new notifications (1). The
+    numbers of the counties therefore match the ones of the previous file plus the changes,
+    as in the files of the RKI.
+
+    Input
+    =====
+
+    filename, rows, counties, days, start, seed
+            see ``write_synthetic_RKI``
+
+    datenstand : str, default = '27.04.2020, 00:00 Uhr'
+            Datenstand of all rows
+
+    new : float, default = 0.01
+            Number of new rows as fraction of the rows of the previous file
+
+    retracted : float, default = 0.001
+            Fraction of the rows of the previous file retracted
+
+    changes_only : bool, default = False
+            Write only the new and the retracted rows
+    '''
+    rng = np.random.RandomState(seed)
+    data = synthetic_rows(rng, rows, counties, days)
+    previous = len(data['lk'])
+
+    rng = np.random.RandomState(seed + 1)
+    flag = np.zeros(previous, dtype=int)
+    flag[rng.choice(previous, int(round(retracted * previous)), replace=False)] = -1
+    added = rng.randint(0, previous, int(round(new * previous)))
+    data = dict((key, np.concatenate([values, values[added]])) for key, values in data.items())
+    flag = np.concatenate([flag, np.ones(len(added), dtype=int)])
+
+    with open(filename, 'w') as f:
+        f.write(HEADER + '\n')
+        write_synthetic_rows(f, data, flag, counties, days, start=start, datenstand=datenstand,
+                             rows=flag != 0 if changes_only else None)
+
+
+def synthetic_rows(rng, rows, counties, days):
+    '''
+    Random rows of ``counties`` synthetic counties over ``days`` days (see ``write_synthetic_RKI``).
+
+    return
+    ======
+
+    data : dict {'lk', 'day', 'fall', 'tod', 'gesund', 'age', 'sex'}
+            Index of the county, notification day, numbers, age group and sex of the rows
+    '''
+    rows = max(rows, 8 * counties)
+
+    # 8 days per county at the start, the rest with a county dependent epidemic curve
+    lk = np.concatenate([np.repeat(np.arange(counties), 8), rng.randint(0, counties, rows - 8 * counties)])
+    peak = rng.uniform(0.2, 0.6, counties) * days
+    width = rng.uniform(0.05, 0.3, counties) * days
+    day = np.concatenate([np.tile(np.arange(8), counties),
+                          rng.normal(peak[lk[8 * counties:]], width[lk[8 * counties:]])])
+    day = np.clip(np.round(day), 0, days - 1).astype(int)
+
+    fall = rng.geometric(0.6, rows)
+    tod = rng.binomial(fall, 0.04)
+    gesund = np.where(day < days - 14, fall - tod, 0)
+    age = rng.randint(0, len(AGE_GROUPS), rows)
+    sex = rng.randint(0, len(SEXES), rows)
+    return {'lk': lk, 'day': day, 'fall': fall, 'tod': tod, 'gesund': gesund, 'age': age, 'sex': sex}
+
+
+def write_synthetic_rows(f, data, flag, counties, days, start='2020-03-01',
+                         datenstand='26.04.2020, 00:00 Uhr', rows=None):
+    '''
+    Writes the rows of ``synthetic_rows`` with the flags ``flag`` (NeuerFall, and NeuerTodesfall
+    and NeuGenesen of rows with deaths or recovered cases) to the open file ``f``, only the
+    ``rows`` (boolean mask) if given. Retracted rows (-1) get negative numbers.
+    '''
+    IDs = np.array(county_IDs(counties))
+    dates = np.datetime64(start) + np.arange(days)
+    date_str = np.array([str(d).replace('-', '/') + ' 00:00:00' for d in dates])
+
+    sign = np.where(flag == -1, -1, 1)
+    lk, day, age, sex = data['lk'], data['day'], data['age'], data['sex']
+    fall, tod, gesund = [sign * data[key] for key in ['fall', 'tod', 'gesund']]
+    for i in np.flatnonzero(rows) if rows is not None else range(len(lk)):
+        ID = IDs[lk[i]]
+        f.write('%d,%d,Land %d,LK Kreis %s,%s,%s,%d,%d,%s,%s,"%s",%d,%d,%s,%d,%d,0,Nicht uebermittelt\n' % (
+                i + 1, int(ID[:2]), int(ID[:2]), ID, AGE_GROUPS[age[i]], SEXES[sex[i]], fall[i], tod[i],
+                date_str[day[i]], ID, datenstand, flag[i], flag[i] if tod[i] else -9, date_str[day[i]],
+                flag[i] if gesund[i] else -9, gesund[i]))
+
+
+class TimedFigure(CountyFigure):
+    '''
+    ``CountyFigure`` which adds up the time spent for saving the pdf files.
+    '''
+    save_time = 0.
+
+    def save(self, name):
+        t0 = time.time()
+        CountyFigure.save(self, name)
+        self.save_time += time.time() - t0
+
+
+class quiet(object):
+    '''
+    Suppresses the print output of the analysis while timing.
+    '''
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def timed(func, *args, **kwargs):
+    '''
+    Returns the result of ``func`` and the wall time in seconds.
+    '''
+    t0 = time.time()
+    with quiet():
+        result = func(*args, **kwargs)
+    return result, time.time() - t0
+
+
+def synthetic_history(snapshot, datenstand, files=60, max_delay=NOWCAST_MAX_DELAY, seed=0):
+    '''
+    Synthetic earlier files of a snapshot for ``ReportingTriangle``: (Datenstand, ID, days,
+    cases) of the ``files`` days up to ``datenstand``, of the cases of a day ``1 - 0.5 ** d``
+    are known after d days. Only the last ``max_delay + 1`` days of every file are kept.
+    '''
+    rng = np.random.RandomState(seed)
+    cases = np.maximum(snapshot.cube[..., 0], 0)
+    history = []
+    for date in np.datetime64(datenstand, 'D') - np.arange(files)[::-1]:
+        delay = (date - snapshot.days).astype(int)
+        sel = (delay >= 0) & (delay <= max_delay)
+        known = rng.binomial(cases[:, sel], 1 - 0.5 ** delay[sel])
+        history.append((str(date), snapshot.ID, snapshot.days[sel], known))
+    return history
+
+
+def import_time(plot=False, repeat=3):
+    '''
+    Time of ``import cov19_local`` in a new interpreter (best of ``repeat``), with ``plot`` 
+    including the import of matplotlib for the first figure.
+
+    return
+    ======
+
+    seconds : float
+            Import time
+
+    matplotlib : bool
+            Whether matplotlib was imported
+    '''
+    code = ('import sys, time; t0 = time.time(); import cov19_local; %s'
+            'print time.time() - t0, "matplotlib" in sys.modules' % ('cov19_local._pyplot(); ' if plot else ''))
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for i in range(repeat):
+        seconds, loaded = subprocess.check_output([sys.executable, '-c', code], cwd=here).split()
+        best = float(seconds) if best is None else min(best, float(seconds))
+    return best, loaded == 'True'
+
+
+def benchmark(rows, counties, days, render=8, pipeline=False, jobs=1, workdir=None, seed=0):
+    '''
+    Times all stages for one synthetic file.
+
+    return
+    ======
+
+    times : dict
+            Seconds per stage (None if the stage was skipped)
+    '''
+    own_dir = workdir is None
+    if own_dir:
+        workdir = tempfile.mkdtemp(prefix='benchmark_RKI')
+
+    times = {}
+    times['import'], loaded = import_time()
+    if loaded:
+        print 'warning: matplotlib is imported by cov19_local'
+    times['import_plot'] = import_time(plot=True)[0]
+    try:
+        for sub in ['plots', 'expert', 'data_RKI']:
+            if not os.path.isdir(os.path.join(workdir, sub)):
+                os.makedirs(os.path.join(workdir, sub))
+
+        # population numbers for plot_corona
+        population = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data_RKI', '12411-001.csv')
+        shutil.copy(population, os.path.join(workdir, 'data_RKI'))
+
+        filename = os.path.join(workdir, 'data_RKI', 'RKI_COVID19.csv')
+        t0 = time.time()
+        write_synthetic_RKI(filename, rows, counties, days, seed=seed)
+        times['generate'] = time.time() - t0
+        
+        # paged download of the file from the local stand-in of the feature service
+        server = RKIStubServer(filename).start()
+        try:
+            downloaded = os.path.join(workdir, 'download')
+            os.makedirs(downloaded)
+            times['download'] = timed(download_RKI, downloaded, url=server.url, verbose=False)[1]
+        finally:
+            server.stop()
+
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            columns, times['parse'] = timed(read_RKI_columns, filename, cache=False)
+            times['stream'] = timed(stream_RKI, filename, verbose=False)[1]
+            timed(read_RKI_columns, filename)
+            times['parse_cached'] = timed(read_RKI_columns, filename)[1]
+            times['aggregate'] = timed(RKISnapshot._count_columns, columns)[1]
+            snapshot, times['snapshot'] = timed(RKISnapshot, filename, state_name='Germany')
+
+            # changes of the next Datenstand (1% new, 0.1% retracted rows) added to a copy of the snapshot
+            changed = os.path.join(workdir, 'data_RKI', 'RKI_COVID19_next.csv')
+            write_synthetic_update(changed, rows, counties, days, seed=seed)
+            base = timed(RKISnapshot, filename, state_name='Germany')[0]
+            changes, times['update'] = timed(base.update, changed)
+            if changes['reread']:
+                print 'warning: the update read the whole file instead of the changed rows'
+
+            # all rolling fits of all counties at once
+            series, times['regions'] = timed(lambda: [snapshot.county(lkid) for lkid in snapshot.ID])
+            length = max(len(s[1]) for s in series)
+            x = np.full((len(series), length), np.nan)
+            y = np.full((len(series), length), np.nan)
+            for i, s in enumerate(series):
+                x[i, :len(s[1])] = np.arange(len(s[1]))
+                y[i, :len(s[1])] = np.log(s[0]['fall'])
+            times['fit'] = timed(rolling_loglinear_fit, x, y)[1]
+            times['bootstrap'] = timed(bootstrap_DT, x, y, jobs=jobs)[1]
+
+            # sliding windows (means, reproduction numbers, weekly increments) of all counties
+            cum = np.full((len(series), length), np.nan)
+            for i, s in enumerate(series):
+                cum[i, :len(s[1])] = s[0]['fall']
+                x[i, :len(s[1])] = epoch_days(calendar_dates(s[1], s[2]))
+            times['windows'] = timed(window_statistics, cum, x)[1]
+            
+            # doubling times, death rates and incidence of all age groups of all counties
+            times['ages'] = timed(snapshot.ages)[1]
+            
+            # nightly correction of the reporting delay from a history of 60 files
+            # (Datenstand the day after the last notification)
+            datenstand = str(snapshot.days[-1] + 1)
+            history = synthetic_history(snapshot, datenstand, files=60, seed=seed)
+            times['nowcast'] = timed(lambda: nowcast(snapshot.cube[..., 0], snapshot.ID, snapshot.days, datenstand, 
+                                                     ReportingTriangle(history).completeness()))[1]
+
+            if render > 0:
+                figure = TimedFigure(last_day=epoch_days(snapshot.days[-1]))
+                DT = {}
+                t0 = time.time()
+                with quiet():
+                    for lkid in snapshot.ID[:render]:
+                        num, day, month, name = snapshot.county(lkid)[:4]
+                        DT[lkid] = plot_corona(num, day, month, name=name, ID=lkid, figure=figure)
+                times['save'] = figure.save_time
+                times['render'] = time.time() - t0 - figure.save_time
+                times['overview'] = timed(plot_DT, DT, snapshot.state)[1]
+                times['docu'] = timed(docu, list(DT), DT)[1]
+            else:
+                times['render'] = times['save'] = times['overview'] = times['docu'] = None
+        finally:
+            os.chdir(cwd)
+
+        if pipeline:
+            run = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run.py')
+            t0 = time.time()
+            with open(os.devnull, 'w') as null:
+                subprocess.check_call([sys.executable, run, '--germany', '--force', '--jobs', str(jobs), '--input', filename],
+                                      cwd=workdir, stdout=null)
+            times['pipeline'] = time.time() - t0
+        else:
+            times['pipeline'] = None
+    finally:
+        if own_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return times
+
+
+STAGES = ['import', 'import_plot', 'generate', 'download', 'parse', 'stream', 'parse_cached', 'aggregate', 'snapshot', 'update', 'regions', 'fit', 'bootstrap', 'windows', 'ages',
+          'nowcast', 'render', 'save', 'overview', 'docu', 'pipeline']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the analysis with synthetic RKI files.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[30000], help='number of rows (default: 30000)')
+    parser.add_argument('--counties', type=int, nargs='+', default=[96], help='number of counties (default: 96)')
+    parser.add_argument('--days', type=int, nargs='+', default=[120], help='number of days (default: 120)')
+    parser.add_argument('--render', type=int, default=8, help='number of counties plotted (default: 8)')
+    parser.add_argument('--pipeline', action='store_true', help='also time the full run.py pipeline')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='processes of the bootstrap and the run.py pipeline (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data (default: 0)')
+    parser.add_argument('--csv', help='append the results to this csv file')
+    args = parser.parse_args()
+
+    print ' '.join(['%8s' % key for key in ['rows', 'counties', 'days']] + ['%12s' % stage for stage in STAGES])
+    for rows in args.rows:
+        for counties in args.counties:
+            for days in args.days:
+                times = benchmark(rows, counties, days, render=args.render, pipeline=args.pipeline,
+                                  jobs=args.jobs, seed=args.seed)
+
+                values = ['' if times[stage] is None else '%.3f' % times[stage] for stage in STAGES]
+                print ' '.join(['%8d' % n for n in [rows, counties, days]] + ['%12s' % v for v in values])
+                sys.stdout.flush()
+
+                if args.csv:
+                    new = not os.path.isfile(args.csv)
+                    with open(args.csv, 'a') as f:
+                        if new:
+                            f.write(','.join(['time', 'rows', 'counties', 'days'] + STAGES) + '\n')
+                        f.write(','.join([time.strftime('%Y-%m-%dT%H:%M:%S'), str(rows), str(counties), str(days)] + values) + '\n')
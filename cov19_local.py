@@ -1,163 +1,3444 @@
-from pylab import *
+# only numpy is needed for loading, aggregation, fits and metrics; matplotlib is imported
+# when the first figure is created (see ``_pyplot``)
+import numpy as np
+
+###############################
+# Instrumentation (Messungen) #
+###############################
+
+# environment variable enabling the stage trace, value is the output file (*.json or *.csv)
+TRACE_ENV = 'COV19_TRACE'
+
+# fields of a trace record
+TRACE_FIELDS = ('stage', 'county', 'pid', 'start', 'wall', 'cpu', 'maxrss_MB', 'rss_growth_MB')
+
+
+def _maxrss_MB():
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    # ru_maxrss is given in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+class _StageTimer(object):
+    '''
+    Measures consecutive stages of one county: every ``lap`` records the time since the
+    previous lap (or the creation of the timer).
+    '''
+    def __init__(self, trace, county=None):
+        self.trace = trace
+        self.county = county
+        self._reset()
+
+    def _reset(self):
+        import os
+        import time
+
+        self.t0 = time.time()
+        self.cpu0 = sum(os.times()[:2])
+        self.rss0 = _maxrss_MB()
+
+    def lap(self, stage):
+        import os
+        import time
+
+        rss = _maxrss_MB()
+        self.trace.records.append({'stage': stage, 'county': self.county, 'pid': os.getpid(),
+                                   'start': self.t0, 'wall': time.time() - self.t0,
+                                   'cpu': sum(os.times()[:2]) - self.cpu0,
+                                   'maxrss_MB': rss, 'rss_growth_MB': rss - self.rss0})
+        self._reset()
+
+
+class _NullTimer(object):
+    def lap(self, stage):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+class StageTrace(object):
+    '''
+    Records wall time, CPU time and peak memory (maximum resident set size of the process)
+    of the stages of the analysis (parse, aggregate, fit, draw, save, overview, ...) per
+    county. A disabled trace hands out a timer that does nothing.
+
+    Input
+    =====
+
+    enabled : bool, default = None
+                Record the stages (default: if the environment variable ``TRACE_ENV`` is set).
+
+    Usage
+    =====
+
+    timer = TRACE.timer('09182')
+    ...
+    timer.lap('fit')
+    ...
+    timer.lap('save')
+    '''
+    def __init__(self, enabled=None):
+        import os
+
+        if enabled is None:
+            enabled = bool(os.environ.get(TRACE_ENV))
+        self.enabled = enabled
+        self.records = []
+
+    def timer(self, county=None):
+        '''
+        Returns a timer for the stages of a county (or of the whole run).
+        '''
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, county)
+
+    def pop(self):
+        '''
+        Returns and removes the recorded stages, e.g. to send them from a worker process.
+        '''
+        records, self.records = self.records, []
+        return records
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def write(self, filename):
+        '''
+        Writes the records to a json or csv file (by the extension of ``filename``).
+        '''
+        import csv
+        import json
+
+        if filename.endswith('.csv'):
+            with open(filename, 'w') as f:
+                writer = csv.DictWriter(f, TRACE_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.records)
+        else:
+            with open(filename, 'w') as f:
+                json.dump({'fields': TRACE_FIELDS, 'records': self.records}, f, indent=1)
+
+    def summary(self):
+        '''
+        Table of the recorded stages: number, total and mean wall time, total CPU time, the
+        slowest county and the peak memory.
+        '''
+        stages = []
+        for record in self.records:
+            if record['stage'] not in stages:
+                stages.append(record['stage'])
+
+        lines = ['%-14s %6s %10s %10s %10s %10s  %-24s %10s' % ('stage', 'n', 'wall [s]', 'cpu [s]',
+                 'mean [s]', 'max [s]', 'slowest', 'peak [MB]')]
+        for stage in stages:
+            records = [r for r in self.records if r['stage'] == stage]
+            wall = sum([r['wall'] for r in records])
+            slowest = max(records, key=lambda r: r['wall'])
+            lines.append('%-14s %6d %10.3f %10.3f %10.3f %10.3f  %-24s %10.0f' % (
+                         stage, len(records), wall, sum([r['cpu'] for r in records]), wall / len(records),
+                         slowest['wall'], slowest['county'] or '', max([r['maxrss_MB'] for r in records])))
+        return '\n'.join(lines)
+
+# trace of this process
+TRACE = StageTrace()
+
+
+#########################
+# Calendar (Kalender)   #
+#########################
+
+# day 0 of the time axis of the plots and metrics (March time frame: 1 = 1 March 2020)
+EPOCH = np.datetime64('2020-02-29', 'D')
+
+# month 1 of the month numbers of ``load_RKI`` (13 = January 2021)
+MONTH_EPOCH = np.datetime64('2020-01', 'M')
+
+# month labels of the county plots and of the overviews
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'Mai', 'Juni', 'Juli', 'Aug', 'Sep', 'Okt', 'Nov', 'Dez']
+MONTH_NAMES_DE_EN = ['Januar/January', 'Februar/February', 'Maerz/March', 'April', 'Mai/May', 'Juni/June',
+                     'Juli/July', 'August', 'September', 'Oktober/October', 'November', 'Dezember/December']
+
+# time axis of the plots: first day shown and minimum length (14 March to 28 July 2020)
+AXIS_DAY_MIN = 13
+AXIS_DAY_MAX = 150.
+
+
+def parse_RKI_dates(dates):
+    '''
+    Converts dates of the RKI files at once to ``datetime64[D]``. Accepts the formats
+    'YYYY/MM/DD hh:mm:ss' (2020), 'YYYY-MM-DD' and ISO 8601 'YYYY-MM-DDThh:mm:ss.sssZ';
+    only the first 10 characters are used.
+    '''
+    dates = np.asarray(dates)
+    if dates.dtype.kind == 'M':
+        return dates.astype('datetime64[D]')
+    return np.char.replace(dates.astype('S10'), '/', '-').astype('datetime64[D]')
+
+
+def epoch_days(dates):
+    '''
+    Days since ``EPOCH`` (1 = 1 March 2020) of dates (``datetime64`` or strings, see
+    ``parse_RKI_dates``) as float array.
+    '''
+    return (parse_RKI_dates(dates) - EPOCH).astype(float)
+
+
+def epoch_dates(days):
+    '''
+    Dates (``datetime64[D]``) of days since ``EPOCH``, inverse of ``epoch_days``.
+    '''
+    return EPOCH + np.floor(np.asarray(days, dtype=float)).astype(int).astype('timedelta64[D]')
+
+
+def day_month(dates):
+    '''
+    Day of the month and month number (1 = January 2020, 13 = January 2021) of the dates
+    as float arrays, the format of ``load_RKI``.
+    '''
+    months = dates.astype('datetime64[M]')
+    day = (dates - months.astype('datetime64[D]')).astype(int) + 1
+    month = (months - MONTH_EPOCH).astype(int) + 1
+    return day.astype(float), month.astype(float)
+
+
+def calendar_dates(day, month):
+    '''
+    Dates (``datetime64[D]``) of day of the month and month number, inverse of ``day_month``.
+    '''
+    months = MONTH_EPOCH + (np.asarray(month).astype(int) - 1).astype('timedelta64[M]')
+    return months.astype('datetime64[D]') + (np.asarray(day).astype(int) - 1).astype('timedelta64[D]')
+
+
+def date_label(day, fmt='%d.%m'):
+    '''
+    Label of a day since ``EPOCH``, e.g. '20.07'.
+    '''
+    return epoch_dates(day).astype(object).strftime(fmt)
+
+
+def axis_day_max(last_day):
+    '''
+    End of the time axis for data up to ``last_day`` (days since ``EPOCH``), at least
+    ``AXIS_DAY_MAX``.
+    '''
+    return max(AXIS_DAY_MAX, float(np.ceil(last_day)) + 5)
+
+
+def _tick_step(day_max, day_min=AXIS_DAY_MIN):
+    # 1 for the default axis, 2, 3, ... for longer axes
+    return max(int(np.ceil((day_max - day_min - 1) / (AXIS_DAY_MAX - day_min - 1))), 1)
+
+
+def day_ticks(day_max, day_min=AXIS_DAY_MIN):
+    '''
+    Ticks of the time axis and their labels (day of the month): every 4th day from the
+    day after ``day_min``, every 8th, 12th, ... day for longer axes.
+
+    return
+    ======
+
+    ticks : np.array
+            Days since ``EPOCH``
+
+    labels : list of str
+    '''
+    ticks = np.arange(day_min + 1, day_max, 4 * _tick_step(day_max, day_min))
+    day = day_month(epoch_dates(ticks))[0]
+    return ticks, ['%d' % d for d in day]
+
+
+def month_ticks(day_max, names=MONTH_NAMES, day_min=AXIS_DAY_MIN):
+    '''
+    Positions of the month labels of the time axis (last day of the previous month, the
+    first label at the start of the axis) and the names of the months: every month, every 
+    2nd, 3rd, ... month for longer axes. The first label of a new year contains the year.
+
+    return
+    ======
+
+    positions : np.array
+            Days since ``EPOCH``
+
+    labels : list of str
+    '''
+    first = epoch_dates(day_min).astype('datetime64[M]')
+    last = epoch_dates(day_max).astype('datetime64[M]')
+    months = np.arange(first, last + 1, _tick_step(day_max, day_min))
+    positions = epoch_days(months.astype('datetime64[D]')) - 1
+    positions[0] = day_min
+    sel = positions < day_max
+
+    labels = []
+    year = months[0].astype(object).year
+    for m in months[sel].astype(object):
+        labels.append(names[m.month - 1] + ('' if m.year == year else ' ' + str(m.year)))
+        year = m.year
+    return positions[sel], labels
 
 ####################################
 # Load of Input Data (Daten laden) #
 ####################################
 
-def load_RKI(filename, LandkreisID, state_name ='Bavaria'):  
+# columns of the RKI csv file used for the analysis
+RKI_COLUMNS = {'names': ('lkID', 'lk_name', 'datum', 'fall', 'tod', 'gesund', 'alter', 'geschlecht', 
+                         'neuer_fall', 'neuer_tod', 'neu_genesen'), 
+               'formats': ('S6', 'S40', 'S10', 'i4', 'i4', 'i4', 'i1', 'i1', 'i1', 'i1', 'i1'), 
+               'usecols': (9, 3, 8, 6, 7, -3, 4, 5, -7, -6, -4)}
+
+# categories of Altersgruppe and Geschlecht, stored as their position in the tuple;
+# other entries are counted as 'unbekannt' (last category)
+AGE_GROUPS = ('A00-A04', 'A05-A14', 'A15-A34', 'A35-A59', 'A60-A79', 'A80+', 'unbekannt')
+SEXES = ('M', 'W', 'unbekannt')
+RKI_CATEGORIES = {'alter': AGE_GROUPS, 'geschlecht': SEXES}
+
+# flags of the numbers compared to the previous Datenstand (NeuerFall, NeuerTodesfall, NeuGenesen):
+# 0 = in both files, 1 = only in this file (new), -1 = only in the previous file (retracted, 
+# given as negative numbers), -9 = in neither (e.g. no death)
+RKI_FLAGS = {'fall': 'neuer_fall', 'tod': 'neuer_tod', 'gesund': 'neu_genesen'}
+COUNTED_FLAGS = (0, 1)
+CHANGED_FLAGS = (-1, 1)
+
+# reporting delay (Meldeverzug, see ``ReportingTriangle``): days after which the cases of a 
+# notification day are taken as complete, complete days and resamples used for the 
+# correction of the last days, groups of counties sharing one reporting delay (each state, 
+# each county or all counties)
+NOWCAST_MAX_DELAY = 14
+NOWCAST_WINDOW = 28
+NOWCAST_RESAMPLES = 500
+NOWCAST_GROUPS = ('state', 'county', 'all')
+
+# binary cache of the parsed csv files (Zwischenspeicher), kept next to the csv files
+CACHE_DIR = '.cache_RKI'
+CACHE_MAX_ENTRIES = 30
+
+# names of the states (IdBundesland), used for the file names of the overviews
+STATE_NAMES = {1: 'Schleswig-Holstein', 2: 'Hamburg', 3: 'Lower-Saxony', 4: 'Bremen', 
+               5: 'North-Rhine-Westphalia', 6: 'Hesse', 7: 'Rhineland-Palatinate', 8: 'Baden-Wuerttemberg', 
+               9: 'Bavaria', 10: 'Saarland', 11: 'Berlin', 12: 'Brandenburg', 
+               13: 'Mecklenburg-Western-Pomerania', 14: 'Saxony', 15: 'Saxony-Anhalt', 16: 'Thuringia'}
+
+# column of the state ID (IdBundesland) and number of lines read at once in streaming mode
+RKI_STATE_COLUMN = 1
+STREAM_CHUNK_ROWS = 20000
+
+
+def _sha1_file(filename):
+    import hashlib
+    
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def category_codes(categories):
+    '''
+    Converter of the entries of a categorical column (e.g. ``AGE_GROUPS``) to their position 
+    in ``categories``; unknown entries get the last position.
+    '''
+    codes = dict((name, i) for i, name in enumerate(categories))
+    unknown = len(categories) - 1
+    return lambda entry: codes.get(entry, unknown)
+
+
+def parse_RKI_columns(lines, skiprows=0):
+    '''
+    Parses the columns of ``RKI_COLUMNS`` of a csv file (file name or list of lines) with the 
+    categorical columns (``RKI_CATEGORIES``) encoded as small integer codes.
+    
+    return
+    ======
+    
+    columns : dict {'lkID', 'lk_name', 'datum', 'fall', 'tod', 'gesund', 'alter', 'geschlecht', 
+                    'neuer_fall', 'neuer_tod', 'neu_genesen'}
+            Arrays of the columns
+    '''
+    import numpy as np
+    
+    dtype = {'names': RKI_COLUMNS['names'], 'formats': RKI_COLUMNS['formats']}
+    if isinstance(lines, list) and not lines:
+        parsed = np.zeros(0, dtype=dtype)
+        return dict((name, parsed[name]) for name in RKI_COLUMNS['names'])
+    
+    converters = dict((col, category_codes(RKI_CATEGORIES[name])) 
+                      for name, col in zip(RKI_COLUMNS['names'], RKI_COLUMNS['usecols']) if name in RKI_CATEGORIES)
+    daten_RKI = np.loadtxt(lines, 
+                           skiprows=skiprows, 
+                           delimiter=',', 
+                           ndmin=1, 
+                           usecols=RKI_COLUMNS['usecols'],
+                           converters=converters, 
+                           dtype=dtype)
+    return dict((name, daten_RKI[name]) for name in RKI_COLUMNS['names'])
+
+
+def clean_RKI_cache(cache_dir, max_entries=CACHE_MAX_ENTRIES):
+    '''
+    Removes cache entries of csv files which do not exist anymore, unfinished entries and, 
+    if there are still more than ``max_entries`` left, the least recently used ones.
+    
+    Input
+    =====
+    
+    cache_dir : str
+                path to the cache directory.
+    
+    max_entries : int, default = CACHE_MAX_ENTRIES
+                Maximum number of cached files.
+    '''
+    import os
+    import json
+    import shutil
+    import time
+    
+    if not os.path.isdir(cache_dir):
+        return
+    
+    entries = []
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        meta_file = os.path.join(path, 'meta.json')
+        
+        # leftovers of interrupted writes
+        if entry.startswith('tmp'):
+            if time.time() - os.path.getmtime(path) > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+            continue
+        
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        
+        if not os.path.isfile(meta['source']):
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        entries.append((os.path.getmtime(meta_file), path))
+    
+    # least recently used first
+    entries.sort()
+    for used, path in entries[:max(len(entries) - max_entries, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def read_RKI_columns(filename, cache=True, max_entries=CACHE_MAX_ENTRIES):
+    '''
+    Reads the columns of the RKI database used for the analysis (see ``RKI_COLUMNS``). 
+    
+    The parsed columns are stored as binary ``*.npy`` files in the directory ``CACHE_DIR`` 
+    next to the csv file. As long as size, modification time or SHA1 hash of the csv file 
+    match the cache entry, the columns are loaded memory-mapped from there instead of 
+    parsing the csv file again.
+    
+    Input
+    =====
+    
+    filename : str
+                path to '*.csv' file downloaded from the RKI.
+    
+    cache : bool, default = True
+                Use and write the binary cache.
+    
+    max_entries : int, default = CACHE_MAX_ENTRIES
+                Maximum number of csv files kept in the cache.
+    
+    return
+    ======
+    
+    columns : dict of np.array (see ``parse_RKI_columns``)
+            Arrays of the columns (read only if loaded from the cache)
+    '''
+    import os
+    import json
+    import shutil
+    import tempfile
+    import numpy as np
+    
+    if not cache:
+        return parse_RKI_columns(filename, skiprows=1)
+    
+    source = os.path.abspath(filename)
+    stat = os.stat(source)
+    cache_dir = os.path.join(os.path.dirname(source), CACHE_DIR)
+    entry = os.path.join(cache_dir, os.path.basename(source))
+    meta_file = os.path.join(entry, 'meta.json')
+    columns = [list(RKI_COLUMNS[key]) for key in ('names', 'formats', 'usecols')]
+    
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+    except (IOError, OSError, ValueError):
+        meta = None
+    
+    if meta is not None and meta['columns'] == columns and meta['size'] == stat.st_size:
+        valid = meta['mtime'] == stat.st_mtime
+        if not valid and meta['sha1'] == _sha1_file(source):
+            # same content, only touched
+            meta['mtime'] = stat.st_mtime
+            with open(meta_file, 'w') as f:
+                json.dump(meta, f)
+            valid = True
+        if valid:
+            os.utime(meta_file, None)
+            return dict((name, np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')) 
+                        for name in RKI_COLUMNS['names'])
+    
+    data = parse_RKI_columns(filename, skiprows=1)
+    
+    # write to a temporary directory first, so that readers never see a half written entry
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            pass
+    tmp = tempfile.mkdtemp(prefix='tmp', dir=cache_dir)
+    for name in RKI_COLUMNS['names']:
+        np.save(os.path.join(tmp, name + '.npy'), data[name])
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'source': source, 'size': stat.st_size, 'mtime': stat.st_mtime, 
+                   'sha1': _sha1_file(source), 'columns': columns}, f)
+    shutil.rmtree(entry, ignore_errors=True)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # written concurrently by another process
+        shutil.rmtree(tmp, ignore_errors=True)
+    
+    clean_RKI_cache(cache_dir, max_entries=max_entries)
+    return data
+
+
+def datenstand_date(datenstand):
+    '''
+    Date ('YYYY-MM-DD') of an entry of the column Datenstand.
+    '''
+    # '26.04.2020, 00:00 Uhr' or '26.04.2020 00:00'
+    d, m, y = datenstand[:10].split('.')
+    return y + '-' + m + '-' + d
+
+
+def read_datenstand(filename):
+    '''
+    Datenstand ('YYYY-MM-DD') of a file of the RKI database, read from its first row.
+    '''
+    import csv
+
+    with open(filename) as f:
+        reader = csv.reader(f)
+        header = [name.replace('\xef\xbb\xbf', '') for name in next(reader)]
+        for row in reader:
+            return datenstand_date(row[header.index('Datenstand')])
+    raise ValueError('No rows in ' + filename)
+
+
+def read_RKI_changes(filename, totals=False):
+    '''
+    Reads only the rows of a file of the RKI database whose numbers changed since the previous 
+    Datenstand (new or retracted, ``CHANGED_FLAGS`` in one of the ``RKI_FLAGS`` columns). The 
+    other lines are skipped by their flags without parsing them.
+    
+    Input
+    =====
+    
+    filename : str
+                path to '*.csv' file downloaded from the RKI (complete or only the changed rows).
+    
+    totals : bool, default = False
+                Also add up the counted numbers (``COUNTED_FLAGS``) of every county over all 
+                lines (split, but not parsed into columns), see ``RKISnapshot._county_totals``.
+    
+    return
+    ======
+    
+    columns : dict of np.array
+            Columns of the changed rows (see ``parse_RKI_columns``)
+    
+    totals : dict {'lkID', 'total', 'complete'}
+            Only with ``totals``: sorted county IDs, their numbers (county x {fall, tod, gesund}) 
+            and whether the file has unchanged rows too
+    '''
+    import numpy as np
+    
+    usecols = dict(zip(RKI_COLUMNS['names'], RKI_COLUMNS['usecols']))
+    # the flags are counted from the end of the line (behind the quoted Datenstand)
+    i_flags = [usecols[RKI_FLAGS[field]] for field in RKISnapshot.CUBE_FIELDS]
+    nsplit = -min(i_flags)
+    changed = set(str(flag) for flag in CHANGED_FLAGS)
+    
+    if not totals:
+        with open(filename) as f:
+            f.readline()
+            lines = [line for line in f if any(line.rsplit(',', nsplit)[i] in changed for i in i_flags)]
+        return parse_RKI_columns(lines)
+    
+    i_ID = usecols['lkID']
+    width = int(RKI_COLUMNS['formats'][RKI_COLUMNS['names'].index('lkID')][1:])
+    i_counted = [(usecols[field], usecols[RKI_FLAGS[field]]) for field in RKISnapshot.CUBE_FIELDS]
+    counted = set(str(flag) for flag in COUNTED_FLAGS)
+    
+    lines, county_total, complete = [], {}, False
+    with open(filename) as f:
+        f.readline()
+        for line in f:
+            row = line.split(',')
+            if any(row[i] in changed for i in i_flags):
+                lines.append(line)
+            else:
+                complete = True
+            lkid = row[i_ID][:width]
+            total = county_total.get(lkid)
+            if total is None:
+                total = county_total[lkid] = [0] * len(i_counted)
+            for k, (i_value, i_flag) in enumerate(i_counted):
+                if row[i_flag] in counted:
+                    total[k] += int(row[i_value])
+    
+    ID = np.array(sorted(county_total), dtype=RKI_COLUMNS['formats'][RKI_COLUMNS['names'].index('lkID')])
+    total = np.array([county_total[i] for i in ID], dtype=np.int64).reshape(len(ID), len(i_counted))
+    return parse_RKI_columns(lines), {'lkID': ID, 'total': total, 'complete': complete}
+
+
+def stream_RKI(filename, state_ID=None, county_IDs=None, chunk_rows=STREAM_CHUNK_ROWS, verbose=True):
+    '''
+    Reads a file of the RKI database (e.g. the nationwide ``RKI_COVID19.csv``) in chunks of 
+    ``chunk_rows`` lines and adds up the notifications per county and notification date while 
+    reading. Rows of other states or counties and retracted numbers (only in the previous 
+    Datenstand, see ``RKI_FLAGS``) are skipped. The memory needed depends only on the number 
+    of counties and days, not on the length of the file.
+    
+    Input
+    =====
+    
+    filename : str
+                path to '*.csv' file downloaded from the RKI.
+    
+    state_ID : int, default = None
+                Only rows with this IdBundesland, e.g. 9 for Bavaria (default: all states).
+    
+    county_IDs : list of str, default = None
+                Only rows of these counties (IdLandkreis, default: all counties).
+    
+    chunk_rows : int, default = STREAM_CHUNK_ROWS
+                Number of lines processed at once.
+    
+    verbose : bool, default = True
+                Print throughput and peak memory (RSS).
+    
+    return
+    ======
+    
+    counts : dict {'lkID', 'lk_name', 'datum', 'rows', 'daily', 'strata'}
+            Sorted county IDs with their names, sorted notification dates, number of rows 
+            with cases (county x date), sum of the daily numbers (county x date x {fall, tod, gesund}) 
+            and the same per age group and sex (county x date x age x sex x {fall, tod, gesund})
+    '''
+    import os
+    import time
+    import itertools
+    from array import array
+    import numpy as np
+    
+    usecols = dict(zip(RKI_COLUMNS['names'], RKI_COLUMNS['usecols']))
+    i_ID, i_name, i_datum = usecols['lkID'], usecols['lk_name'], usecols['datum']
+    i_values = [usecols[field] for field in RKISnapshot.CUBE_FIELDS]
+    i_flags = [usecols[RKI_FLAGS[field]] for field in RKISnapshot.CUBE_FIELDS]
+    counted = set(str(flag) for flag in COUNTED_FLAGS)
+    i_age, i_sex = usecols['alter'], usecols['geschlecht']
+    age_code, sex_code = category_codes(AGE_GROUPS), category_codes(SEXES)
+    nstrata = len(AGE_GROUPS) * len(SEXES)
+    # strings are cut to the width of their column format like in ``read_RKI_columns``
+    width = dict((name, int(fmt[1:])) for name, fmt in zip(RKI_COLUMNS['names'], RKI_COLUMNS['formats']) 
+                 if fmt.startswith('S'))
+    state_str = None if state_ID is None else str(int(state_ID))
+    county_set = None if county_IDs is None else set(county_IDs)
+    
+    lk_pos, lk_names, date_pos = {}, [], {}
+    
+    # accumulators (county x date and county x date x age x sex x {fall, tod, gesund}), 
+    # enlarged when needed
+    acc_rows = np.zeros((64, 256), dtype=np.int64)
+    acc = np.zeros((64, 256, len(AGE_GROUPS), len(SEXES), len(i_values)), dtype=np.int32)
+    
+    t0 = time.time()
+    nrows = 0
+    with open(filename) as f:
+        f.readline()
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                break
+            nrows += len(lines)
+            
+            # positions and values of the selected rows (compact C arrays, no python objects)
+            lk_index, date_index, stratum, row_weight, values = array('l'), array('l'), array('l'), array('l'), array('l')
+            for line in lines:
+                row = line.split(',')
+                if state_str is not None and row[RKI_STATE_COLUMN] != state_str:
+                    continue
+                lkid = row[i_ID][:width['lkID']]
+                if county_set is not None and lkid not in county_set:
+                    continue
+                if lkid not in lk_pos:
+                    lk_pos[lkid] = len(lk_pos)
+                    lk_names.append(row[i_name][:width['lk_name']])
+                datum = row[i_datum][:width['datum']]
+                if datum not in date_pos:
+                    date_pos[datum] = len(date_pos)
+                lk_index.append(lk_pos[lkid])
+                date_index.append(date_pos[datum])
+                stratum.append(age_code(row[i_age]) * len(SEXES) + sex_code(row[i_sex]))
+                # numbers of the current Datenstand only (not the retracted ones)
+                flags = [row[i] in counted for i in i_flags]
+                row_weight.append(int(flags[0]))
+                values.extend([int(row[i]) if flag else 0 for i, flag in zip(i_values, flags)])
+            if not lk_index:
+                continue
+            
+            nlk, ndate = len(lk_pos), len(date_pos)
+            if nlk > acc.shape[0] or ndate > acc.shape[1]:
+                # double only the axis which is too short
+                shape = [m if n <= m else max(n, 2 * m) for n, m in zip((nlk, ndate), acc.shape)]
+                grown = np.zeros(tuple(shape), dtype=acc_rows.dtype)
+                grown[:acc.shape[0], :acc.shape[1]] = acc_rows
+                acc_rows = grown
+                grown = np.zeros(tuple(shape) + acc.shape[2:], dtype=acc.dtype)
+                grown[:acc.shape[0], :acc.shape[1]] = acc
+                acc = grown
+            
+            lk_index = np.frombuffer(lk_index, dtype=np.dtype('l'))
+            date_index = np.frombuffer(date_index, dtype=np.dtype('l'))
+            stratum = np.frombuffer(stratum, dtype=np.dtype('l'))
+            row_weight = np.frombuffer(row_weight, dtype=np.dtype('l'))
+            values = np.frombuffer(values, dtype=np.dtype('l')).reshape(-1, len(i_values))
+            cell = lk_index * ndate + date_index
+            acc_rows[:nlk, :ndate] += np.bincount(cell, weights=row_weight, 
+                                                  minlength=nlk * ndate).reshape(nlk, ndate).astype(np.int64)
+            cell = cell * nstrata + stratum
+            shape = (nlk, ndate) + acc.shape[2:4]
+            for k in range(len(i_values)):
+                acc[:nlk, :ndate, ..., k] += np.bincount(cell, weights=values[:, k], 
+                                                         minlength=nlk * ndate * nstrata).reshape(shape).astype(np.int32)
+    
+    # sorted like np.unique of the parsed columns
+    ID = np.array(sorted(lk_pos))
+    datum = np.array(sorted(date_pos))
+    lk_order = np.array([lk_pos[i] for i in ID], dtype=int)
+    date_order = np.array([date_pos[d] for d in datum], dtype=int)
+    if len(ID):
+        acc_rows = acc_rows[lk_order[:, None], date_order[None, :]]
+        acc = acc[lk_order[:, None], date_order[None, :]]
+    else:
+        acc_rows, acc = acc_rows[:0, :0], acc[:0, :0]
+    
+    if verbose:
+        dt = max(time.time() - t0, 1e-9)
+        size = os.path.getsize(filename) / 1e6
+        print 'streamed %s: %d rows (%.1f MB) in %.1f s, %.0f rows/s, %.1f MB/s, peak RSS %.0f MB' % (
+              filename, nrows, size, dt, nrows / dt, size / dt, _maxrss_MB())
+    
+    return {'lkID': ID, 'lk_name': np.array([lk_names[i] for i in lk_order]), 'datum': datum, 
+            'rows': acc_rows, 'daily': acc.sum(axis=(2, 3), dtype=np.int64), 'strata': acc}
+
+
+class RKISnapshot(object):
+    '''
+    Reads one file of the RKI database once and aggregates it into a dense cube of daily 
+    numbers (county x calendar day x {fall, tod, gesund}). The data of every county and the 
+    cumulative case numbers of the state are sliced from this cube without touching the 
+    file again. The changes of the following files can be added with ``update``.
+    
+    Input
+    =====
+    
+    filename : str
+                path to '*.csv' file downloaded from the RKI or to an archive (``RKIArchive``).
+    
+    state_name : str, default = 'Bavaria'
+                Name of the state.
+    
+    cache : bool, default = True
+                Use the binary cache of the parsed csv file (see ``read_RKI_columns``).
+    
+    stream : bool, default = False
+                Read the file in chunks with ``stream_RKI`` instead of parsing all columns at 
+                once (bounded memory for the nationwide file, no binary cache).
+    
+    state_ID, county_IDs, chunk_rows : 
+                Filters and chunk size of the streaming mode (see ``stream_RKI``).
+    
+    date : str, default = None
+                Datenstand ('YYYY-MM-DD') of the archived file (default: latest), if 
+                ``filename`` is an archive.
+    
+    Attributes
+    ==========
+    
+    ID : np.array
+            IDs of the counties (sorted), first axis of ``cube``
+    
+    days : np.array (datetime64[D])
+            Contiguous calendar days from the first to the last notification, second axis of ``cube``
+    
+    cube : np.array (int32), shape (len(ID), len(days), 3)
+            Daily notified cases, deaths and recovered cases (``CUBE_FIELDS``); 
+            zero on days without notification
+    
+    strata : np.array (int32), shape (len(ID), len(days), len(AGE_GROUPS), len(SEXES), 3)
+            ``cube`` by age group and sex (Altersgruppe, Geschlecht)
+    
+    rows : np.array (int32), shape (len(ID), len(days))
+            Number of rows with cases of the county in the file
+    
+    reported : np.array (bool), shape (len(ID), len(days))
+            True for days with at least one entry of the county in the file
+    
+    datenstand : str
+            Datenstand of the file ('YYYY-MM-DD')
+    
+    '''
+    
+    CUBE_FIELDS = ('fall', 'tod', 'gesund')
+    
+    def __init__(self, filename, state_name='Bavaria', cache=True, stream=False, state_ID=None, county_IDs=None, 
+                 chunk_rows=STREAM_CHUNK_ROWS, date=None):
+        import os
+        import numpy as np
+        
+        self.filename = filename
+        self.state_name = state_name
+        
+        timer = TRACE.timer()
+        if os.path.isdir(filename):
+            archive = RKIArchive(filename)
+            columns = archive.columns(date)
+            self.datenstand = date or archive.dates()[-1]
+        elif stream:
+            counts = stream_RKI(filename, state_ID=state_ID, county_IDs=county_IDs, chunk_rows=chunk_rows)
+        else:
+            columns = read_RKI_columns(filename, cache=cache)
+        if not os.path.isdir(filename):
+            self.datenstand = read_datenstand(filename)
+        timer.lap('parse')
+
+        if os.path.isdir(filename) or not stream:
+            counts = self._count_columns(columns)
+        
+        # filters of the rows added by ``update``
+        self._filters = (state_ID, county_IDs) if stream else (None, None)
+        self._stream = stream
+        
+        self.ID = counts['lkID'][:0]
+        self.lk_name = counts['lk_name'][:0]
+        self.days = np.zeros(0, dtype='datetime64[D]')
+        self.rows = np.zeros((0, 0), dtype=np.int32)
+        self.strata = np.zeros((0, 0, len(AGE_GROUPS), len(SEXES), len(self.CUBE_FIELDS)), dtype=np.int32)
+        self.cube = np.zeros((0, 0, len(self.CUBE_FIELDS)), dtype=np.int32)
+        self._add(counts)
+        timer.lap('aggregate')
+    
+    @classmethod
+    def _count_columns(cls, daten_RKI, flags=COUNTED_FLAGS):
+        '''
+        Number of rows and sum of the daily numbers per county and notification date of the 
+        parsed columns (same output as ``stream_RKI``). Only numbers with one of the ``flags`` 
+        (``RKI_FLAGS``) are counted, rows retracted since the previous Datenstand (-1) negative.
+        '''
+        import numpy as np
+        
+        # group rows by county and date
+        ID, lk_index, lk_inverse = np.unique(daten_RKI['lkID'], return_index=True, return_inverse=True)
+        udate, date_inverse = np.unique(daten_RKI['datum'], return_inverse=True)
+        
+        ncells = len(ID) * len(udate)
+        cell = lk_inverse * len(udate) + date_inverse
+        case_flag = daten_RKI[RKI_FLAGS['fall']]
+        row_weight = np.in1d(case_flag, flags) * np.where(case_flag == -1, -1, 1)
+        rows = np.bincount(cell, weights=row_weight, minlength=ncells).reshape(len(ID), len(udate)).astype(np.int64)
+        
+        # and by age group and sex (codes of the columns)
+        shape = (len(ID), len(udate), len(AGE_GROUPS), len(SEXES))
+        cell = (cell * len(AGE_GROUPS) + daten_RKI['alter']) * len(SEXES) + daten_RKI['geschlecht']
+        strata = np.empty(shape + (len(cls.CUBE_FIELDS),), dtype=np.int32)
+        for k, field in enumerate(cls.CUBE_FIELDS):
+            values = np.where(np.in1d(daten_RKI[RKI_FLAGS[field]], flags), daten_RKI[field], 0)
+            strata[..., k] = np.bincount(cell, weights=values, minlength=ncells * shape[2] * shape[3]).reshape(shape)
+        
+        return {'lkID': ID, 'lk_name': daten_RKI['lk_name'][lk_index], 'datum': udate, 'rows': rows, 
+                'daily': strata.sum(axis=(2, 3), dtype=np.int64), 'strata': strata}
+    
+    @classmethod
+    def _county_totals(cls, daten_RKI):
+        '''
+        Counted numbers (``COUNTED_FLAGS``) of every county in the parsed columns and whether 
+        they are those of a complete file (not only rows changed since the previous Datenstand).
+        
+        return
+        ======
+        
+        totals : dict {'lkID', 'total', 'complete'}
+                Sorted county IDs, their numbers (county x {fall, tod, gesund}) and True if 
+                some row is unchanged (no ``CHANGED_FLAGS``)
+        '''
+        import numpy as np
+        
+        ID, lk_inverse = np.unique(daten_RKI['lkID'], return_inverse=True)
+        total = np.empty((len(ID), len(cls.CUBE_FIELDS)), dtype=np.int64)
+        changed = np.zeros(len(lk_inverse), dtype=bool)
+        for k, field in enumerate(cls.CUBE_FIELDS):
+            flag = daten_RKI[RKI_FLAGS[field]]
+            values = np.where(np.in1d(flag, COUNTED_FLAGS), daten_RKI[field], 0)
+            total[:, k] = np.bincount(lk_inverse, weights=values, minlength=len(ID))
+            changed |= np.in1d(flag, CHANGED_FLAGS)
+        return {'lkID': ID, 'total': total, 'complete': not changed.all()}
+    
+    def _add(self, counts):
+        '''
+        Adds the numbers of ``counts`` (see ``_count_columns``) to the cube, extending the 
+        counties and the calendar days if needed, and updates the state and the county names.
+        '''
+        import numpy as np
+        
+        if not len(counts['lkID']):
+            return
+        
+        udays = parse_RKI_dates(counts['datum'])
+        ID = np.union1d(self.ID, counts['lkID'])
+        first, last = udays[0], udays[-1]
+        if len(self.days):
+            first, last = min(first, self.days[0]), max(last, self.days[-1])
+        
+        # contiguous calendar axis
+        days = np.arange(first, last + 1)
+        if len(ID) > len(self.ID) or len(days) > len(self.days):
+            lk = np.searchsorted(ID, self.ID)
+            day_index = (self.days - days[0]).astype(int)
+            for name in ('rows', 'strata', 'cube'):
+                old = getattr(self, name)
+                grown = np.zeros((len(ID), len(days)) + old.shape[2:], dtype=old.dtype)
+                grown[lk[:, None], day_index[None, :]] = old
+                setattr(self, name, grown)
+            names = dict(zip(self.ID, self.lk_name))
+            names.update(zip(counts['lkID'], counts['lk_name']))
+            self.ID, self.days = ID, days
+            self.lk_name = np.array([names[i] for i in ID])
+        
+        lk = np.searchsorted(self.ID, counts['lkID'])
+        day_index = (udays - self.days[0]).astype(int)
+        self.rows[lk[:, None], day_index[None, :]] += counts['rows']
+        self.strata[lk[:, None], day_index[None, :]] += counts['strata']
+        self.cube[lk[:, None], day_index[None, :]] += counts['daily']
+        self.reported = self.rows > 0
+        
+        # state average
+        self.state = self.aggregate(self.ID, self.state_name)
+        
+        # sort and put to dic
+        u_index_name = self.lk_name.copy()
+        sort_index = np.argsort(u_index_name)
+        dic_LK = {'name': u_index_name[sort_index], 'ID': self.ID[sort_index]}
+        
+        # rename umlaut
+        for i in range(len(dic_LK['name'])):
+        
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xb6', 'oe')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x83\xc2\xb6', 'ae')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xa4', 'ae')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xbcr', 'ue')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x83\xc2\xbc', 'ue')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xbc', 'ue')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x9f', 'ss')
+            dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x83\xc5\xb8', 'ss')
+        self.dic_LK = dic_LK
+    
+    def update(self, filename):
+        '''
+        Applies the file of the following Datenstand to the snapshot in place. Only the rows 
+        flagged as new or retracted since the previous Datenstand (``CHANGED_FLAGS``) are read 
+        and added to the cube, the time needed depends on the number of changed rows instead 
+        of the whole history. 
+        
+        The RKI also corrects the notification date, age group, sex or county of single cases 
+        without flagging them. If the file is complete, the numbers of every county are 
+        therefore compared to the ones of the file; if they differ (e.g. a case moved to 
+        another county), the whole file is read instead. A file with only the changed rows 
+        cannot be checked and is applied as it is. Cases moved to another day, age group or 
+        sex of the same county keep their previous place in the cube until the whole file is 
+        read again.
+        
+        The totals of the whole file are computed from the (cached) binary columns of 
+        ``read_RKI_columns``, in streaming mode line by line by ``read_RKI_changes``.
+        
+        Input
+        =====
+        
+        filename : str
+                path to '*.csv' file of the RKI database with the Datenstand following the 
+                one of the snapshot (complete or only the changed rows).
+        
+        return
+        ======
+        
+        changes : dict {'lkID', 'datum', 'new', 'retracted', 'reread'}
+                Counties and notification dates of the changed rows with their new and 
+                retracted (negative) numbers (county x date x {fall, tod, gesund}) and 
+                whether the whole file was read instead
+        '''
+        import numpy as np
+        
+        timer = TRACE.timer()
+        if self._stream:
+            columns, totals = read_RKI_changes(filename, totals=True)
+        else:
+            columns = read_RKI_columns(filename)
+            totals = self._county_totals(columns)
+            changed = np.zeros(len(columns['lkID']), dtype=bool)
+            for field in self.CUBE_FIELDS:
+                changed |= np.in1d(columns[RKI_FLAGS[field]], CHANGED_FLAGS)
+            columns = dict((name, values[changed]) for name, values in columns.items())
+        timer.lap('parse')
+        
+        # same rows as the streaming mode of the snapshot
+        state_ID, county_IDs = self._filters
+        def selected(ID):
+            keep = np.ones(len(ID), dtype=bool)
+            if state_ID is not None:
+                keep &= ID.astype('S2').astype(int) == int(state_ID)
+            if county_IDs is not None:
+                keep &= np.in1d(ID, county_IDs)
+            return keep
+        keep = selected(columns['lkID'])
+        columns = dict((name, values[keep]) for name, values in columns.items())
+        keep = selected(totals['lkID'])
+        totals['lkID'], totals['total'] = totals['lkID'][keep], totals['total'][keep]
+        
+        new = self._count_columns(columns, flags=(1,))
+        retracted = self._count_columns(columns, flags=(-1,))
+        change = dict(new)
+        for key in ('rows', 'daily', 'strata'):
+            change[key] = new[key] + retracted[key]
+        self._add(change)
+        self.filename = filename
+        self.datenstand = read_datenstand(filename)
+        timer.lap('aggregate')
+        
+        # unflagged moves between counties - nicht markierte Korrekturen des Landkreises
+        differ = 0
+        if totals['complete']:
+            expected = np.zeros((len(self.ID), len(self.CUBE_FIELDS)), dtype=np.int64)
+            known = np.in1d(totals['lkID'], self.ID)
+            expected[np.searchsorted(self.ID, totals['lkID'][known])] = totals['total'][known]
+            differ = (~known).sum() + (self.cube.sum(axis=1) != expected).any(axis=1).sum()
+        if differ:
+            print 'numbers of %d counties differ from %s, reading the whole file' % (differ, filename)
+            full = RKISnapshot(filename, state_name=self.state_name, stream=self._stream, state_ID=state_ID, 
+                               county_IDs=county_IDs)
+            self.__dict__.update(full.__dict__)
+        timer.lap('reconcile')
+        
+        return {'lkID': new['lkID'], 'datum': new['datum'], 'new': new['daily'], 'retracted': retracted['daily'], 
+                'reread': bool(differ)}
+    
+    def index(self, LandkreisID):
+        '''
+        Returns the position of the county in ``ID`` (first axis of ``cube``).
+        '''
+        import numpy as np
+        
+        pos = np.searchsorted(self.ID, LandkreisID)
+        if pos == len(self.ID) or self.ID[pos] != LandkreisID:
+            raise KeyError('County ' + LandkreisID + ' not found in ' + self.filename)
+        return pos
+    
+    def states(self):
+        '''
+        Returns the IDs of the states (IdBundesland) in the snapshot, given by the first 
+        two digits of the county IDs.
+        '''
+        import numpy as np
+        
+        return np.unique(self.ID.astype('S2').astype(int))
+    
+    def state_counties(self, state_ID):
+        '''
+        Returns the IDs of the counties of the state ``state_ID`` (IdBundesland, e.g. 9).
+        '''
+        return self.ID[self.ID.astype('S2').astype(int) == int(state_ID)]
+    
+    def aggregate(self, IDs, name):
+        '''
+        Cumulative case numbers of the sum of the counties ``IDs`` on the days with 
+        notifications of any of them (same format as ``state``).
+        
+        return
+        ======
+        
+        state : li[num_state, dat_state, name_state]
+            Cumulative case numbers, dates ('YYYY/MM/DD') and name
+        '''
+        import numpy as np
+        
+        pos = [self.index(i) for i in IDs]
+        sel = self.reported[pos].any(axis=0)
+        num_state = np.cumsum(self.cube[pos][:, sel, 0].sum(axis=0))
+        udate = np.char.replace(np.datetime_as_string(self.days[sel]), '-', '/')
+        return [num_state, udate, name]
+    
+    def region(self, IDs, region_name):
+        '''
+        Selects the data of the sum of the counties ``IDs`` (e.g. all counties of a state). 
+        Returns the same values as ``county``.
+        '''
+        import numpy as np
+        
+        pos = [self.index(i) for i in IDs]
+        
+        # days with notifications of any of the counties
+        sel = self.reported[pos].any(axis=0)
+        days = self.days[sel]
+        daily = self.cube[pos][:, sel].sum(axis=0).astype(float)
+        
+        uday, umonth = day_month(days)
+        
+        return {'fall': np.cumsum(daily[:, 0]), 'tod': np.cumsum(daily[:, 1]), 'gesund':np.cumsum(daily[:, 2])}, uday, umonth, region_name, self.dic_LK, self.state
+    
+    def county(self, LandkreisID):
+        '''
+        Selects the relevant data for the specific county. See ``load_RKI`` for the 
+        returned values.
+        '''
+        self.index(LandkreisID)
+        
+        dic_LK = self.dic_LK
+        region_name = dic_LK['name'][dic_LK['ID'] == LandkreisID][0]
+        
+        print 'region_name loaded', region_name 
+        
+        return self.region([LandkreisID], region_name)
+    
+    def incidence(self, IDs=None, population=None, window=7, per=100000.):
+        '''
+        7-day incidence per 100,000 inhabitants of cases, deaths and recovered cases on every 
+        day of ``days`` (see ``incidence_7d``).
+        
+        Input
+        =====
+        
+        IDs : list of str, default = None
+                Counties summed to one region (default: every county separately).
+        
+        population : PopulationIndex, default = None
+                Population numbers (default: ``population_index()``).
+        
+        return
+        ======
+        
+        incidence : np.array, shape (len(ID), len(days), 3) or (len(days), 3) for a region
+                NaN for counties without population numbers
+        '''
+        if population is None:
+            population = population_index()
+        
+        if IDs is None:
+            return incidence_7d(self.cube, population.population(self.ID), window, per)
+        
+        pos = [self.index(i) for i in IDs]
+        return incidence_7d(self.cube[pos].sum(axis=0), population.population(self.ID[pos]).sum(), window, per)
+    
+    def ages(self, IDs=None, population=None, window=8):
+        '''
+        Doubling times, death rates and 7-day incidence of every age group on every day of 
+        ``days`` (see ``age_metrics``).
+        
+        Input
+        =====
+        
+        IDs : list of str, default = None
+                Counties summed to one region (default: every county separately).
+        
+        population : PopulationIndex, default = None
+                Population numbers (default: ``population_index()``).
+        
+        window : int, default = 8
+                Number of days per fit of the doubling times.
+        
+        return
+        ======
+        
+        metrics : dict
+                ``age_metrics`` with a leading county axis if ``IDs`` is None
+        '''
+        if population is None:
+            population = population_index()
+        
+        if IDs is None:
+            return age_metrics(self.strata, self.days, population.population(self.ID), window)
+        
+        pos = [self.index(i) for i in IDs]
+        return age_metrics(self.strata[pos].sum(axis=0), self.days, population.population(self.ID[pos]).sum(), window)
+    
+    def nowcast(self, triangle, by='state', window=NOWCAST_WINDOW, resamples=NOWCAST_RESAMPLES, level=0.95, seed=0):
+        '''
+        Cases of the last days corrected for the reporting delay (Meldeverzug) learnt from the 
+        files of earlier Datenstand (see ``ReportingTriangle.completeness`` and ``nowcast``).
+        
+        Input
+        =====
+        
+        triangle : ReportingTriangle
+                History of the cases by notification date
+        
+        by, window, resamples, seed : 
+                Groups of counties, number of complete days and resamples of the reporting 
+                delay (see ``ReportingTriangle.completeness``)
+        
+        level : float, default = 0.95
+                Level of the intervals
+        
+        return
+        ======
+        
+        nowcast : dict
+                see ``nowcast``
+        '''
+        completeness = triangle.completeness(by, window, resamples, seed)
+        return nowcast(self.cube[..., 0], self.ID, self.days, self.datenstand, completeness, by, level, seed)
+    
+    def correct(self, nowcast):
+        '''
+        Replaces the daily cases of the last days by the corrected cases of ``nowcast`` (the 
+        cube becomes float), so the doubling times and all other numbers derived from the 
+        cube use the corrected cases.
+        '''
+        import numpy as np
+        
+        lk = np.searchsorted(self.ID, nowcast['ID'])
+        day_index = (nowcast['days'] - self.days[0]).astype(int)
+        self.cube = self.cube.astype(float)
+        self.cube[lk[:, None], day_index[None, :], 0] = nowcast['nowcast']
+        self.state = self.aggregate(self.ID, self.state_name)
+
+
+def load_RKI(filename, LandkreisID, state_name ='Bavaria', cache=True, stream=False, chunk_rows=STREAM_CHUNK_ROWS, date=None):  
+    '''
+    Reads file of the RKI database and selects the relevant data for the specific county.
+    To load several counties from the same file use ``RKISnapshot`` which parses the file 
+    only once.
+    
+    Input
+    =====
+    
+    filename : str
+                path to '*.csv' file downloaded from the RKI or to an archive (``RKIArchive``).
+    
+    LandkreisID : str
+                String with 5 number entries to select the specific county.
+    
+    state_name : str, default = 'Bavaria'
+                Name of the state.
+    
+    cache : bool, default = True
+                Use the binary cache of the parsed csv file (see ``read_RKI_columns``).
+    
+    stream : bool, default = False
+                Read the file in chunks of ``chunk_rows`` lines and keep only the rows of the 
+                state of the county (e.g. for the nationwide ``RKI_COVID19.csv``, see ``stream_RKI``).
+    
+    chunk_rows : int, default = STREAM_CHUNK_ROWS
+                Number of lines processed at once in streaming mode.
+    
+    date : str, default = None
+                Datenstand ('YYYY-MM-DD') of the archived file (default: latest), if 
+                ``filename`` is an archive.
+    
+    return
+    ======
+    
+    dic :  dictionary {'fall': array, 'tod':array, 'gesund': array}
+           Array of cumulative number of cases
+    
+    uday :  np.array
+            Individual days of notification to the RKI (day of the month)
+    
+    umonth : np.array
+            Individual month of notification to the RKI (1 = January 2020, 13 = January 2021)
+    
+    region_name : str
+            Name of specific region
+
+    dic_LK : dict={'name', 'ID'}
+            Alphabetical sorted names of counties and corresponding IDs
+    
+    state : li[dat_state, num_state, name_state]
+            List of dates, cumulative case numbers and state name
+    
+    '''
+    
+    # the state of a county is given by the first two digits of its ID
+    return RKISnapshot(filename, state_name=state_name, cache=cache, stream=stream, 
+                       state_ID=int(LandkreisID[:2]), chunk_rows=chunk_rows, date=date).county(LandkreisID)
+
+####################################
+# Archive of RKI Files (Archiv)    #
+####################################
+
+class RKIArchive(object):
+    '''
+    Append-only archive of the daily RKI files. Consecutive files repeat almost all rows, so 
+    every row is stored only once: per ``Datenstand`` the archive keeps the rows which are new 
+    (``<date>.csv.gz``, parsed columns in ``<date>.npz``) and the change of the number of 
+    identical rows (added, changed or retracted). Rows are compared without ``FID``/``ObjectId`` 
+    and ``Datenstand``, which change from file to file.
+    
+    Any archived file can be rebuilt (``write_csv``) and its columns read like with 
+    ``read_RKI_columns`` (``columns``), e.g. ``RKISnapshot(path, date='2020-04-20')``.
+    
+    The MD5 digests of the stored rows are kept in ``ROW_INDEX`` (in order of their number), 
+    so that ``add`` finds the rows of a new file without reading the stored ones.
+    
+    Input
+    =====
+    
+    path : str
+            Directory of the archive (created by ``add``)
+    '''
+    
+    ID_COLUMNS = ('FID', 'ObjectId')
+    ROW_INDEX = 'rows.npy'
+    
+    def __init__(self, path):
+        import os
+        import json
+        
+        self.path = path
+        try:
+            with open(os.path.join(path, 'index.json')) as f:
+                self.index = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.index = {'header': None, 'nrows': 0, 'snapshots': []}
+    
+    def dates(self):
+        '''
+        Archived dates (Datenstand, 'YYYY-MM-DD') in ascending order.
+        '''
+        return [str(snap['date']) for snap in self.index['snapshots']]
+    
+    def _snapshots(self, date=None):
+        '''
+        Archive entries up to and including ``date`` (default: all).
+        '''
+        if not self.index['snapshots']:
+            raise KeyError('Archive ' + self.path + ' is empty')
+        if date is None:
+            return self.index['snapshots']
+        if date not in self.dates():
+            raise KeyError('Datenstand ' + date + ' not in archive ' + self.path)
+        return self.index['snapshots'][:self.dates().index(date) + 1]
+    
+    def _write(self, name, write):
+        # write to a temporary file first, readers never see half written files
+        import os
+        import tempfile
+        
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='tmp')
+        os.close(fd)
+        write(tmp)
+        os.rename(tmp, os.path.join(self.path, name))
+    
+    def _split(self, header):
+        '''
+        Positions of the row ID, the Datenstand and the remaining (compared) columns.
+        '''
+        id_col = [i for i, name in enumerate(header) if name in self.ID_COLUMNS]
+        ds_col = header.index('Datenstand')
+        return id_col, ds_col, [i for i in range(len(header)) if i not in id_col and i != ds_col]
+    
+    def _line(self, header, content, datenstand, fid):
+        '''
+        Original csv line of a stored row.
+        '''
+        import csv
+        import io
+        
+        id_col, ds_col, other = self._split(header)
+        fields = [None] * len(header)
+        for i, value in zip(other, content):
+            fields[i] = value
+        for i in id_col:
+            fields[i] = str(fid)
+        fields[ds_col] = datenstand
+        
+        out = io.BytesIO()
+        csv.writer(out, lineterminator='\n').writerow(fields)
+        return out.getvalue()
+    
+    def _rows(self, snap):
+        '''
+        Rows stored with the archive entry ``snap`` (without row ID and Datenstand).
+        '''
+        import os
+        import csv
+        import gzip
+        
+        with gzip.open(os.path.join(self.path, snap['date'] + '.csv.gz')) as f:
+            return [tuple(row) for row in csv.reader(f)]
+    
+    def _content(self, date=None):
+        '''
+        Stored rows (without row ID and Datenstand) up to ``date``, in order of their number.
+        '''
+        rows = []
+        for snap in self._snapshots(date):
+            rows.extend(self._rows(snap))
+        return rows
+    
+    def _digests(self, rows):
+        '''
+        MD5 digests of stored rows (without row ID and Datenstand).
+        '''
+        import hashlib
+        import numpy as np
+        
+        return np.array([hashlib.md5('\x00'.join(row)).digest() for row in rows], dtype='S16')
+    
+    def _row_index(self):
+        '''
+        Digests of all stored rows in order of their number (``ROW_INDEX``). Rebuilt from the 
+        stored rows if the file is missing or incomplete (archives of older versions); entries 
+        of an interrupted ``add`` after the indexed rows are ignored.
+        '''
+        import os
+        import numpy as np
+        
+        nrows = self.index['nrows']
+        try:
+            digests = np.load(os.path.join(self.path, self.ROW_INDEX))
+        except (IOError, OSError, ValueError):
+            digests = np.zeros(0, dtype='S16')
+        if len(digests) < nrows:
+            digests = self._digests(self._content())
+        return digests[:nrows]
+    
+    def _parse(self, header, rows, datenstand):
+        '''
+        Columns of stored rows, parsed like the original file (see ``parse_RKI_columns``).
+        '''
+        return parse_RKI_columns([self._line(header, row, datenstand, 0) for row in rows])
+    
+    def counts(self, date=None):
+        '''
+        Number of identical rows of every stored row in the file of ``date`` (default: latest).
+        '''
+        import os
+        import numpy as np
+        
+        snapshots = self._snapshots(date)
+        n = np.zeros(snapshots[-1]['nrows'], dtype=np.int64)
+        for snap in snapshots:
+            with np.load(os.path.join(self.path, snap['date'] + '.npz')) as archived:
+                np.add.at(n, archived['delta_row'], archived['delta_count'])
+        return n
+    
+    def columns(self, date=None):
+        '''
+        Columns of the file of ``date`` (default: latest) used for the analysis, same output 
+        as ``read_RKI_columns`` (up to the order of the rows).
+        '''
+        import numpy as np
+        
+        stored = self._stored(self._snapshots(date), RKI_COLUMNS['names'])[0]
+        n = self.counts(date)
+        return dict((name, np.repeat(stored[name], n)) for name in RKI_COLUMNS['names'])
+    
+    def _stored(self, snapshots, names):
+        '''
+        Columns ``names`` of the rows stored with the archive entries ``snapshots`` and the
+        changes of the number of rows of every entry (delta_row, delta_count).
+        '''
+        import os
+        import numpy as np
+        
+        header = [str(name) for name in self.index['header']]
+        parts = dict((name, []) for name in names)
+        deltas = []
+        for snap in snapshots:
+            with np.load(os.path.join(self.path, snap['date'] + '.npz')) as archived:
+                if all(name in archived.files for name in names):
+                    columns = dict((name, archived[name]) for name in names)
+                else:
+                    # archived before all of the columns were used: parse the stored rows again
+                    columns = self._parse(header, self._rows(snap), str(snap['datenstand']))
+                deltas.append((archived['delta_row'], archived['delta_count']))
+            for name in names:
+                parts[name].append(columns[name])
+        return dict((name, np.concatenate(parts[name])) for name in names), deltas
+    
+    def case_counts(self):
+        '''
+        Daily cases (``COUNTED_FLAGS``) per county and notification date at every archived
+        Datenstand. The archive is read once and the cases of each Datenstand are the previous
+        ones plus its stored changes, the time needed grows with the number of changed rows.
+        
+        yields
+        ======
+        
+        date : str
+            Datenstand ('YYYY-MM-DD'), ascending
+        
+        ID : np.array
+            County IDs of all archived rows (sorted)
+        
+        days : np.array (datetime64[D])
+            Notification days of all archived rows (sorted)
+        
+        cases : np.array, shape (len(ID), len(days))
+            Cases at the Datenstand (the same array for every date, updated in place)
+        '''
+        import numpy as np
+        
+        snapshots = self._snapshots()
+        stored, deltas = self._stored(snapshots, ('lkID', 'datum', 'fall', RKI_FLAGS['fall']))
+        ID, lk = np.unique(stored['lkID'], return_inverse=True)
+        datum, day = np.unique(stored['datum'], return_inverse=True)
+        days = parse_RKI_dates(datum)
+        
+        cell = lk * len(days) + day
+        value = np.where(np.in1d(stored[RKI_FLAGS['fall']], COUNTED_FLAGS), stored['fall'], 0)
+        cases = np.zeros((len(ID), len(days)))
+        for snap, (delta_row, delta_count) in zip(snapshots, deltas):
+            cases += np.bincount(cell[delta_row], weights=delta_count * value[delta_row],
+                                 minlength=cases.size).reshape(cases.shape)
+            yield str(snap['date']), ID, days, cases
+    
+    def add(self, filename):
+        '''
+        Adds a file of the RKI database. Files have to be added in the order of their 
+        Datenstand; files which are already archived are skipped.
+        
+        return
+        ======
+        
+        added : bool
+            False if the Datenstand was already archived
+        '''
+        import os
+        import csv
+        import gzip
+        import json
+        import collections
+        import numpy as np
+        
+        with open(filename) as f:
+            reader = csv.reader(f)
+            header = [name.replace('\xef\xbb\xbf', '') for name in next(reader)]
+            id_col, ds_col, other = self._split(header)
+            
+            datenstand = None
+            multiplicity = collections.Counter()
+            for row in reader:
+                if datenstand is None:
+                    datenstand = row[ds_col]
+                elif row[ds_col] != datenstand:
+                    raise ValueError('More than one Datenstand in ' + filename)
+                multiplicity[tuple(row[i] for i in other)] += 1
+        
+        if datenstand is None:
+            raise ValueError('No rows in ' + filename)
+        
+        date = datenstand_date(datenstand)
+        
+        if self.index['header'] is not None and self.index['header'] != header:
+            raise ValueError('Columns of ' + filename + ' differ from the archive ' + self.path)
+        if date in self.dates():
+            print 'Datenstand', date, 'already archived'
+            return False
+        if self.dates() and date < self.dates()[-1]:
+            raise ValueError('Datenstand ' + date + ' is older than the archive ' + self.path)
+        
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        
+        # number the new rows after the stored ones (found by their digests)
+        nrows = self.index['nrows']
+        digests = self._row_index()
+        rows = list(multiplicity)
+        keys = self._digests(rows)
+        number = np.full(len(rows), -1, dtype=np.int64)
+        if nrows:
+            order = np.argsort(digests)
+            pos = order[np.minimum(np.searchsorted(digests, keys, sorter=order), nrows - 1)]
+            number = np.where(digests[pos] == keys, pos, -1)
+        is_new = number < 0
+        number[is_new] = nrows + np.arange(is_new.sum())
+        new = [row for row, flag in zip(rows, is_new) if flag]
+        
+        n = np.zeros(nrows + len(new), dtype=np.int64)
+        n[number] = [multiplicity[row] for row in rows]
+        if nrows:
+            n[:nrows] -= self.counts()
+        delta_row = np.flatnonzero(n)
+        
+        def write_rows(tmp):
+            with gzip.open(tmp, 'wb') as f:
+                csv.writer(f, lineterminator='\n').writerows(new)
+        self._write(date + '.csv.gz', write_rows)
+        
+        # columns of the new rows, parsed like the original file
+        arrays = self._parse(header, new, datenstand)
+        arrays.update(delta_row=delta_row, delta_count=n[delta_row])
+        
+        def write_arrays(tmp):
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+        self._write(date + '.npz', write_arrays)
+        
+        def write_row_index(tmp):
+            with open(tmp, 'wb') as f:
+                np.save(f, np.concatenate([digests, keys[is_new]]))
+        self._write(self.ROW_INDEX, write_row_index)
+        
+        # index last: an interrupted add leaves the archive unchanged
+        self.index['header'] = header
+        self.index['nrows'] = nrows + len(new)
+        self.index['snapshots'].append({'date': date, 'datenstand': datenstand, 'source': os.path.basename(filename), 
+                                        'rows': sum(multiplicity.values()), 'nrows': nrows + len(new), 
+                                        'added': int(n[n > 0].sum()), 'removed': int(-n[n < 0].sum())})
+        
+        def write_index(tmp):
+            with open(tmp, 'w') as f:
+                json.dump(self.index, f, indent=1)
+        self._write('index.json', write_index)
+        
+        print 'archived', filename, 'Datenstand', date + ':', self.index['snapshots'][-1]['added'], 'rows added,', \
+              self.index['snapshots'][-1]['removed'], 'removed,', len(new), 'new'
+        return True
+    
+    def write_csv(self, date, filename):
+        '''
+        Rebuilds the file of ``date`` (rows in order of their first appearance in the archive, 
+        with new row IDs).
+        '''
+        import numpy as np
+        
+        header = [str(name) for name in self.index['header']]
+        datenstand = str(self._snapshots(date)[-1]['datenstand'])
+        n = self.counts(date)
+        
+        with open(filename, 'w') as f:
+            f.write(','.join(header) + '\n')
+            fid = 0
+            for row, count in zip(self._content(date), n):
+                for k in range(count):
+                    fid += 1
+                    f.write(self._line(header, row, datenstand, fid))
+
+
+#########################################
+# Download of RKI Files (Herunterladen) #
+#########################################
+
+# query endpoint of the feature service of the RKI database (NPGEO)
+RKI_SERVICE_URL = 'https://services7.arcgis.com/mOBPykOjAyBO2ZKk/arcgis/rest/services/RKI_COVID19/FeatureServer/0/query'
+
+# rows per query, parallel connections, retries per query and seconds before the first retry
+DOWNLOAD_PAGE_ROWS = 2000
+DOWNLOAD_THREADS = 4
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 0.5
+
+# columns of the downloaded file (July 2020 layout, see ``RKI_COLUMNS``), their values if the 
+# service does not provide them (Refdatum: Meldedatum) and the date columns (milliseconds 
+# since 1970 in the service)
+RKI_CSV_FIELDS = ('FID', 'IdBundesland', 'Bundesland', 'Landkreis', 'Altersgruppe', 'Geschlecht', 'AnzahlFall', 
+                  'AnzahlTodesfall', 'Meldedatum', 'IdLandkreis', 'Datenstand', 'NeuerFall', 'NeuerTodesfall', 
+                  'Refdatum', 'NeuGenesen', 'AnzahlGenesen', 'IstErkrankungsbeginn', 'Altersgruppe2')
+RKI_CSV_DEFAULTS = {'NeuGenesen': -9, 'AnzahlGenesen': 0, 'IstErkrankungsbeginn': 0, 'Altersgruppe2': 'Nicht \xc3\xbcbermittelt'}
+RKI_DATE_FIELDS = ('Meldedatum', 'Refdatum')
+
+
+class _ServiceClient(object):
+    '''
+    Queries of the feature service over one keep-alive connection, which is opened again 
+    after an error; failed queries are repeated ``retries`` times.
+    '''
+    
+    def __init__(self, url, timeout=60, retries=DOWNLOAD_RETRIES):
+        import urlparse
+        
+        self.url = urlparse.urlparse(url)
+        self.timeout = timeout
+        self.retries = retries
+        self.connection = None
+    
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+    
+    def query(self, **params):
+        '''
+        Result (json) of a query with the parameters ``params`` (e.g. where, outFields).
+        '''
+        import time
+        import json
+        import socket
+        import urllib
+        import httplib
+        
+        params.setdefault('f', 'json')
+        path = self.url.path + '?' + urllib.urlencode(sorted(params.items()))
+        for attempt in range(self.retries + 1):
+            try:
+                if self.connection is None:
+                    connection = httplib.HTTPSConnection if self.url.scheme == 'https' else httplib.HTTPConnection
+                    self.connection = connection(self.url.netloc, timeout=self.timeout)
+                self.connection.request('GET', path)
+                response = self.connection.getresponse()
+                body = response.read()
+                if response.status != 200:
+                    raise IOError('HTTP %d %s' % (response.status, response.reason))
+                result = json.loads(body)
+                if 'error' in result:
+                    raise IOError('feature service error ' + json.dumps(result['error']))
+                return result
+            except (IOError, socket.error, httplib.HTTPException, ValueError) as error:
+                self.close()
+                if attempt == self.retries:
+                    raise IOError('Query of ' + self.url.geturl() + ' failed: ' + str(error))
+                time.sleep(DOWNLOAD_BACKOFF * 2 ** attempt)
+
+
+def _feature_lines(features, object_id):
+    '''
+    Lines of the csv file (``RKI_CSV_FIELDS``) of the features of a query, the row ID 
+    (FID) is the object ID of the service.
+    '''
+    import io
+    import csv
+    import time
+    
+    def date(value):
+        if isinstance(value, (int, long, float)):
+            return time.strftime('%Y/%m/%d %H:%M:%S', time.gmtime(value / 1000.))
+        # '2020-03-20T00:00:00.000Z'
+        return value[:10].replace('-', '/') + ' 00:00:00'
+    
+    attributes = [feature['attributes'] for feature in features]
+    columns = []
+    for name in RKI_CSV_FIELDS:
+        values = [a.get(object_id if name == 'FID' else name, RKI_CSV_DEFAULTS.get(name)) for a in attributes]
+        if name == 'Refdatum':
+            values = [a['Meldedatum'] if value is None else value for value, a in zip(values, attributes)]
+        if name in RKI_DATE_FIELDS:
+            # converted once per date
+            dates = dict((value, date(value)) for value in set(values))
+            values = [dates[value] for value in values]
+        else:
+            values = ['' if value is None else value.encode('utf-8') if isinstance(value, unicode) else value 
+                      for value in values]
+        columns.append(values)
+    
+    out = io.BytesIO()
+    csv.writer(out, lineterminator='\n').writerows(zip(*columns))
+    return out.getvalue()
+
+
+def _download_page(client, where, object_id, datenstand, offset, rows, part):
+    '''
+    Writes the ``rows`` rows from ``offset`` on (ordered by the object ID) to the file ``part``.
+    '''
+    import os
+    
+    lines = []
+    got = 0
+    # the service may return less rows than asked for (maxRecordCount)
+    while got < rows:
+        features = client.query(where=where, outFields='*', orderByFields=object_id, 
+                                resultOffset=offset + got, resultRecordCount=rows - got)['features']
+        if not features:
+            raise IOError('%d rows from row %d expected, got %d' % (rows, offset, got))
+        if any(feature['attributes']['Datenstand'] != datenstand for feature in features):
+            raise IOError('Datenstand changed during the download, download again')
+        lines.append(_feature_lines(features, object_id))
+        got += len(features)
+    
+    with open(part + '.tmp', 'wb') as f:
+        f.writelines(lines)
+    os.rename(part + '.tmp', part)
+
+
+def _read_header(filename):
+    '''
+    Column names of a csv file (without byte order mark).
+    '''
+    import csv
+    
+    with open(filename, 'rb') as f:
+        return [name.replace('\xef\xbb\xbf', '') for name in next(csv.reader(f), [])]
+
+
+def download_RKI(directory='data_RKI', url=RKI_SERVICE_URL, state_ID=None, threads=DOWNLOAD_THREADS, 
+                 page_rows=DOWNLOAD_PAGE_ROWS, retries=DOWNLOAD_RETRIES, timeout=60, verbose=True):
+    '''
+    Downloads the current file of the RKI database from the feature service in pages of 
+    ``page_rows`` rows, fetched by ``threads`` threads with one keep-alive connection each. 
+    The rows are filtered by the service (``state_ID``) and written in the layout read by 
+    ``read_RKI_columns``. Every page is kept as a file until all pages are downloaded, an 
+    interrupted download of the same Datenstand continues with the missing pages. 
+    
+    Input
+    =====
+    
+    directory : str, default = 'data_RKI'
+                Directory of the downloaded file 'RKI_COVID19_<Bundesland>_<YYYY-MM-DD>.csv' 
+                ('RKI_COVID19_<YYYY-MM-DD>.csv' without ``state_ID``). If a file of this name 
+                exists in another layout, it is kept and the download is written to 
+                'RKI_COVID19_<Bundesland>_<YYYY-MM-DD>_download.csv'.
+    
+    url : str, default = RKI_SERVICE_URL
+                Query endpoint of the feature service (e.g. of ``rki_stub.py``)
+    
+    state_ID : int, default = None
+                Only the rows of this state (IdBundesland, e.g. 9), default: all rows
+    
+    threads : int, default = DOWNLOAD_THREADS
+                Number of parallel connections
+    
+    page_rows, retries, timeout :
+                Rows per query, retries of a failed query and timeout of the connections (seconds)
+    
+    return
+    ======
+    
+    filename : str
+            Downloaded file (not downloaded again if it exists with the header ``RKI_CSV_FIELDS``)
+    '''
+    import os
+    import json
+    import Queue
+    import shutil
+    import threading
+    
+    timer = TRACE.timer()
+    where = '1=1' if state_ID is None else 'IdBundesland=%d' % int(state_ID)
+    client = _ServiceClient(url, timeout, retries)
+    try:
+        first = client.query(where=where, outFields='Datenstand,Bundesland', resultRecordCount=1)
+        if not first['features']:
+            raise ValueError('No rows with ' + where + ' at ' + url)
+        count = client.query(where=where, returnCountOnly='true')['count']
+    finally:
+        client.close()
+    
+    object_id = first.get('objectIdFieldName', 'ObjectId')
+    datenstand = first['features'][0]['attributes']['Datenstand']
+    name = 'RKI_COVID19_' + ('' if state_ID is None else first['features'][0]['attributes']['Bundesland'] + '_')
+    filename = os.path.join(directory, (name + datenstand_date(datenstand) + '.csv').encode('utf-8'))
+    if os.path.isfile(filename) and _read_header(filename) != list(RKI_CSV_FIELDS):
+        # a file of the same Datenstand in another layout (e.g. the April 2020 files of data_RKI) is kept
+        filename = filename[:-len('.csv')] + '_download.csv'
+    if os.path.isfile(filename) and _read_header(filename) == list(RKI_CSV_FIELDS):
+        if verbose:
+            print 'Datenstand', datenstand_date(datenstand), 'already downloaded:', filename
+        return filename
+    
+    # pages of an interrupted download of the same query are kept
+    parts = filename + '.parts'
+    query = {'url': url, 'where': where, 'datenstand': datenstand, 'count': count, 'page_rows': page_rows}
+    try:
+        with open(os.path.join(parts, 'query.json')) as f:
+            resumed = json.load(f) == query
+    except (IOError, OSError, ValueError):
+        resumed = False
+    if not resumed:
+        shutil.rmtree(parts, ignore_errors=True)
+        os.makedirs(parts)
+        with open(os.path.join(parts, 'query.json'), 'w') as f:
+            json.dump(query, f)
+    
+    pages = [(offset, min(page_rows, count - offset), os.path.join(parts, '%010d.csv' % offset)) 
+             for offset in range(0, count, page_rows)]
+    todo = Queue.Queue()
+    for page in pages:
+        if not os.path.isfile(page[2]):
+            todo.put(page)
+    if verbose:
+        print 'downloading %d rows (%d of %d pages) of Datenstand %s from %s' % (count, todo.qsize(), len(pages), 
+                                                                                datenstand_date(datenstand), url)
+    
+    errors = []
+    def fetch():
+        client = _ServiceClient(url, timeout, retries)
+        try:
+            while not errors:
+                try:
+                    offset, rows, part = todo.get_nowait()
+                except Queue.Empty:
+                    return
+                _download_page(client, where, object_id, datenstand, offset, rows, part)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            client.close()
+    
+    workers = [threading.Thread(target=fetch) for i in range(max(1, min(threads, todo.qsize())))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise IOError(str(errors[0]) + ' (downloaded pages are kept in ' + parts + ')')
+    timer.lap('download')
+    
+    # header and pages in order, renamed when complete
+    with open(filename + '.tmp', 'wb') as f:
+        f.write(','.join(RKI_CSV_FIELDS) + '\n')
+        for offset, rows, part in pages:
+            with open(part, 'rb') as page:
+                shutil.copyfileobj(page, f)
+    os.rename(filename + '.tmp', filename)
+    shutil.rmtree(parts, ignore_errors=True)
+    timer.lap('download_write')
+    
+    if verbose:
+        print 'downloaded', filename
+    return filename
+
+
+####################################
+# Log-linear Fit (Anpassung)       #
+####################################
+
+def _rolling_windows(arr, window):
+    '''
+    Read-only view of all windows of length ``window`` along the last axis of ``arr``.
+    '''
+    import numpy as np
+    from numpy.lib.stride_tricks import as_strided
+    
+    arr = np.ascontiguousarray(arr, dtype=float)
+    shape = arr.shape[:-1] + (max(arr.shape[-1] - window + 1, 0), window)
+    strides = arr.strides + arr.strides[-1:]
+    return as_strided(arr, shape=shape, strides=strides, writeable=False)
+
+
+def rolling_loglinear_fit(x, y, window=8):
+    '''
+    Fits ``y = log(a) + b * x`` to every window of ``window`` consecutive data points with 
+    the exact least-squares solution. All windows of all series are computed at once.
+    The results are the same as from ``scipy.optimize.curve_fit`` applied to each window 
+    (parameters ``a``, ``b`` and their covariance scaled by the residual variance).
+    
+    Input
+    =====
+    
+    x : np.array, shape (..., n)
+            Days of the data points. Leading axes (e.g. counties) are fitted independently; 
+            windows containing NaN (padding of shorter series) return NaN.
+    
+    y : np.array, shape (..., n)
+            Logarithm of the cumulative case numbers.
+    
+    window : int, default = 8
+            Number of data points per fit.
+    
+    return
+    ======
+    
+    popt : np.array, shape (..., n - window + 1, 2)
+            Fitting constants ``a`` and ``b`` of the window ending at data point ``window - 1 + i``
+    
+    pcov : np.array, shape (..., n - window + 1, 2, 2)
+            Covariance of ``a`` and ``b``
+    '''
+    import numpy as np
+    
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    xw = _rolling_windows(x, window)
+    yw = _rolling_windows(y, window)
+    
+    x_mean = xw.mean(axis=-1)
+    dx = xw - x_mean[..., None]
+    dy = yw - yw.mean(axis=-1)[..., None]
+    sxx = (dx ** 2).sum(axis=-1)
+    
+    b = (dx * dy).sum(axis=-1) / sxx
+    log_a = yw.mean(axis=-1) - b * x_mean
+    a = np.exp(log_a)
+    
+    # residual variance, parameters of the covariance in (log(a), b)
+    s2 = ((dy - b[..., None] * dx) ** 2).sum(axis=-1) / (window - 2)
+    var_b = s2 / sxx
+    var_log_a = s2 / window + x_mean ** 2 * var_b
+    cov_log_a_b = - x_mean * var_b
+    
+    popt = np.stack([a, b], axis=-1)
+    pcov = np.empty(popt.shape + (2,))
+    pcov[..., 0, 0] = a ** 2 * var_log_a
+    pcov[..., 0, 1] = pcov[..., 1, 0] = a * cov_log_a_b
+    pcov[..., 1, 1] = var_b
+    return popt, pcov
+
+
+# resamples of the bootstrap of the doubling times and windows computed at once
+BOOTSTRAP_RESAMPLES = 2000
+BOOTSTRAP_BLOCK = 512
+
+
+def _interval(values, level):
+    '''
+    Percentile interval of the rows of ``values`` (same as ``np.percentile`` with linear 
+    interpolation) from one partition at the two upper order statistics.
+    '''
+    import numpy as np
+
+    pos = (values.shape[-1] - 1) * np.array([1 - level, 1 + level]) / 2.
+    below, above = np.floor(pos).astype(int), np.ceil(pos).astype(int)
+    part = np.partition(values, sorted(set(above)), axis=-1)
+    
+    upper = part[:, above]
+    lower = upper.copy()
+    # next lower order statistic: largest value of the unsorted part before it
+    for i, start in enumerate([0, above[0] if above[0] < above[1] else 0]):
+        if below[i] < above[i]:
+            lower[:, i] = part[:, start:above[i]].max(axis=-1)
+    weight = pos - below
+    return lower * (1 - weight) + upper * weight
+
+
+def _bootstrap_block(args):
+    '''
+    Interval of the bootstrapped slopes of a block of windows (see ``bootstrap_DT``).
+    '''
+    import numpy as np
+
+    weights, sxx, b, res, level = args
+    # refit of every resample (fitted line plus resampled residuals): 
+    # b + sum_m dx[m] * res[idx[m]] / sxx = b + res . weights / sxx
+    boot = b[:, None] + np.dot(res, weights.T) / sxx[:, None]
+    return _interval(boot, level)
+
+
+def bootstrap_DT(x, y, window=8, resamples=BOOTSTRAP_RESAMPLES, level=0.95, seed=0, jobs=1,
+                 block=BOOTSTRAP_BLOCK):
+    '''
+    Confidence intervals of the doubling times ``ln(2) / b`` of all fits of
+    ``rolling_loglinear_fit`` from a residual bootstrap: the residuals of every window
+    (scaled by ``sqrt(window / (window - 2))``) are resampled with replacement, added to the
+    fitted line and fitted again. The refit of the slope is a weighted sum of the residuals,
+    the same weights for all windows with the same spacing of the days, so all resamples of
+    a block of windows are one matrix product. The resamples
+    are drawn once from ``seed`` and used for every window, the results do not depend on
+    ``block`` or ``jobs``.
+
+    Input
+    =====
+
+    x, y : np.array, shape (..., n)
+            Days and logarithm of the cumulative case numbers (see ``rolling_loglinear_fit``)
+
+    window : int, default = 8
+            Number of data points per fit
+
+    resamples : int, default = BOOTSTRAP_RESAMPLES
+            Number of resamples per window (0: no intervals, NaN)
+
+    level : float, default = 0.95
+            Confidence level of the percentile intervals
+
+    seed : int, default = 0
+            Seed of the resamples
+
+    jobs : int, default = 1
+            Number of processes
+
+    block : int, default = BOOTSTRAP_BLOCK
+            Number of windows computed at once (memory ``block * resamples * window`` floats)
+
+    return
+    ======
+
+    DT_ci : np.array, shape (..., n - window + 1, 2)
+            Lower and upper limit of the doubling time of every window (rounded like the
+            doubling times, inf if the growth rate can be zero, NaN for windows with NaN)
+    '''
+    import numpy as np
+
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    xw = _rolling_windows(x, window)
+    yw = _rolling_windows(y, window)
+    shape = xw.shape[:-1]
+    xw, yw = xw.reshape(-1, window), yw.reshape(-1, window)
+
+    dx = xw - xw.mean(axis=-1)[:, None]
+    dy = yw - yw.mean(axis=-1)[:, None]
+    sxx = (dx ** 2).sum(axis=-1)
+    b = (dx * dy).sum(axis=-1) / sxx
+    res = (dy - b[:, None] * dx) * np.sqrt(window / (window - 2.))
+
+    b_ci = np.full((len(b), 2), np.nan)
+    valid = np.flatnonzero(np.isfinite(b) & np.isfinite(res).all(axis=-1))
+    if resamples > 0 and len(valid):
+        idx = np.random.RandomState(seed).randint(0, window, (resamples, window))
+        # hits[k, m, j]: residual j drawn for data point m in resample k
+        hits = (idx[:, :, None] == np.arange(window)).astype(float)
+        
+        # windows with the same spacing of the days (mostly consecutive days) share the 
+        # weights of the residuals in the refit
+        rows = np.ascontiguousarray(dx[valid]).view(np.dtype((np.void, dx.itemsize * window)))
+        spacings, inverse = np.unique(rows, return_inverse=True)
+        order = np.argsort(inverse, kind='mergesort')
+        bounds = np.searchsorted(inverse[order], np.arange(len(spacings) + 1))
+        
+        blocks, positions = [], []
+        for k in range(len(spacings)):
+            group = valid[order[bounds[k]:bounds[k + 1]]]
+            weights = np.dot(hits.transpose(0, 2, 1), dx[group[0]])
+            for i in range(0, len(group), block):
+                sel = group[i:i + block]
+                blocks.append((weights, sxx[sel], b[sel], res[sel], level))
+                positions.append(sel)
+
+        if jobs > 1 and len(blocks) > 1:
+            import multiprocessing
+
+            pool = multiprocessing.Pool(jobs)
+            try:
+                parts = pool.map(_bootstrap_block, blocks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            parts = [_bootstrap_block(args) for args in blocks]
+        b_ci[np.concatenate(positions)] = np.concatenate(parts)
+
+    # the doubling time falls with the growth rate: upper rate for the lower limit
+    with np.errstate(divide='ignore', invalid='ignore'):
+        DT_ci = np.where(b_ci[:, ::-1] > 0, np.log(2) / b_ci[:, ::-1], np.inf)
+    DT_ci[np.isnan(b_ci[:, ::-1])] = np.nan
+    return np.round(DT_ci, 2).reshape(shape + (2,))
+
+#########################################
+# Sliding Windows (gleitende Fenster)   #
+#########################################
+
+# alignments of the windows: ending at the day (trailing) or around it (centred)
+WINDOW_ALIGNS = ('trailing', 'centred')
+
+
+def _shift_window(out, window, align, axis):
+    '''
+    Moves trailing window values to the alignment ``align`` along ``axis``.
+    '''
+    import numpy as np
+
+    if align not in WINDOW_ALIGNS:
+        raise ValueError('align must be one of ' + ', '.join(WINDOW_ALIGNS) + ', not ' + repr(align))
+    shift = (window - 1) // 2 if align == 'centred' else 0
+    if shift == 0:
+        return out
+    out = np.moveaxis(out, axis, -1)
+    out = np.concatenate([out[..., shift:], np.full(out.shape[:-1] + (shift,), np.nan)], axis=-1)
+    return np.moveaxis(out, -1, axis)
+
+
+def window_sum(values, window=7, align='trailing', axis=-1, partial=False):
+    '''
+    Sums of ``window`` consecutive values from the differences of one cumulative sum, for
+    all rows (e.g. counties) and days at once. Integer valued numbers (case counts) give
+    exactly the sums of the single values.
+
+    Input
+    =====
+
+    values : np.array
+            Daily numbers; NaN padding at the end of shorter rows gives NaN windows
+
+    window : int, default = 7
+            Number of values per window (e.g. 4, 7 or 14 days)
+
+    align : str, default = 'trailing'
+            'trailing': window of the value and the ``window - 1`` values before;
+            'centred': window around the value (for even windows one value more before it)
+
+    axis : int, default = -1
+            Axis of the days
+
+    partial : bool, default = False
+            Sums of the shorter windows at the start instead of NaN
+
+    return
+    ======
+
+    sums : np.array, shape of ``values``
+            NaN where the window is incomplete
+    '''
+    import numpy as np
+
+    values = np.moveaxis(np.asarray(values), axis, -1)
+    csum = np.cumsum(values, axis=-1, dtype=float)
+    out = csum.copy()
+    out[..., window:] -= csum[..., :-window]
+    if not partial:
+        out[..., :window - 1] = np.nan
+    return _shift_window(np.moveaxis(out, -1, axis), window, align, axis)
+
+
+def window_mean(values, window=7, align='trailing', axis=-1):
+    '''
+    Means of ``window`` consecutive values, e.g. the 7-day mean (see ``window_sum``).
+    '''
+    return window_sum(values, window, align, axis) / float(window)
+
+
+def window_ratio(values, window=4, align='trailing', axis=-1):
+    '''
+    Ratio of the sum of ``window`` consecutive values to the sum of the ``window`` values
+    before, e.g. the reproduction number R4 of the last 4 against the 4 notification days
+    before (see ``window_sum``).
+    '''
+    import numpy as np
+
+    sums = np.moveaxis(window_sum(values, window, axis=axis), axis, -1)
+    before = np.full(sums.shape, np.nan)
+    before[..., window:] = sums[..., :-window]
+    return _shift_window(np.moveaxis(_masked_ratio(sums, before), -1, axis), 2 * window, align, axis)
+
+
+def _masked_ratio(numerator, denominator):
+    '''
+    ``numerator / denominator``, NaN where one of them is not finite or the denominator is 0 
+    (no cases in the window before), without RuntimeWarnings.
+    '''
+    import numpy as np
+
+    ratio = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    valid = np.isfinite(numerator) & np.isfinite(denominator)
+    valid[valid] = denominator[valid] != 0
+    ratio[valid] = numerator[valid] / denominator[valid]
+    return ratio
+
+
+def _row_searchsorted(day, t, lag):
+    '''
+    ``np.searchsorted(day[row], t[row], side='right')`` of all rows at once. The rows of
+    ``day`` increase, NaN padding at the end, and ``t >= day - lag``.
+    '''
+    import numpy as np
+
+    rows = np.arange(day.shape[0])[:, None] if day.ndim == 2 else 0
+    base = np.nanmin(day) - lag - 1
+    width = np.nanmax(day) - base + 2
+    keys = np.where(np.isnan(day), width - 1, day - base) + rows * width
+    pos = np.searchsorted(keys.ravel(), (t - base + rows * width).ravel(), side='right').reshape(t.shape)
+    return np.minimum(pos - rows * day.shape[-1], day.shape[-1])
+
+
+def window_increment(cum, day, window=7):
+    '''
+    Increase of the cumulative numbers ``cum`` since the first notification day of the last
+    ``window`` calendar days (e.g. the new cases of the last week, ``Ntot_week``).
+
+    Input
+    =====
+
+    cum : np.array, shape (n,) or (rows, n)
+            Cumulative numbers on the notification days
+
+    day : np.array, shape of ``cum``
+            Notification days (increasing, NaN padding at the end of shorter rows)
+
+    window : int, default = 7
+            Number of calendar days
+    '''
+    import numpy as np
+
+    cum, day = np.asarray(cum, dtype=float), np.asarray(day, dtype=float)
+    first = _row_searchsorted(day, day - window, window)
+    return cum - _take_rows(cum, np.minimum(first, cum.shape[-1] - 1))
+
+
+def _take_rows(arr, index):
+    '''
+    ``arr[row, index[row, j]]`` of all rows (1 or 2 dimensional).
+    '''
+    import numpy as np
+
+    if arr.ndim == 1:
+        return arr[index]
+    return arr[np.arange(arr.shape[0])[:, None], index]
+
+
+def interp_before(cum, day, lag):
+    '''
+    Cumulative numbers ``lag`` calendar days before every notification day, linearly
+    interpolated between the notification days like ``np.interp`` (NaN before the first day).
+    Shapes as in ``window_increment``.
+    '''
+    import numpy as np
+
+    cum, day = np.asarray(cum, dtype=float), np.asarray(day, dtype=float)
+    t = day - lag
+    j = _row_searchsorted(day, t, lag) - 1
+    valid = j >= 0
+    j = np.clip(j, 0, cum.shape[-1] - 2)
+
+    day0, day1 = _take_rows(day, j), _take_rows(day, j + 1)
+    cum0, cum1 = _take_rows(cum, j), _take_rows(cum, j + 1)
+    slope = (cum1 - cum0) / (day1 - day0)
+    # exactly on a notification day (np.interp returns the value itself)
+    out = np.where(t == day0, cum0, slope * (t - day0) + cum0)
+    out[~valid] = np.nan
+    return out
+
+
+def interp_ratio(cum, day, window=4):
+    '''
+    Reproduction number from the interpolated cumulative numbers: increase during the last
+    ``window`` calendar days (from the day before) divided by the increase during the
+    ``window`` days before. NaN where the first notification day is not long enough ago 
+    or without cases in the ``window`` days before.
+    Shapes as in ``window_increment``.
+    '''
+    import numpy as np
+
+    cum, day = np.asarray(cum, dtype=float), np.asarray(day, dtype=float)
+    minus_2w = interp_before(cum, day, 2 * window + 1)
+    minus_w = interp_before(cum, day, window + 1)
+    return _masked_ratio(cum - minus_w, minus_w - minus_2w)
+
+
+def window_statistics(cum, day, R_window=4, mean_window=7, week=7, align='trailing'):
+    '''
+    All sliding window statistics of ``plot_corona`` for a matrix of counties x notification
+    days at once. Only cumulative sums and one search per row are needed, independent of
+    the window lengths.
+
+    Input
+    =====
+
+    cum : np.array, shape (n,) or (rows, n)
+            Cumulative numbers on the notification days, NaN padding at the end of shorter rows
+
+    day : np.array, shape of ``cum``
+            Notification days (days since ``EPOCH``)
+
+    R_window : int, default = 4
+            Notification days per sum of the reproduction numbers
+
+    mean_window : int, default = 7
+            Notification days of the means
+
+    week : int, default = 7
+            Calendar days of the increment
+
+    align : str, default = 'trailing'
+            Alignment of the sums and means (see ``window_sum``)
+
+    return
+    ======
+
+    statistics : dict of np.array, shape of ``cum``
+        daily : daily numbers (first value: first cumulative number)
+        mean : mean of the daily numbers
+        R : sum of the last ``R_window`` daily numbers divided by the sum of the ones before
+        increment : increase during the last ``week`` calendar days (``window_increment``)
+        R_interp : reproduction number from interpolated cumulative numbers (``interp_ratio``)
+    '''
+    import numpy as np
+
+    cum = np.asarray(cum, dtype=float)
+    daily = np.diff(cum, axis=-1)
+    daily = np.concatenate([cum[..., :1], daily], axis=-1)
+
+    R_interp = interp_ratio(cum, day, R_window)
+    return {'daily': daily,
+            'mean': window_mean(daily, mean_window, align),
+            'R': window_ratio(daily, R_window, align),
+            'increment': window_increment(cum, day, week),
+            'R_interp': R_interp}
+
+#######################################
+# Population and Incidence (Inzidenz) #
+#######################################
+
+# population numbers of the Bavarian counties (GENESIS table 12411-001, last column 31.12.2018)
+POPULATION_FILE = 'data_RKI/12411-001.csv'
+
+# loaded population files
+_POPULATION_INDEX = {}
+
+
+class PopulationIndex(object):
+    '''
+    Population numbers (Einwohner) of the counties and states, read once and keyed by the 
+    IDs of the RKI files ('09182' for a county, '09' for a state). The IDs of the file are 
+    given without leading zero.
+    
+    Input
+    =====
+    
+    filename : str, default = POPULATION_FILE
+                Table with the ID in the first and the population in the last column.
+    '''
+    def __init__(self, filename=POPULATION_FILE):
+        import numpy as np
+        
+        EW_ID, EW = np.loadtxt(filename, delimiter=';', 
+                           usecols=(0, -1), unpack=True, 
+                           dtype={'names': ('EW_ID', 'EW'), 'formats': ( 'S10', 'i4')})
+        
+        # states (1-2 digits) and counties (4-5 digits), not the municipalities
+        self.EW = {}
+        for ID, n in zip(EW_ID, EW):
+            if len(ID) in (1, 2):
+                self.EW[ID.zfill(2)] = n
+            elif len(ID) in (4, 5):
+                self.EW[ID.zfill(5)] = n
+    
+    def get(self, ID):
+        '''
+        Population of the county or state, None if it is not in the file.
+        '''
+        return self.EW.get(ID)
+    
+    def population(self, IDs):
+        '''
+        Population of the counties ``IDs`` as float array, NaN if not in the file.
+        '''
+        import numpy as np
+        
+        return np.array([self.EW.get(ID, np.nan) for ID in IDs], dtype=float)
+
+
+def population_index(filename=POPULATION_FILE):
+    '''
+    Returns the ``PopulationIndex`` of the file, reading it only on the first call.
+    '''
+    if filename not in _POPULATION_INDEX:
+        _POPULATION_INDEX[filename] = PopulationIndex(filename)
+    return _POPULATION_INDEX[filename]
+
+
+def incidence_7d(daily, population, window=7, per=100000.):
+    '''
+    Sum of the daily numbers of the last ``window`` days per ``per`` inhabitants, e.g. the 
+    7-day incidence per 100,000 inhabitants. All regions and days are computed at once.
+    
+    Input
+    =====
+    
+    daily : np.array, shape (..., ndays, nfields)
+            Daily numbers on contiguous calendar days (e.g. ``RKISnapshot.cube``)
+    
+    population : float or np.array, shape (...)
+            Population of the regions (NaN if unknown)
+    
+    window : int, default = 7
+            Number of days summed
+    
+    per : float, default = 100000.
+            Number of inhabitants the numbers refer to
+    
+    return
+    ======
+    
+    incidence : np.array, shape (..., ndays, nfields)
+            NaN for regions without population
+    '''
+    import numpy as np
+    
+    # shorter windows at the start (first days of the file)
+    sums = window_sum(daily, window, axis=-2, partial=True)
+    
+    population = np.asarray(population, dtype=float)
+    return sums * (per / population)[..., None, None]
+
+##################################################
+# Age Groups and Sex (Altersgruppen, Geschlecht) #
+##################################################
+
+def age_metrics(strata, days, population=None, window=8, per=100000.):
+    '''
+    Cumulative numbers, doubling times, death rates and 7-day incidence of every age group 
+    (both sexes) on every calendar day. All regions, age groups and days are computed at once 
+    from the cube by age group and sex (``RKISnapshot.strata``).
+    
+    Input
+    =====
+    
+    strata : np.array, shape (..., ndays, len(AGE_GROUPS), len(SEXES), 3)
+            Daily cases, deaths and recovered cases on contiguous calendar days
+    
+    days : np.array (datetime64[D]), shape (ndays,)
+            Calendar days
+    
+    population : float or np.array, shape (...), default = None
+            Population of the regions (NaN if unknown); the incidence of an age group refers 
+            to the whole population. No incidence if None.
+    
+    window : int, default = 8
+            Number of days per fit of the doubling times (see ``rolling_loglinear_fit``).
+    
+    per : float, default = 100000.
+            Number of inhabitants the incidence refers to
+    
+    return
+    ======
+    
+    metrics : dict
+        age_group, sex : tuple
+            ``AGE_GROUPS`` and ``SEXES``
+        date : np.array (datetime64[D])
+            Calendar days
+        fall, tod, gesund : np.array, shape (..., ndays, len(AGE_GROUPS))
+            Cumulative numbers
+        fall_sex, tod_sex : np.array, shape (..., ndays, len(SEXES))
+            Cumulative cases and deaths by sex
+        DT : np.array, shape (..., ndays, len(AGE_GROUPS))
+            Doubling time of the fit over the ``window`` days up to the day (NaN before the 
+            ``window``-th day with cases)
+        death_rate : np.array, shape (..., ndays, len(AGE_GROUPS))
+            Deaths per case in %
+        incidence_7d : np.array, shape (..., ndays, len(AGE_GROUPS))
+            Cases of the last 7 days per ``per`` inhabitants (NaN without population)
+    '''
+    import numpy as np
+    
+    strata = np.asarray(strata)
+    daily = strata.sum(axis=-2, dtype=np.int64)
+    cum = np.cumsum(daily, axis=-3).astype(float)
+    cum_sex = np.cumsum(strata.sum(axis=-3, dtype=np.int64), axis=-3).astype(float)
+    fall, tod = cum[..., 0], cum[..., 1]
+    
+    # rolling fits of all age groups along the days (last axis), only days with cases
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log(np.where(fall > 0, fall, np.nan)).swapaxes(-1, -2)
+        popt = rolling_loglinear_fit(epoch_days(days), y, window=window)[0]
+        DT = np.full(y.shape, np.nan)
+        DT[..., window - 1:] = np.round(np.log(2) / popt[..., 1], 2)
+        
+        death_rate = np.where(fall > 0, tod / fall * 100, np.nan)
+    
+    metrics = {'age_group': AGE_GROUPS, 'sex': SEXES, 'date': days, 
+               'fall': fall, 'tod': tod, 'gesund': cum[..., 2], 'fall_sex': cum_sex[..., 0], 'tod_sex': cum_sex[..., 1], 
+               'DT': DT.swapaxes(-1, -2), 'death_rate': death_rate}
+    
+    if population is not None:
+        population = np.asarray(population, dtype=float)
+        sums = window_sum(daily[..., 0].astype(float), 7, axis=-2, partial=True)
+        metrics['incidence_7d'] = sums * (per / population)[..., None, None]
+    return metrics
+
+
+####################################
+# Nowcasting (Meldeverzug)         #
+####################################
+
+def nowcast_groups(ID, by='state'):
+    '''
+    Group of every county (``NOWCAST_GROUPS``): the state ID (first two digits), the county 
+    ID or 'all'.
+    '''
+    import numpy as np
+    
+    ID = np.asarray(ID)
+    if by == 'state':
+        return ID.astype('S2')
+    if by == 'county':
+        return ID
+    if by == 'all':
+        return np.repeat(np.array(['all']), len(ID))
+    raise ValueError('Unknown groups ' + str(by) + ', use one of ' + ', '.join(NOWCAST_GROUPS))
+
+
+class ReportingTriangle(object):
+    '''
+    Daily cases by notification date (Meldedatum) as known at the successive Datenstand of a 
+    history of RKI files. The cases of a day are notified with a delay: the following files 
+    show how many of them were known after d = 1, 2, ... days, up to ``max_delay`` days after 
+    which they are taken as complete. From this the share of the cases known after d days 
+    is learnt (``completeness``) and the last days of a file are corrected (``nowcast``).
+    
+    Only the last ``max_delay + 1`` days of every file are kept, the memory does not grow 
+    with the number of files.
+    
+    Input
+    =====
+    
+    source : str, list of str or iterable
+            Archive directory (``RKIArchive``), csv files of the RKI database with different 
+            Datenstand or (Datenstand, ID, days, cases) of every file (see ``RKIArchive.case_counts``)
+    
+    max_delay : int, default = NOWCAST_MAX_DELAY
+            Days after which the cases of a notification day are taken as complete
+    
+    Attributes
+    ==========
+    
+    ID : np.array
+            IDs of the counties (sorted)
+    
+    days : np.array (datetime64[D])
+            Contiguous notification days up to the last Datenstand
+    
+    datenstand : np.array (datetime64[D])
+            Datenstand of the files (ascending)
+    
+    known : np.array, shape (len(ID), len(days), max_delay + 1)
+            Cases of a county and day known 0 ... max_delay days later (NaN without file of 
+            that Datenstand)
+    '''
+    
+    def __init__(self, source, max_delay=NOWCAST_MAX_DELAY):
+        import os
+        import numpy as np
+        
+        if isinstance(source, str):
+            source = [source]
+        history = source
+        if isinstance(source, list) and all(isinstance(entry, str) for entry in source):
+            if len(source) == 1 and os.path.isdir(source[0]):
+                history = RKIArchive(source[0]).case_counts()
+            else:
+                history = self._files(source)
+        
+        # cases of the last days of every file, by delay
+        delay = np.arange(max_delay + 1)
+        recent = {}
+        for date, ID, days, cases in history:
+            date = np.datetime64(date, 'D')
+            counts = np.zeros((len(ID), len(delay)))
+            if len(days):
+                pos = np.minimum(np.searchsorted(days, date - delay), len(days) - 1)
+                found = days[pos] == date - delay
+                counts[:, found] = cases[:, pos[found]]
+            recent[date] = (ID, counts)
+        if not recent:
+            raise ValueError('No files of the RKI database in ' + str(source))
+        
+        self.datenstand = np.array(sorted(recent))
+        self.ID = np.unique(np.concatenate([ID for ID, _ in recent.values()]))
+        self.days = np.arange(self.datenstand[0] - max_delay, self.datenstand[-1] + 1)
+        self.known = np.full((len(self.ID), len(self.days), len(delay)), np.nan)
+        for date, (ID, counts) in recent.items():
+            day_index = (date - delay - self.days[0]).astype(int)
+            # zero for counties without cases in the file
+            self.known[:, day_index, delay] = 0
+            self.known[np.searchsorted(self.ID, ID)[:, None], day_index, delay] = counts
+    
+    @staticmethod
+    def _files(filenames):
+        '''
+        (Datenstand, ID, days, cases) of csv files of the RKI database.
+        '''
+        for filename in filenames:
+            snapshot = RKISnapshot(filename, state_name='')
+            yield snapshot.datenstand, snapshot.ID, snapshot.days, snapshot.cube[..., 0]
+    
+    def completeness(self, by='state', window=NOWCAST_WINDOW, resamples=NOWCAST_RESAMPLES, seed=0):
+        '''
+        Share of the cases of a notification day known after d = 0 ... max_delay days, for 
+        groups of counties: the sum of the cases known after d days divided by the sum of the 
+        complete cases over the last ``window`` complete days. The resamples draw these days 
+        with replacement; all groups, delays and resamples are computed at once. Delays 
+        without any file (e.g. files of every other day) are interpolated linearly.
+        
+        Input
+        =====
+        
+        by : str, default = 'state'
+                Groups of counties sharing one reporting delay (``NOWCAST_GROUPS``)
+        
+        window : int, default = NOWCAST_WINDOW
+                Number of complete days (the last ones with a file ``max_delay`` days later)
+        
+        resamples : int, default = NOWCAST_RESAMPLES
+                Number of resamples of the days
+        
+        seed : int, default = 0
+                Seed of the resamples
+        
+        return
+        ======
+        
+        completeness : dict
+            group : np.array
+                Groups (sorted, see ``nowcast_groups``)
+            share : np.array, shape (len(group), max_delay + 1)
+                Share of the cases known after d days (1 if it cannot be estimated: no 
+                correction)
+            share_boot : np.array, shape (resamples, len(group), max_delay + 1)
+                Shares of the resamples
+            days : np.array (datetime64[D])
+                Complete days used
+        '''
+        import numpy as np
+        
+        max_delay = self.known.shape[-1] - 1
+        group, member = np.unique(nowcast_groups(self.ID, by), return_inverse=True)
+        complete = np.flatnonzero(~np.isnan(self.known[:, :, -1]).any(axis=0))[-window:]
+        
+        # cases of the groups, only delays with a file
+        onehot = (member == np.arange(len(group))[:, None]).astype(float)
+        known = np.tensordot(onehot, self.known[:, complete], axes=(1, 0))
+        observed = ~np.isnan(self.known[:, complete]).any(axis=0)
+        known = np.where(observed, known, 0)
+        final = np.where(observed, known[..., -1:], 0)
+        
+        # weights of the days: all days once (estimate) and the resamples
+        n = len(complete)
+        idx = np.random.RandomState(seed).randint(0, n, (resamples, n)) if n else np.zeros((resamples, 0), dtype=int)
+        weights = np.vstack([np.ones(n), (idx[:, :, None] == np.arange(n)).sum(axis=1)])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.tensordot(weights, known, axes=(1, 1)) / np.tensordot(weights, final, axes=(1, 1))
+            
+            delays = np.flatnonzero(observed.any(axis=0))
+            if 0 < len(delays) < len(observed.T):
+                interp = np.array([np.interp(np.arange(max_delay + 1), delays, e) for e in np.eye(len(delays))])
+                share = np.dot(share[..., delays], interp)
+            share[~(share > 0)] = 1
+        
+        return {'group': group, 'share': share[0], 'share_boot': share[1:], 'days': self.days[complete]}
+
+
+def nowcast(cases, ID, days, datenstand, completeness, by='state', level=0.95, seed=0):
+    '''
+    Corrects the daily cases of the last days before ``datenstand`` for the cases notified 
+    later: the cases known after d days are divided by the share of the cases known after d 
+    days (``ReportingTriangle.completeness``). The intervals combine the resamples of the 
+    shares with a Poisson distributed number of the cases still to come. All counties and 
+    days are computed at once.
+    
+    Input
+    =====
+    
+    cases : np.array, shape (len(ID), len(days))
+            Daily cases on contiguous notification days (e.g. ``RKISnapshot.cube[..., 0]``)
+    
+    ID : np.array
+            County IDs
+    
+    days : np.array (datetime64[D])
+            Notification days
+    
+    datenstand : str
+            Datenstand of ``cases`` ('YYYY-MM-DD')
+    
+    completeness : dict
+            Shares of the groups of counties (see ``ReportingTriangle.completeness``)
+    
+    by : str, default = 'state'
+            Groups of ``completeness`` (``NOWCAST_GROUPS``); counties of other groups are 
+            not corrected
+    
+    level : float, default = 0.95
+            Level of the intervals
+    
+    seed : int, default = 0
+            Seed of the Poisson numbers
+    
+    return
+    ======
+    
+    nowcast : dict
+        ID : np.array
+            Counties
+        days, delay : np.array
+            Corrected days (less than ``max_delay`` days before ``datenstand``) and their delay
+        reported, nowcast, low, high : np.array, shape (len(ID), len(days))
+            Known and corrected cases with the interval of ``level``
+        total_reported, total_nowcast, total_low, total_high : np.array, shape (len(days),)
+            The same for the sum of all counties
+        datenstand, level :
+            Input
+    '''
+    import numpy as np
+    
+    share, share_boot = completeness['share'], completeness['share_boot']
+    delay = (np.datetime64(datenstand, 'D') - days).astype(int)
+    recent = np.flatnonzero((delay >= 0) & (delay < share.shape[-1] - 1))
+    
+    # share of every county and day, no correction outside of the groups
+    labels = nowcast_groups(ID, by)
+    pos = np.minimum(np.searchsorted(completeness['group'], labels), len(completeness['group']) - 1)
+    grouped = completeness['group'][pos] == labels
+    F = np.ones((len(ID), len(recent)))
+    F[grouped] = share[pos[grouped]][:, delay[recent]]
+    F_boot = np.ones((len(share_boot), len(ID), len(recent)))
+    F_boot[:, grouped] = share_boot[:, pos[grouped]][..., delay[recent]]
+    
+    reported = cases[:, recent].astype(float)
+    result = {'ID': ID, 'days': days[recent], 'delay': delay[recent], 'reported': reported, 'nowcast': reported / F, 
+              'datenstand': datenstand, 'level': level}
+    
+    # resamples of the shares plus the cases still to come
+    draws = reported + np.random.RandomState(seed).poisson(np.maximum(reported / F_boot - reported, 0))
+    for prefix, values, samples in [('', reported, draws), ('total_', reported.sum(axis=0), draws.sum(axis=1))]:
+        if prefix:
+            result['total_reported'] = values
+            result['total_nowcast'] = result['nowcast'].sum(axis=0)
+        interval = np.full(values.shape + (2,), np.nan)
+        if len(samples) and values.size:
+            interval = _interval(np.moveaxis(samples, 0, -1).reshape(-1, len(samples)), level).reshape(interval.shape)
+        result[prefix + 'low'], result[prefix + 'high'] = interval[..., 0], interval[..., 1]
+    return result
+
+
+##################################################################################################
+# Logarithmic Plot of Cumulative Cases (Logarithmische Darstellung der aufsummierten Fallzahlen) #
+##################################################################################################
+
+def get_people_of_county(asked_ID, filename = POPULATION_FILE): 
+    # only Bavaria in the file, None for other counties
+    return population_index(filename).get(asked_ID)
+
+
+
+def _pyplot():
+    '''
+    Imports ``matplotlib.pyplot`` for the first figure. The non-interactive Agg backend is used 
+    unless a backend was chosen before (environment variable MPLBACKEND or pyplot already 
+    imported, e.g. in a notebook).
+    '''
+    import os
+    import sys
+    import matplotlib
+    
+    if 'matplotlib.pyplot' not in sys.modules and not os.environ.get('MPLBACKEND'):
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _tight_bbox(fig, bbox_extra_artists, pad_inches=None):
+    '''
+    Computes the bounding box (in inches) which ``savefig(..., bbox_inches='tight')`` uses. 
+    The text extents are measured with the renderer of the canvas without drawing the whole 
+    figure, so the box can be computed once and passed to several ``savefig`` calls.
+    '''
+    from matplotlib import rcParams
+    from matplotlib.backends.backend_agg import RendererAgg
+    from matplotlib.legend import Legend
+    from matplotlib.transforms import Affine2D, Bbox, TransformedBbox
+    
+    if hasattr(fig.canvas, 'get_renderer'):
+        renderer = fig.canvas.get_renderer()
+    else:
+        # canvas of a backend without renderer (e.g. MPLBACKEND=pdf)
+        renderer = RendererAgg(fig.bbox.width, fig.bbox.height, fig.dpi)
+    bbox_inches = fig.get_tightbbox(renderer)
+    
+    bbox_filtered = []
+    for a in bbox_extra_artists:
+        if isinstance(a, Legend):
+            # the frame of a legend is only placed when it is drawn
+            a.draw(renderer)
+        bbox = a.get_window_extent(renderer)
+        if a.get_clip_on():
+            clip_box = a.get_clip_box()
+            if clip_box is not None:
+                bbox = Bbox.intersection(bbox, clip_box)
+            clip_path = a.get_clip_path()
+            if clip_path is not None and bbox is not None:
+                clip_path = clip_path.get_fully_transformed_path()
+                bbox = Bbox.intersection(bbox, clip_path.get_extents())
+        if bbox is not None and (bbox.width != 0 or bbox.height != 0):
+            bbox_filtered.append(bbox)
+    
+    if bbox_filtered:
+        bbox_extra = TransformedBbox(Bbox.union(bbox_filtered), Affine2D().scale(1.0 / fig.dpi))
+        bbox_inches = Bbox.union([bbox_inches, bbox_extra])
+    
+    if pad_inches is None:
+        pad_inches = rcParams['savefig.pad_inches']
+    return bbox_inches.padded(pad_inches)
+
+
+class PDFWriter(object):
+    '''
+    Writes the figures as vector pdf files (default of ``plot_corona`` and ``plot_DT``).
+    
+    Input
+    =====
+    
+    dpi : int, default = 300
+            Resolution of rasterised parts of the figures
+    '''
+    # separate file of panel 1 of the county plots ('plots/'), besides the expert plot
+    panel_files = True
+    
+    # bounding box of the county plots computed once and reused for all counties
+    reuse_layout = False
+    
+    def __init__(self, dpi=300):
+        self.dpi = dpi
+    
+    def path(self, name):
+        '''
+        File written for the figure ``name`` (e.g. 'plots/LK Miesbach').
+        '''
+        return name + '.pdf'
+    
+    def save(self, fig, name, bbox_inches=None):
+        fig.savefig(self.path(name), dpi=self.dpi, overwrite=True, bbox_inches=bbox_inches)
+
+
+class PreviewWriter(PDFWriter):
+    '''
+    Writes low resolution previews of the figures into a separate directory, e.g. 
+    'preview/expert/LK Miesbach_expert.png'. Drawing the artists takes most of the time at any 
+    resolution, so previews skip the separate file of panel 1, reuse the layout of the first 
+    county and are not trimmed to a tight bounding box. Lines and collections with many 
+    points are rasterised if a vector format is chosen.
+    
+    Input
+    =====
+    
+    directory : str, default = 'preview'
+            Output directory (the subdirectories 'plots' and 'expert' are created)
+    
+    dpi : int, default = 30
+            Resolution, e.g. 30 dpi gives 840 x 630 pixels for the overview figures
+    
+    fmt : str, default = 'png'
+            File format supported by matplotlib
+    '''
+    # artists with more points are rasterised in vector formats
+    dense_points = 100
+    
+    panel_files = False
+    reuse_layout = True
+    
+    def __init__(self, directory='preview', dpi=30, fmt='png'):
+        PDFWriter.__init__(self, dpi)
+        self.directory = directory
+        self.fmt = fmt
+    
+    def path(self, name):
+        import os
+        
+        return os.path.join(self.directory, name + '.' + self.fmt)
+    
+    def save(self, fig, name, bbox_inches=None):
+        import os
+        from matplotlib.collections import Collection
+        from matplotlib.lines import Line2D
+        
+        path = self.path(name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        
+        if self.fmt in ('pdf', 'svg', 'eps', 'ps'):
+            for ax in fig.axes:
+                for artist in ax.lines + ax.collections:
+                    if isinstance(artist, Line2D):
+                        dense = len(artist.get_xdata()) > self.dense_points
+                    else:
+                        dense = sum([len(p.vertices) for p in artist.get_paths()]) > self.dense_points
+                    artist.set_rasterized(dense)
+        
+        # 'tight' draws the figure twice
+        if bbox_inches == 'tight':
+            bbox_inches = None
+        fig.savefig(path, dpi=self.dpi, bbox_inches=bbox_inches)
+
+
+class ReportWriter(PDFWriter):
+    '''
+    Streams all figures into multi-page pdf files instead of one file per figure: 
+    'report_<report>.pdf' with panel 1 of the counties and the overviews, and 
+    'report_<report>_expert.pdf' with the expert plots. Fonts are embedded once per file and 
+    every page is written to the file when it is saved. ``close`` adds a table of contents 
+    and closes the files.
+    
+    Input
+    =====
+    
+    directory : str, default = '.'
+            Output directory
+    
+    dpi : int, default = 300
+            Resolution of rasterised parts of the figures
+    
+    Attributes
+    ==========
+    
+    report : str
+            Name of the report the next figures are added to, e.g. the state
+    '''
+    def __init__(self, directory='.', dpi=300):
+        PDFWriter.__init__(self, dpi)
+        self.directory = directory
+        self.report = 'all'
+        
+        # open files and titles of their pages
+        self.files = {}
+        self.pages = {}
+    
+    def path(self, name):
+        import os
+        
+        suffix = '_expert' if name.startswith('expert/') else ''
+        return os.path.join(self.directory, 'report_' + self.report + suffix + '.pdf')
+    
+    def save(self, fig, name, bbox_inches=None):
+        import os
+        from matplotlib.backends.backend_pdf import PdfPages
+        
+        path = self.path(name)
+        if path not in self.files:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self.files[path] = PdfPages(path)
+            self.pages[path] = []
+        
+        self.files[path].savefig(fig, dpi=self.dpi, bbox_inches=bbox_inches)
+        self.pages[path].append(os.path.basename(name).replace('_expert', ''))
+    
+    def close(self, order=None, lines_per_page=60):
+        '''
+        Adds the table of contents to every report and closes the files.
+        
+        Input
+        =====
+        
+        order : dict, default = None
+                Sort value and text of the pages, e.g. {'LK Miesbach': (206.06, '206.06 d')}. 
+                Pages with an entry are listed in ascending order after the other pages.
+        
+        lines_per_page : int, default = 60
+                Entries per page of the table of contents
+        '''
+        plt = _pyplot()
+        
+        if order is None:
+            order = {}
+        
+        for path in sorted(self.files):
+            pages = self.pages[path]
+            other = [(i, title) for i, title in enumerate(pages) if title not in order]
+            ranked = sorted([(order[title][0], i, title) for i, title in enumerate(pages) if title in order])
+            
+            lines = ['%4d  %s' % (i + 1, title) for i, title in other]
+            lines += ['%4d  %-50s %s' % (i + 1, title, order[title][1]) for value, i, title in ranked]
+            
+            for start in range(0, len(lines), lines_per_page):
+                fig = plt.figure(figsize=(8.27, 11.69))
+                if start == 0:
+                    fig.text(0.08, 0.95, 'Inhalt / Contents', fontsize=14, va='top')
+                fig.text(0.08, 0.92, '\n'.join(lines[start:start + lines_per_page]), 
+                         family='monospace', fontsize=8, va='top')
+                self.files[path].savefig(fig)
+                plt.close(fig)
+            
+            self.files[path].close()
+        
+        self.files = {}
+        self.pages = {}
+
+
+class CountyFigure(object):
+    '''
+    Layout of the 4 panel figure of ``plot_corona``. The axes, labels, annotations and 
+    explanations are created only once; ``plot_corona`` only exchanges the data of the 
+    figure for every county. Reuse one instance for all counties to avoid rebuilding the 
+    static parts of the figure.
+    
+    Input
+    =====
+    
+    writer : PDFWriter, default = None
+            Output files (default: pdf files)
+    
+    last_day : float, default = None
+            Last day of the data (days since ``EPOCH``); the time axis is extended beyond 
+            the default ``AXIS_DAY_MAX`` for longer series
+    '''
+    
+    # events marked below plot 1 to 4
+    events = [('Ausgangssperre', '2020-03-21'), ('Ostern', '2020-04-12'), ('Ende Ferien', '2020-04-20')]
+    
+    def __init__(self, writer=None, last_day=None):
+        plt = _pyplot()
+        
+        # output files (default: pdf)
+        self.writer = writer if writer is not None else PDFWriter()
+        self.bbox = None
+        import numpy as np
+        import matplotlib.ticker as ticker
+        from matplotlib.ticker import ScalarFormatter
+        from matplotlib.collections import LineCollection, PolyCollection
+        
+        self.day_max = day_max = AXIS_DAY_MAX if last_day is None else axis_day_max(last_day)
+        ticks, tick_labels = day_ticks(day_max)
+        months, month_labels = month_ticks(day_max)
+        events = [(label, epoch_days(date)) for label, date in self.events]
+        
+        self.x = np.arange(10,day_max,0.5)
+        x = self.x
+        
+        fig, ax = plt.subplots(4, figsize=(10,22), gridspec_kw={'height_ratios': [3, 1, 1, 1]})
+        self.fig = fig
+        self.ax = ax
+        
+        ax[0].axis([AXIS_DAY_MIN, day_max, 0.9, 1e5])
+        
+        ax[0].set_title('Abb. 1', loc='right', fontsize=8)
+        ax[1].axis([AXIS_DAY_MIN, day_max, 0.8, 1e3])
+        ax[1].set_title('Abb. 2', loc='right', fontsize=8)
+        ax[2].set_xlim([AXIS_DAY_MIN, day_max])
+        ax[2].set_title('Abb. 3', loc='right', fontsize=8)
+        ax[3].set_xlim([AXIS_DAY_MIN, day_max])
+        ax[3].set_title('Abb. 4', loc='right', fontsize=8)
+        
+        ###########
+        # plot 1
+        ###########
+        
+        # fits of all windows in one collection, the segments are exchanged for every county
+        # (below the data points, same line style as a single plotted fit)
+        self.fit_fan = ax[0].add_collection(LineCollection([], zorder=1.9, capstyle='projecting', joinstyle='round'), 
+                                            autolim=False)
+        
+        # Beatmungsampel and Fehler of the last fit
+        label_ampel = 'Ampel (Beatmungsbedarf ca. 5%)'
+        self.ampel_lines = [ax[0].semilogy([], [], '-', lw=3, color=plt.cm.Reds(200), label=label_ampel)[0], 
+                            ax[0].semilogy([], [], '-', lw=3, color=plt.cm.jet(180), label=label_ampel)[0], 
+                            ax[0].semilogy([], [], '-', lw=3, color=plt.cm.Greens(200), label=label_ampel)[0], 
+                            ax[0].semilogy([], [], '--', color='k', alpha=0.5, label='Unsicherheiten')[0], 
+                            ax[0].semilogy([], [], '--', color='k', alpha=0.5)[0]]
+        
+        # Beatmungs Kapazitaet
+        self.capacity_lines = [ax[0].plot([x[0], x[-1]], [np.nan]*2, 'k:', label="Kapazitaet Beatmungsapparate")[0], 
+                               ax[0].plot([x[0], x[-1]], [np.nan]*2, 'k:')[0]]
+        
+        # gemeldete Fallzahlen
+        self.case_lines = [ax[0].semilogy([], [], 'k+', label="COVID19 erkrankt")[0], 
+                           ax[0].semilogy([], [], 'k*', label="davon verstorben")[0], 
+                           ax[0].semilogy([], [], 'ko', alpha=0.3, label="davon genesen")[0]]
+        
+        for axis in [ax[0].xaxis, ax[0].yaxis]:
+            axis.set_major_formatter(ScalarFormatter())
+        
+        ax[0].grid(True, which="both")
+        ax[0].set_xticks(ticks)
+        ax[0].set_xticklabels(tick_labels)
+        
+        for pos, label in zip(months, month_labels):
+            ax[0].text(pos, 0.5, label)
+        
+        for label, day in events:
+            ax[0].annotate(label, ha='center', xy=(day, ax[0].get_ylim()[0]), xytext=(day, 0.4), 
+                            arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
+        
+        # credit bar
+        credit = 'Christine Greif\nhttp://www.usm.uni-muenchen.de/~koepferl\nThis work is licensed under CC-BY-SA 4.0\nData: NPGEO-DE; VZ = Verdopplungszeit'
+        loc_label = ax[0].get_xlim()[1] * 1.12
+        link = ax[0].text(loc_label, 9e4, credit, fontsize=8, va='top')
+        link.set_url('http://www.usm.uni-muenchen.de/~koepferl')
+        
+        # label
+        ax[0].set_ylabel('Gesamte Fallzahlen')
+        
+        # percent
+        #########
+        self.axi = ax[0].twinx()
+        self.axi.set_yscale('log')
+        self.axi.yaxis.set_major_formatter(ScalarFormatter())
+        self.axi.yaxis.set_major_formatter(ticker.FuncFormatter(lambda y,pos: ('{{:.{:1d}f}}%'.format(int(np.maximum(-np.log10(y),0)))).format(y)))
+        
+        ###########
+        # plot 2
+        ###########
+        ax[1].set_ylabel('Taeglich gemeldete Fallzahlen')
+        
+        # gemittelt ueber 7 Tage
+        self.smooth_lines = [ax[1].semilogy([], [], 'r-', label='neu erkrankt (7-Tagesmittel)')[0], 
+                             ax[1].semilogy([], [], 'k-', label='verstorben (7-Tagesmittel)')[0], 
+                             ax[1].semilogy([], [], 'k-', alpha=0.3, label='genesen (7-Tagesmittel)')[0]]
+        
+        # boxes of all days in one collection each, the polygons are exchanged for every county
+        self.bars = [ax[1].add_collection(PolyCollection([], linewidths=1, edgecolors='k', facecolors=plt.cm.jet(180), 
+                                                         label='neu erkrankt'), autolim=False), 
+                     ax[1].add_collection(PolyCollection([], linewidths=1, edgecolors='k', facecolors='None', 
+                                                         label='genesen', hatch='////'), autolim=False), 
+                     ax[1].add_collection(PolyCollection([], linewidths=1, edgecolors='k', facecolors='w', 
+                                                         label='verstorben'), autolim=False)]
+        
+        for axis in [ax[1].xaxis, ax[1].yaxis]:
+            axis.set_major_formatter(ScalarFormatter())
+        
+        ax[1].set_axisbelow(True)
+        ax[1].grid(True, which="both")
+        ax[1].set_xticks(ticks)
+        ax[1].set_xticklabels(tick_labels)
+        
+        for pos, label in zip(months, month_labels):
+            ax[1].text(pos, 0.3, label)
+        
+        for label, day in events:
+            ax[1].annotate(label, ha='center', xy=(day, ax[1].get_ylim()[0]), xytext=(day, 0.2), 
+                            arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
+        
+        ###########
+        # plot 3
+        ###########
+        ax[2].set_ylabel('Verdopplungszeiten in Tage')
+        ax[2].plot(ax[2].get_xlim(), [10,10], ':', lw =2, color='grey', label='VZ = 10') 
+        self.DT_band = ax[2].add_collection(PolyCollection([], facecolors='grey', edgecolors='none', alpha=0.3, 
+                                                           label='95%-Intervall (Bootstrap)'), autolim=False)
+        self.DT_line = ax[2].plot([], [], 'k.-')[0]
+        self.DT_falling = ax[2].plot([], [], '^', color=plt.cm.Reds(200), label='Achtung: VZ faellt (!!!)')[0]
+        
+        ax[2].grid(True, which="both")
+        ax[2].set_xticks(ticks)
+        ax[2].set_xticklabels(tick_labels)
+        
+        ax[2].legend(loc='best')
+        
+        ###########
+        # plot 4
+        ###########
+        ax[3].set_ylabel('Interpolierte Reproduktionszahl')
+        
+        ax[3].plot(ax[3].get_xlim(), [1,1], ':', lw =2, color='grey', label='R = 1') 
+        self.R_line = ax[3].plot([], [], 'k.-')[0]
+        self.R_high = ax[3].plot([], [], '^', color=plt.cm.Reds(200), label='Achtung: R > 1 (!!!)')[0]
+        
+        ax[3].grid(True, which="both")
+        ax[3].set_xticks(ticks)
+        ax[3].set_xticklabels(tick_labels)
+        ax[3].legend(loc='best')
+        
+        # month labels and annotations below plot 3 and 4 follow the y range of the data
+        self.month_texts = {}
+        self.annotations = {}
+        for i, lockdown in [(2, 'Lock-down'), (3, 'Lock-down')]:
+            self.month_texts[i] = [ax[i].text(pos, 0, label) for pos, label in zip(months, month_labels)]
+            labels = [lockdown] + [label for label, day in events[1:]]
+            self.annotations[i] = [ax[i].annotate(label, ha='center', xy=(day, 0), xytext=(day, 0), 
+                                                  arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6) 
+                                   for label, (_, day) in zip(labels, events)]
+        
+        self.explanations = [ax[3].text(ax[3].get_xlim()[1] * 1.02, 0, 
+                   'zu Abb. 1: \nBei Kreisen mit sehr kurzen Verdopplungszeiten wird \nder Verlauf nicht/kaum flacher; mit sehr langen \nVerdopplungszeiten (wenigen Neuerkrankten) \nist der Verlauf fast horizontal. \n(Ziel: horizontale Linie).'), 
+                             ax[3].text(ax[3].get_xlim()[1] * 1.02, 0, 
+                   'zu Abb. 2: \nBalkendiagramm der taeglich gemeldeten Fallzahlen. \n(Ziel: keine gelben und weissen Balken.)'
+                   ), 
+                             ax[3].text(ax[3].get_xlim()[1] * 1.02, 0, 
+                   'zu Abb. 3: \nVerdopplungszahl gibt die Zeit an in der sich die \nFallzahlen verdoppeln. Verdopplungszeiten kleiner \nals 10 oder abnehmend sind bedenklich. \n(Ziel: keine verkuerzenden Verdopplungszeiten \nund viel groesser als 10).'
+                   ), 
+                             ax[3].text(ax[3].get_xlim()[1] * 1.02, 0, 
+                   'zu Abb. 4: \nReproduktionszahl gibt die Anzahl der \nWeiteransteckungen durch einen Infizierten an. \nReproduktionszahl groesser als 1 ist bedenklich. \n(Ziel: Reproduktionszahl viel kleiner als 1).'
+                   )]
+    
+    def update_ylim(self, i):
+        '''
+        Rescales the y axis of plot 3 or 4 to the current data and moves the labels below it.
+        '''
+        ax = self.ax[i]
+        ax.relim()
+        ax.autoscale_view(scalex=False)
+        
+        offset = ax.get_ylim()[0] - (ax.get_ylim()[1] - ax.get_ylim()[0]) / 5.
+        for tx in self.month_texts[i]:
+            tx.set_y(offset)
+        for an in self.annotations[i]:
+            an.xy = (an.xy[0], ax.get_ylim()[0])
+            an.set_position((an.xy[0], offset))
+        
+        if i == 3:
+            for tx, frac in zip(self.explanations, [1., 0.75, 0.35]):
+                tx.set_y(ax.get_ylim()[1] * frac)
+            self.explanations[3].set_y(ax.get_ylim()[0])
+    
+    def save(self, name):
+        '''
+        Saves the expert plot (all panels) and the plot of panel 1 with the same bounding box 
+        (see ``writer``).
+        '''
+        ax = self.ax
+        lgd = ax[0].get_legend()
+        
+        # layout computed once for both files
+        if self.bbox is None or not self.writer.reuse_layout:
+            self.bbox = _tight_bbox(self.fig, (lgd,) + tuple(self.month_texts[3]))
+        bbox = self.bbox
+        
+        self.writer.save(self.fig, 'expert/' + name + '_expert', bbox_inches=bbox)
+        if not self.writer.panel_files:
+            return
+        
+        ##################
+        # save plot ax[0]
+        ##################
+        for a in ax[1:]:
+            a.set_visible(False)
+        try:
+            self.writer.save(self.fig, 'plots/' + name, bbox_inches=bbox)
+        finally:
+            for a in ax[1:]:
+                a.set_visible(True)
+
+
+def county_metrics(num_dic, day, month, name=None, resamples=BOOTSTRAP_RESAMPLES, seed=0):
     '''
-    Reads file of the RKI database and selects the relevant data for the specific county.
+    Computes the numbers shown by ``plot_corona`` without plotting: rolling fits and doubling 
+    times with their bootstrap intervals, reproduction numbers, 7-day means, weekly increments 
+    and rates of one county. Only days with cases are used.
     
     Input
     =====
     
-    filename : str
-                path to '*.csv' file downloaded from the RKI.
+    num_dic :  dictionary {'fall': array, 'tod':array, 'gesund': array}
+           Array of cumulative number of cases
     
-    LandkreisID : str
-                String with 5 number entries to select the specific county.
+    day, month : np.array
+           Day of the month and month number (1 = January 2020) of the notification days
     
-    state_name : str, default = 'Bavaria'
-                Name of the state.
+    name : str, default = None
+           Name of the region
+    
+    resamples, seed : int, default = BOOTSTRAP_RESAMPLES, 0
+           Bootstrap of the intervals of the doubling times (see ``bootstrap_DT``)
     
     return
     ======
     
-    dic :  dictionary {'fall': array, 'tod':array, 'gesund': array}
-           Array of cumulative number of cases
-    
-    uday :  np.array
-            Individual days of notification to the RKI
-    
-    umonth : np.array
-            Individual month of notification to the RKI
-    
-    region_name : str
-            Name of specific region
+    metrics : dict
+        name : str
+        day : np.array
+            Days since ``EPOCH`` (March time frame, 1 = 1 March 2020)
+        date : np.array (datetime64[D])
+            Notification days
+        day_real, month : np.array
+            Day of the month and month number
+        fall, tod, gesund : np.array
+            Cumulative numbers
+        popt, pcov : np.array, shape (n - 7, 2) and (n - 7, 2, 2)
+            Fits of the 8 days up to day ``7 + i`` (see ``rolling_loglinear_fit``)
+        DT_ci : np.array, shape (n - 7, 2)
+            95% bootstrap interval of the doubling times (see ``bootstrap_DT``)
+        DT, R4, Ntot_today, Ntot_week : list
+            Doubling time, reproduction number of the last 4 against the 4 notifications 
+            before, total cases and increment of the last week of every fit
+        daily : dict
+            Daily numbers ('day', 'fall', 'gesund', 'tod', ``pass_all`` of ``plot_corona``)
+        smooth : dict
+            Daily numbers averaged over 7 notification days ('fall', 'tod', 'gesund', from day 7)
+        R_interp : np.array
+            Reproduction number from the interpolated cumulative cases 4 and 8 days before
+        rates : dict
+            Death, recovery and ill rates in %
+    '''
+    return batch_county_metrics([(num_dic, day, month, name)], resamples=resamples, seed=seed)[0]
 
-    dic_LK : dict={'name', 'ID'}
-            Alphabetical sorted names of counties and corresponding IDs
-    
-    state : li[dat_state, num_state, name_state]
-            List of dates, cumulative case numbers and state name
-    
+
+def batch_county_metrics(series, resamples=BOOTSTRAP_RESAMPLES, seed=0, jobs=1):
     '''
+    ``county_metrics`` of many counties at once. The rolling fits, the bootstrap intervals 
+    and the sliding windows are computed once for the matrix of counties x notification days 
+    (NaN padding at the end of shorter rows) and sliced per county afterwards.
     
-    import numpy as np
-    daten_RKI = np.loadtxt(filename, 
-                           skiprows=1, 
-                           delimiter=',', 
-                           usecols=(9,3,8,6,7,-3),
-                           dtype={'names': ('lkID', 'lk_name', 'datum', 'fall', 'tod', 'gesund'), 'formats': ( 'S6', 'S40', 'S10', 'i4', 'i4', 'i4')})
-    
-    
-    # state average
-    dat_state = np.unique(daten_RKI['datum'])
-    case_state = []
-    #tod_state = []
-    #gesund_state = []
-    
-    for dat in dat_state:
-        case_state_dat = daten_RKI['fall'][daten_RKI['datum'] == dat]
-        #tod_state_dat = daten_RKI['tod'][daten_RKI['datum'] == dat]
-        #gesund_state_dat = daten_RKI['gesund'][daten_RKI['datum'] == dat]
-        case_state.append(np.sum(case_state_dat))#[case_state_dat > 0]))
-    num_state = np.cumsum(np.array(case_state))
-    
-    # select unique region
-    indexes = np.unique(daten_RKI['lkID'], return_index=True)[1]
-    uID = daten_RKI['lkID'][indexes]
-    u_index_name = daten_RKI['lk_name'][indexes]
-    
-    # sort and put to dic
-    sort_index = np.argsort(u_index_name)
-    dic_LK = {'name': u_index_name[sort_index], 'ID': uID[sort_index]}
-    
-    # rename umlaut
-    for i in range(len(dic_LK['name'])):
+    Input
+    =====
     
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xb6', 'oe')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x83\xc2\xb6', 'ae')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xa4', 'ae')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xbcr', 'ue')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x83\xc2\xbc', 'ue')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\xbc', 'ue')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x9f', 'ss')
-        dic_LK['name'][i] = dic_LK['name'][i].replace('\xc3\x83\xc5\xb8', 'ss')
+    series : list of (num_dic, day, month, name)
+           Data of every county, e.g. the first four values of ``RKISnapshot.county``
     
-    daten_RKI = daten_RKI[daten_RKI['lkID'] == LandkreisID]
-    region_name = dic_LK['name'][dic_LK['ID'] == LandkreisID][0]
+    resamples, seed : int, default = BOOTSTRAP_RESAMPLES, 0
+           Bootstrap of the intervals of the doubling times (see ``bootstrap_DT``)
     
-    print 'region_name loaded', region_name 
+    jobs : int, default = 1
+           Number of processes of the bootstrap
     
-    # splitting date
-    year = np.zeros(len(daten_RKI['datum'])).astype('int')
-    month = np.zeros(len(daten_RKI['datum'])).astype('int')
-    day = np.zeros(len(daten_RKI['datum'])).astype('int')
+    return
+    ======
     
-    dat_sting = daten_RKI['datum']
-    for i in range(len(dat_sting)):
-        li = dat_sting[i].split('/')
-        year[i] = int(li[0])
-        month[i] = int(li[1])
-        day[i] = int(li[2])
+    metrics : list of dict
+           ``county_metrics`` of every county in the order of ``series``
+    '''
+    import numpy as np
     
+    counties = []
+    if not len(series):
+        return counties
+    for num_dic, day, month, name in series:
+        # only days with cases
+        cases = num_dic['fall'] > 0
+        
+        ####
+        # move to March time frame
+        #########
+        date = calendar_dates(day[cases], month[cases])
+        counties.append({'name': name, 'day': epoch_days(date), 'date': date, 'day_real': day[cases], 
+                         'month': month[cases], 'fall': num_dic['fall'][cases], 'tod': num_dic['tod'][cases], 
+                         'gesund': num_dic['gesund'][cases]})
+    
+    # counties x notification days
+    length = max([len(c['day']) for c in counties] + [0])
+    x = np.full((len(counties), length), np.nan)
+    cum = np.full((len(counties), len(RKISnapshot.CUBE_FIELDS), length), np.nan)
+    for i, c in enumerate(counties):
+        x[i, :len(c['day'])] = c['day']
+        for k, field in enumerate(RKISnapshot.CUBE_FIELDS):
+            cum[i, k, :len(c['day'])] = c[field]
     
-    # sum up unique dates
-    from astropy.table import Table
-    RKI_tab = Table([daten_RKI['datum'], year, month, day, daten_RKI['fall'], daten_RKI['tod'], daten_RKI['gesund']],
-                    names=('datum', 'year', 'month', 'day', 'fall', 'tod', 'gesund'))
+    #########
+    # fit
+    #########
+    # fit only when there are more than 6 data points and cases every day.
+    # all fits at once
+    popts, pcovs = rolling_loglinear_fit(x, np.log(cum[:, 0]), window=8)
     
-    #print RKI_tab
+    # intervals of the doubling times
+    DT_ci = bootstrap_DT(x, np.log(cum[:, 0]), window=8, resamples=resamples, seed=seed, jobs=jobs)
     
-    udate = np.unique(RKI_tab['datum'])
-    uday = np.zeros(shape=udate.shape)
-    umonth = np.zeros(shape=udate.shape)
-    uyear = np.zeros(shape=udate.shape)
-    ufall = np.zeros(shape=udate.shape)
-    utod = np.zeros(shape=udate.shape)
-    ugesund = np.zeros(shape=udate.shape)
+    # sliding windows of all notification days at once
+    stats = window_statistics(cum[:, 0], x)
     
-    #print RKI_tab['datum']
+    # daily deaths and recovered cases, gemittelt ueber 7 Tage
+    daily = np.concatenate([cum[:, 1:, :1], np.diff(cum[:, 1:], axis=-1)], axis=-1)
+    smooth = window_mean(daily)
     
-    for i in range(len(udate)):
-        cond = (RKI_tab['datum'] == udate[i])
-
-        fall_day = RKI_tab['fall'][cond]
-        #print fall_day[fall_day < 0]
-        ufall[i] = np.sum(fall_day)#[fall_day > 0])
+    metrics = []
+    for i, c in enumerate(counties):
+        n, fits = len(c['day']), max(len(c['day']) - 7, 0)
+        num, num_tod, num_gesund, day = c['fall'], c['tod'], c['gesund'], c['day']
         
-        tod_day = RKI_tab['tod'][cond]
-        utod[i] = np.sum(tod_day)#[tod_day > 0])
-        #print tod_day[tod_day < 0]
+        DTs = list(np.round(np.log(2) / popts[i, :fits, 1], 2))
+        Ntot_today = list(num[7:])
+        Ntot_week = list(stats['increment'][i, 7:n])
         
-        gesund_day = RKI_tab['gesund'][cond]
-        ugesund[i] = np.sum(gesund_day)#[gesund_day > 0])
-        #print gesund_day[gesund_day < 0]
+        ########
+        # Reproduction number for Rtime notification days
+        R4s = list(stats['R'][i, 7:n])
         
-        uday[i] = RKI_tab['day'][cond][0]
-        umonth[i] = RKI_tab['month'][cond][0]
-        uyear[i] = RKI_tab['year'][cond][0]
+        pass_all = {'day': day, 'fall': stats['daily'][i, :n], 'gesund': daily[i, 1, :n], 'tod': daily[i, 0, :n]}
         
-    return {'fall': np.cumsum(ufall), 'tod': np.cumsum(utod), 'gesund':np.cumsum(ugesund)}, uday, umonth, region_name, dic_LK, [num_state, dat_state, state_name]#, uyear, udate
-
-##################################################################################################
-# Logarithmic Plot of Cumulative Cases (Logarithmische Darstellung der aufsummierten Fallzahlen) #
-##################################################################################################
-
-def get_people_of_county(asked_ID, filename = 'data_RKI/12411-001.csv'): 
-    import numpy as np
-
-    EW_ID, EW = np.loadtxt(filename, delimiter=';', 
-                       usecols=(0, -1), unpack=True, 
-                       dtype={'names': ('EW_ID', 'EW'), 'formats': ( 'S10', 'i4')})
-    
-    ID_str = asked_ID[1:]
-    return EW[EW_ID == ID_str][0]
-
+        rates = {'death_rate': num_tod / num * 100, 
+                 'recover_rate': num_gesund / num * 100, 
+                 'ill_rate': (num - num_gesund - num_tod) / num * 100,
+                  'day': day}
+        
+        c.update({'popt': popts[i, :fits], 'pcov': pcovs[i, :fits], 'DT': DTs, 'DT_ci': DT_ci[i, :fits], 
+                  'R4': R4s, 'Ntot_today': Ntot_today, 'Ntot_week': Ntot_week, 'daily': pass_all, 
+                  'smooth': {'fall': stats['mean'][i, 6:n], 'tod': smooth[i, 0, 6:n], 'gesund': smooth[i, 1, 6:n]}, 
+                  # Reproduction number for Rtime notification days (4 days interpoliert)
+                  'R_interp': stats['R_interp'][i, :n], 'rates': rates})
+        metrics.append(c)
+    return metrics
 
 
-def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None, anteil_beatmung=0.05):
+def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None, anteil_beatmung=0.05, figure=None, 
+                resamples=BOOTSTRAP_RESAMPLES, seed=0, metrics=None):
     '''
     Plots cumulative case numbers against time for the specific county. Fits for any dataset 
     larger than eight a exponential function and estimates the doubling time. For the fit only 
@@ -191,6 +3472,18 @@ def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None,
     anteil_beatmung : float, default = 0.05
             Approximated fraction of demand for intensive care
 
+    figure : CountyFigure, default = None
+            Figure to draw into. Reuse one ``CountyFigure`` for all counties to create the 
+            layout only once; by default a new figure is created and closed after saving.
+            The ``writer`` of the figure defines the output files (default: pdf).
+    
+    resamples, seed : int, default = BOOTSTRAP_RESAMPLES, 0
+            Bootstrap of the intervals of the doubling times (see ``bootstrap_DT``)
+    
+    metrics : dict, default = None
+            ``county_metrics`` of the county, e.g. computed for all counties at once by 
+            ``batch_county_metrics`` (default: computed here)
+
     return
     ======
     
@@ -212,52 +3505,35 @@ def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None,
     
         pass_all : dict
             dictionary of daily values of new cases, deaths and recovered cases
+    
+        DT_ci : np.array
+            95% bootstrap interval of every doubling time
     '''
-    import matplotlib.pyplot as plt
-    import numpy as np
-    from scipy.optimize import curve_fit
+    plt = _pyplot()
+    from matplotlib.lines import Line2D
+    
+    timer = TRACE.timer(ID)
     
     print '-' * 30
     print name
     print '-' * 30
     
-    num = num_dic['fall'][num_dic['fall'] > 0]
-    num_tod = num_dic['tod'][num_dic['fall'] > 0]
-    num_gesund = num_dic['gesund'][num_dic['fall'] > 0]
+    # all numbers of the plots - alle Kennzahlen
+    if metrics is None:
+        metrics = county_metrics(num_dic, day, month, name, resamples=resamples, seed=seed)
+    num, num_tod, num_gesund = metrics['fall'], metrics['tod'], metrics['gesund']
+    day = metrics['day']
+    popts, pcovs = metrics['popt'], metrics['pcov']
+    DTs, Ntot_today, Ntot_week, R4s = metrics['DT'], metrics['Ntot_today'], metrics['Ntot_week'], metrics['R4']
+    DT_ci = metrics['DT_ci']
     
-    day = day[num_dic['fall'] > 0]
-    month = month[num_dic['fall'] > 0]
-    day_max = 150.
-    day_ticks = [14, 18, 22, 26, 30, 3, 7, 11, 15, 19, 23, 27, 1, 5, 9, 13, 17, 21, 25, 29, 2, 6, 10, 14, 18, 22, 26, 30, 3, 7, 11, 15, 19, 23, 27]
+    close = figure is None
+    if figure is None:
+        figure = CountyFigure(last_day=day[-1])
+    fig, ax, x = figure.fig, figure.ax, figure.x
     
-    
-    fig, ax = plt.subplots(4, figsize=(10,22), gridspec_kw={'height_ratios': [3, 1, 1, 1]})
-            
     ax[0].set_title(name + ' (#' + ID +')')
-    ax[0].axis([13, day_max, 0.9, 1e5])
-    
-    ax[0].set_title('Abb. 1', loc='right', fontsize=8)
-    ax[1].axis([13, day_max, 0.8, 1e3])
-    ax[1].set_title('Abb. 2', loc='right', fontsize=8)
-    ax[2].set_xlim([13, day_max])
-    ax[2].set_title('Abb. 3', loc='right', fontsize=8)
-    ax[3].set_xlim([13, day_max])
-    ax[3].set_title('Abb. 4', loc='right', fontsize=8)
-    
-    
-    ####
-    # move to March time frame
-    #########
-    day_real = np.copy(day)
-    day[month == 2] = day[month == 2] - 29
-    day[month == 1] = day[month == 1] - 29 - 31
-    day[month == 4] = day[month == 4] + 31
-    day[month == 5] = day[month == 5] + 31 + 30
-    day[month == 6] = day[month == 6] + 31 + 30 + 31
-    day[month == 7] = day[month == 7] + 31 + 30 + 31 + 30
     
-    #print 'day now', day
-    #print 'day_real', day_real
     
     #########
     # fit
@@ -267,125 +3543,56 @@ def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None,
         #return a * b**(c*x)
         return np.log(a) + b * x  #log-linear
     
-    x = np.arange(10,day_max,0.5)
-    
     # fit only when there are more than 6 data points and cases every day.
     data_points = range(8, len(day)+1)
     
-    DTs = []
-    Ntot_today = []
-    Ntot_week = []
-    R4s = []
+    fit_labels = []
     
-    col = 30
-    colapp = []
-    print 'Tag  DTs  R4'
-    for cut in data_points:
-        #print day[cut-8:cut]
-        #print num[cut-8:cut]
-        
-        #########        
-        ### changed 8 fit
-        #########
-        #popt, pcov = curve_fit(func, day[:cut], num[:cut])
-        popt, pcov = curve_fit(func, day[cut-8:cut], np.log(num[cut-8:cut]))
-        #print len(day[cut-8:cut])
-        
-        #####
-        # loglog
-        cond_week = day[cut-8:cut] > day[cut-1] - 7
-        num_week = num[cut-8:cut][cond_week]
-        
-        Ntot_today.append(num[cut-8:cut][-1])
-        Ntot_week.append(num_week[-1] - num_week[0])
-        
-        ########
-        # Reproduction number for Rtime notification days (4 days strict)
-        
-        #%%%%%%%%#daytoday = int(day[cut-1])
-        #%%%%%%%%#dayminus4 = int(daytoday - 5)
-        #%%%%%%%%#dayminus8 = int(daytoday - 9)
-        #%%%%%%%%#print daytoday, dayminus4, dayminus8
-        #%%%%%%%%#
-        #%%%%%%%%#print num[day == daytoday], num[day == dayminus4], num[day == dayminus8]
-        #%%%%%%%%#
-        #%%%%%%%%#R4_row = (num[day == daytoday] - num[day == dayminus4]) / (num[day == dayminus4] - num[day == dayminus8])
-        #%%%%%%%%#print R4_row
-        #%%%%%%%%#
-        #%%%%%%%%#raise Exception('stop')
-        
-        ########
-        # Reproduction number for Rtime notification days
-        #print num[cut-8:cut]
+    print 'Tag  DTs  (95%)  R4'
+    for cut, DT in zip(data_points, DTs):
+        print date_label(day[cut-1]), '%6.2f'%DT, '(%6.2f - %6.2f)' % tuple(DT_ci[cut-8])#, '%6.2f'%R4
         
-        if cut-9 < 0:
-            num_before_int = num[cut-8:cut][0]
-        else: num_before_int = num[cut-8] - num[cut-9]
-        num_diff_8 = np.append(num_before_int, np.diff(num[cut-8:cut]))
-        #print num_diff_8
-        
-        R4 = np.sum(num_diff_8[4:]) / np.sum(num_diff_8[0:4])
-        R4s.append(R4)
-        #print num_diff_8[0:4], num_diff_8[4:]
-        
-        #########
-        # doubling time
-        #########
-        DT = np.round(np.log(2) / popt[1],2)
-        #print DT#,  popt
-        DTs.append(DT)
-        #print popt, np.log(2) / popt[1]
-
-        print '%02d'%int(day_real[cut-1]) + '.' +  '%02d'%int(month[cut-1]), '%6.2f'%DT#, '%6.2f'%R4
-
-        #print("a =", popt[0], "+/-", pcov[0,0]**0.5)
-        #print("b =", popt[1], "+/-", pcov[1,1]**0.5)
-        #print("c =", popt[2], "+/-", pcov[2,2]**0.5)
+        fit_labels.append('Fit am ' + date_label(day[cut-1]) + '; VZ: ' + '%6.2f'%DT + ' d')
+    timer.lap('fit')
+    
+    ########
+    # plot fits (below the data points)
+    #########
+    # all fit curves evaluated at once, one row per fit
+    fits = np.exp(func(x[None, :], popts[:, 0, None], popts[:, 1, None]))
+    cols = plt.cm.viridis(30 + np.arange(len(data_points)) * (256 / max(len(data_points), 1)))
+    
+    figure.fit_fan.set_segments(np.stack(np.broadcast_arrays(x[None, :], fits), axis=-1))
+    figure.fit_fan.set_color(cols)
+    
+    # a legend entry for every fit
+    fit_handles = [Line2D([], [], color=c, label=l) for c, l in zip(cols, fit_labels)]
     
-        ##########
-        # plot
-        ##########
+    ########
+    # plot Beatmungsbedarf of the last fit
+    #########
+    for line in figure.ampel_lines:
+        line.set_visible(len(data_points) > 0)
+    
+    if len(data_points) > 0:
+        popt, pcov = popts[-1], pcovs[-1]
         
+        # Beatmungsampel
+        bedarf =  anteil_beatmung * np.exp(func(x, *popt))
         
-        ########
-        # plot fit
-        #########
-        day_label = 'Fit am ' + '%02d'%int(day_real[cut-1]) + '.' + '%02d'%int(month[cut-1]) + '; VZ: ' + '%6.2f'%DT + ' d'
-        ax[0].semilogy(x, np.exp(func(x, *popt)), '-', color=plt.cm.viridis(int(col)), 
-                     label=day_label)
+        figure.ampel_lines[0].set_data(x, bedarf)
+        figure.ampel_lines[1].set_data(x[(bedarf < geraet_max)],bedarf[(bedarf < geraet_max)])
+        figure.ampel_lines[2].set_data(x[bedarf < geraet_min],bedarf[bedarf < geraet_min])
+        for line in figure.ampel_lines[:3]:
+            line.set_label('Ampel (Beatmungsbedarf ca. ' + str(int(anteil_beatmung*100)) + '%)')
         
-        colapp.append(int(col))
-        col = col + 256 / len(data_points)         
-
-        ########
-        # plot Beatmungsbedarf        
-        #########
-        if cut == data_points[-1]:
-            
-            # Beatmungsampel
-            bedarf =  anteil_beatmung * np.exp(func(x, *popt))
-            
-            ax[0].semilogy(x, bedarf, 
-                         '-', lw=3, color=plt.cm.Reds(200), 
-                         label='Ampel (Beatmungsbedarf ca. ' + str(int(anteil_beatmung*100)) + '%)')
-            ax[0].semilogy(x[(bedarf < geraet_max)],bedarf[(bedarf < geraet_max)], 
-                         '-', lw=3, color=plt.cm.jet(180), 
-                         label='Ampel (Beatmungsbedarf ca. ' + str(int(anteil_beatmung*100)) + '%)')
-            ax[0].semilogy(x[bedarf < geraet_min],bedarf[bedarf < geraet_min], 
-                         '-', lw=3, color=plt.cm.Greens(200), 
-                         label='Ampel (Beatmungsbedarf ca. ' + str(int(anteil_beatmung*100)) + '%)')
-            
-            # Fehler
-            ax[0].semilogy(x, 0.05*np.exp(func(x, 
-                                 popt[0] - pcov[0,0]**0.5, 
-                                 popt[1] - pcov[1,1]**0.5)), 
-                                 #popt[2] - pcov[2,2]**0.5), 
-                         '--', color='k', alpha=0.5, label='Unsicherheiten')
-            ax[0].semilogy(x, 0.05*np.exp(func(x, 
-                                 popt[0] + pcov[0,0]**0.5, 
-                                 popt[1] + pcov[1,1]**0.5)), 
-                                 #popt[2] + pcov[2,2]**0.5), 
-                         '--', color='k', alpha=0.5)
+        # Fehler
+        figure.ampel_lines[3].set_data(x, 0.05*np.exp(func(x, 
+                             popt[0] - pcov[0,0]**0.5, 
+                             popt[1] - pcov[1,1]**0.5)))
+        figure.ampel_lines[4].set_data(x, 0.05*np.exp(func(x, 
+                             popt[0] + pcov[0,0]**0.5, 
+                             popt[1] + pcov[1,1]**0.5)))
     
     #print 'day now2', day
     
@@ -393,15 +3600,15 @@ def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None,
     ####
     # Beatmungs Kapazitaet
     #########
-    ax[0].plot([x[0], x[-1]], [geraet_min]*2, 'k:', label="Kapazitaet Beatmungsapparate")
-    ax[0].plot([x[0], x[-1]], [geraet_max]*2, 'k:')
+    figure.capacity_lines[0].set_ydata([np.nan if geraet_min is None else geraet_min]*2)
+    figure.capacity_lines[1].set_ydata([np.nan if geraet_max is None else geraet_max]*2)
     
     ####
     # gemeldete Fallzahlen
     #########
-    ax[0].semilogy(day, num, 'k+', label="COVID19 erkrankt")
-    ax[0].semilogy(day, num_tod, 'k*', label="davon verstorben")
-    ax[0].semilogy(day, num_gesund, 'ko', alpha=0.3, label="davon genesen")
+    figure.case_lines[0].set_data(day, num)
+    figure.case_lines[1].set_data(day, num_tod)
+    figure.case_lines[2].set_data(day, num_gesund)
     
     #print 'day now3', day
     
@@ -416,175 +3623,57 @@ def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None,
     # formating
     #############
     
-    from matplotlib.ticker import ScalarFormatter
-    for axis in [ax[0].xaxis, ax[0].yaxis]:
-        axis.set_major_formatter(ScalarFormatter())
-    
-    ax[0].grid(True, which="both")
-    ax[0].set_xticks(np.arange(14, day_max, 4))
-    ax[0].set_xticklabels(day_ticks)
-    
-    ax[0].text(13, 0.5, 'Mar')
-    ax[0].text(31, 0.5, 'Apr')
-    ax[0].text(31+30, 0.5, 'Mai')
-    ax[0].text(31+30+31, 0.5, 'Juni')
-    ax[0].text(31+30+31+30, 0.5, 'Juli')
-    
-    ax[0].annotate('Ausgangssperre', ha='center', xy=(21, ax[0].get_ylim()[0]), xytext=(21, 0.4), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[0].annotate('Ostern', ha='center', xy=(31+12, ax[0].get_ylim()[0]), xytext=(31+12, 0.4), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[0].annotate('Ende Ferien', ha='center', xy=(31+20, ax[0].get_ylim()[0]), xytext=(31+20, 0.4), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    
-    # credit bar
-    credit = 'Christine Greif\nhttp://www.usm.uni-muenchen.de/~koepferl\nThis work is licensed under CC-BY-SA 4.0\nData: NPGEO-DE; VZ = Verdopplungszeit'
-    loc_label = ax[0].get_xlim()[1] * 1.12
-    link = ax[0].text(loc_label, 9e4, credit, fontsize=8, va='top')
-    link.set_url('http://www.usm.uni-muenchen.de/~koepferl')
-    
-    # label
-    ax[0].set_ylabel('Gesamte Fallzahlen')
-    lgd = ax[0].legend(loc='best', bbox_to_anchor=(1.12, 0.93))
+    # legend in the order the lines are drawn
+    handles = fit_handles + [line for line in figure.ampel_lines if line.get_visible()] + figure.capacity_lines + figure.case_lines
+    handles = [line for line in handles if not line.get_label().startswith('_')]
+    # fixed places, loc='best' does not avoid collections (fit curves, daily bars)
+    lgd = ax[0].legend(handles=handles, loc='upper left', bbox_to_anchor=(1.12, 0.93))
     
     # percent
     #########
     EW_county = get_people_of_county(asked_ID=ID)
     
-    axi = ax[0].twinx()
-    
     #print 'lim', ax.get_ylim(), ax.get_ylim()[0] / EW_county * 100, ax.get_ylim()[1] / EW_county * 100, EW_county
-    axi.set_ylim(ax[0].get_ylim()[0] / EW_county * 100 , ax[0].get_ylim()[1] / EW_county * 100 )
-    axi.set_yscale('log')
-    import matplotlib.ticker as mtick
-    import matplotlib.ticker as ticker
-    axi.yaxis.set_major_formatter(ScalarFormatter())
-    axi.yaxis.set_major_formatter(ticker.FuncFormatter(lambda y,pos: ('{{:.{:1d}f}}%'.format(int(np.maximum(-np.log10(y),0)))).format(y)))
-    #axi.yaxis.set_major_formatter(FormatStrFormatter('%4d'))
-    #axi.yaxis.set_major_formatter(mtick.PercentFormatter())
-    axi.set_ylabel('Prozentualer Anteil zur Gesamteinwohnerzahl (' + str(EW_county) + ') im Kreis')
+    # no percent axis for counties without population numbers
+    figure.axi.set_visible(EW_county is not None)
+    if EW_county is not None:
+        figure.axi.set_ylim(ax[0].get_ylim()[0] / EW_county * 100 , ax[0].get_ylim()[1] / EW_county * 100 )
+        figure.axi.set_ylabel('Prozentualer Anteil zur Gesamteinwohnerzahl (' + str(EW_county) + ') im Kreis')
     
     ###########
     # plot 2
     ###########
-    pass_all = {'day': day, 'fall': np.append(num[0], np.diff(num)), 'gesund': np.append(num_gesund[0], np.diff(num_gesund)), 'tod': np.append(num_tod[0], np.diff(num_tod))}
-    
-    ax[1].set_ylabel('Taeglich gemeldete Fallzahlen')
+    pass_all = metrics['daily']
     
     # gemittelt ueber 7 Tage
-    all_smooth = np.zeros(shape = day[6:].shape)
-    tod_smooth = np.zeros(shape = day[6:].shape)
-    gesund_smooth = np.zeros(shape = day[6:].shape)
-
-    for z in range(7):
-        stop = -6+z
-        #print z, stop
-        if stop != 0:
-            all_smooth =  all_smooth + 1/7. * pass_all['fall'][z:stop]
-            tod_smooth = tod_smooth + 1/7. * pass_all['tod'][z:stop]
-            gesund_smooth = gesund_smooth + 1/7. * pass_all['gesund'][z:stop]
-        else:
-            all_smooth =  all_smooth + 1/7. * pass_all['fall'][z:]
-            tod_smooth = tod_smooth + 1/7. * pass_all['tod'][z:]
-            gesund_smooth = gesund_smooth + 1/7. * pass_all['gesund'][z:]
-            
-        
-    #all_smooth = 0.25 * (pass_all['fall'][0:-3] + pass_all['fall'][1:-2] + pass_all['fall'][2:-1] + pass_all['fall'][3:0])
-    #tod_smooth = 0.25 * (pass_all['tod'][0:-3] + pass_all['tod'][1:-2] + pass_all['tod'][2:-1] + pass_all['tod'][3:0])
-    #gesund_smooth = 0.25 * (pass_all['gesund'][0:-3] + pass_all['gesund'][1:-2] + pass_all['gesund'][2:-1] + pass_all['gesund'][3:0])
-    
-    ax[1].semilogy(day[6:], all_smooth, 'r-', label='neu erkrankt (7-Tagesmittel)')
-    ax[1].semilogy(day[6:], tod_smooth, 'k-', label='verstorben (7-Tagesmittel)')
-    ax[1].semilogy(day[6:], gesund_smooth, 'k-', alpha=0.3, label='genesen (7-Tagesmittel)')
+    figure.smooth_lines[0].set_data(day[6:], metrics['smooth']['fall'])
+    figure.smooth_lines[1].set_data(day[6:], metrics['smooth']['tod'])
+    figure.smooth_lines[2].set_data(day[6:], metrics['smooth']['gesund'])
     
     # box
-    import matplotlib.patches as patches
-    for b in range(len(day)):
-        if b == 0:
-            label_fall = "neu erkrankt"
-            label_gesund = 'genesen'
-            label_tod = 'verstorben'
-        else:
-            label_fall = None
-            label_gesund = None
-            label_tod = None
-        
-        
-        ax[1].add_patch(patches.Rectangle((day[b]-0.45,0.),0.9,pass_all['fall'][b],
-                                          linewidth=1,edgecolor='k',facecolor=plt.cm.jet(180), label=label_fall))           
-        ax[1].add_patch(patches.Rectangle((day[b]-0.45,0.),0.9,pass_all['gesund'][b],
-        linewidth=1,edgecolor='k',facecolor='None', label=label_gesund, hatch='////'))        
-        ax[1].add_patch(patches.Rectangle((day[b]-0.45,0.),0.9,pass_all['tod'][b],
-        linewidth=1,edgecolor='k',facecolor='w', label=label_tod))
-    
-    #h = ax[1].hist(pass_all['fall'], bins=np.append(day - 0.5, day[-1] + 0.5))
-    #print h
-    #print pass_all['fall']
-    #ax[1].hist(pass_all['tod'], bins=day)
-    #ax[1].hist(pass_all['gesund'], bins=day)
-    
-    from matplotlib.ticker import ScalarFormatter
-    for axis in [ax[1].xaxis, ax[1].yaxis]:
-        axis.set_major_formatter(ScalarFormatter())
-    
-    ax[1].set_axisbelow(True)
-    ax[1].grid(True, which="both")
-    ax[1].set_xticks(np.arange(14, day_max, 4))
-    ax[1].set_xticklabels(day_ticks)
-    
-    tx1 = ax[1].text(13, 0.3, 'Mar')
-    tx2 = ax[1].text(31, 0.3, 'Apr')
-    tx3 = ax[1].text(31+30, 0.3, 'Mai')
-    tx4 = ax[1].text(31+30+31, 0.3, 'Juni')
-    tx5 = ax[1].text(31+30+31+30, 0.3, 'Juli')
-    
-    ax[1].annotate('Ausgangssperre', ha='center', xy=(21, ax[1].get_ylim()[0]), xytext=(21, 0.2), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[1].annotate('Ostern', ha='center', xy=(31+12, ax[1].get_ylim()[0]), xytext=(31+12, 0.2), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[1].annotate('Ende Ferien', ha='center', xy=(31+20, ax[1].get_ylim()[0]), xytext=(31+20, 0.2), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-        
-    ax[1].legend(loc='best')
+    # one rectangle per day (corners counter-clockwise from the bottom left)
+    left, right = day - 0.45, day + 0.45
+    for bars, key in zip(figure.bars, ['fall', 'gesund', 'tod']):
+        bottom, top = np.zeros(len(day)), pass_all[key]
+        bars.set_verts(np.stack([np.column_stack([left, bottom]), np.column_stack([right, bottom]), 
+                                 np.column_stack([right, top]), np.column_stack([left, top])], axis=1))
+    
+    ax[1].legend(loc='upper right')
     
     ###########
     # plot 3
     ###########
-    ax[2].set_ylabel('Verdopplungszeiten in Tage')
-    ax[2].plot(ax[2].get_xlim(), [10,10], ':', lw =2, color='grey', label='VZ = 10') 
-    ax[2].plot(day[7:], np.array(DTs), 'k.-') 
-    
-    #from scipy.signal import find_peaks
-    #peaks, _ = find_peaks(np.array(DTs))
-    #print 'peaks', peaks
-    #ax[2].plot(peaks, np.array(DTs)[peaks], "Hb")
+    figure.DT_line.set_data(day[7:], np.array(DTs))
     
     #ax[2].plot(day[7:], np.gradient(DTs, day[7:]), 'ko-')
     diff = np.diff(DTs)
-    ax[2].plot(day[7:][1:][diff < 0], np.array(DTs)[1:][diff < 0], '^', color=plt.cm.Reds(200), label='Achtung: VZ faellt (!!!)') 
-    #ax[2].plot(day[7:][1:], diff, 'k^-')
-    
-    #print 'gradient', gradient
-    #print 'diff', np.diff(DTs)
-    
-    ax[2].grid(True, which="both")
-    ax[2].set_xticks(np.arange(14, day_max, 4))
-    ax[2].set_xticklabels(day_ticks)
+    figure.DT_falling.set_data(day[7:][1:][diff < 0], np.array(DTs)[1:][diff < 0])
+    figure.update_ylim(2)
     
-    ax[2].legend(loc='best')
-    offset = ax[2].get_ylim()[0] - (ax[2].get_ylim()[1] - ax[2].get_ylim()[0]) / 5.
-    tx1 = ax[2].text(13, offset, 'Mar')
-    tx2 = ax[2].text(31, offset, 'Apr')
-    tx3 = ax[2].text(31+30, offset, 'Mai')
-    tx4 = ax[2].text(31+30+31, offset, 'Juni')
-    tx5 = ax[2].text(31+30+31+30, offset, 'Juli')
-
-    ax[2].annotate('Lock-down', ha='center', xy=(21, ax[2].get_ylim()[0]), xytext=(21, offset), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[2].annotate('Ostern', ha='center', xy=(31+12, ax[2].get_ylim()[0]), xytext=(31+12, offset), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[2].annotate('Ende Ferien', ha='center', xy=(31+20, ax[2].get_ylim()[0]), xytext=(31+20, offset), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
+    # interval up to the top of the plot where it is unbounded
+    upper = np.minimum(DT_ci[:, 1], ax[2].get_ylim()[1])
+    figure.DT_band.set_verts([np.column_stack([np.append(day[7:], day[7:][::-1]), 
+                                               np.append(DT_ci[:, 0], upper[::-1])])] if len(DTs) else [])
     
     
     ###########
@@ -593,109 +3682,297 @@ def plot_corona(num_dic, day, month, name, ID, geraet_min=None, geraet_max=None,
     
     ########
     # Reproduction number for Rtime notification days (4 days interpoliert)
-    
-    minus8 = np.interp(day-8-1, day, num)
-    minus4 = np.interp(day-4-1, day, num)
-    minus_all = np.interp(np.arange(day[0], day[-1]), day, num)
-    #print day - 8 - 1
-    #print day
-    #print num
-    #print day - 4 - 1
-    
-    #for i in range(len(np.arange(day[0], day[-1]))):
-    #    print np.arange(day[0], day[-1])[i], minus_all[i]
-    
-    R_number_interp = (num - minus4) / (minus4 - minus8)
-    R_number_interp[day-8-1 < day[0]] = np.nan # before 1st case
-    R_number_interp[day-4-1 < day[0]] = np.nan # before 1st case
-    
-    
-    #for da in day:
-    #    if da-4 < day[0]:
-    #        new_minus4 = 0
-    #    else: new_minus4 = np.interp(da-4, day, num)
-    #    if da-8 < day[0]:
-    #        new_minus8 = 0
-    #    else:
-    #        new_minus8 = np.interp(da-8, day, num)
-    
-    ax[3].set_ylabel('Interpolierte Reproduktionszahl')
-    
-    ax[3].plot(ax[3].get_xlim(), [1,1], ':', lw =2, color='grey', label='R = 1') 
-    ax[3].plot(day, R_number_interp, 'k.-') 
-    ax[3].plot(day[R_number_interp >= 1], R_number_interp[R_number_interp >= 1], '^', color=plt.cm.Reds(200), label='Achtung: R > 1 (!!!)') 
-    
-    ax[3].grid(True, which="both")
-    ax[3].set_xticks(np.arange(14, day_max, 4))
-    ax[3].set_xticklabels(day_ticks)
-    ax[3].legend(loc='best')
-    
-    offset = ax[3].get_ylim()[0] - (ax[3].get_ylim()[1] - ax[3].get_ylim()[0]) / 5.
-    tx1 = ax[3].text(13, offset, 'Mar')
-    tx2 = ax[3].text(31, offset, 'Apr')
-    tx3 = ax[3].text(31+30, offset, 'Mai')
-    tx4 = ax[3].text(31+30+31, offset, 'Juni')
-    tx5 = ax[3].text(31+30+31+30, offset, 'Juli')
-    ax[3].annotate('Lock-down', ha='center', xy=(21, ax[3].get_ylim()[0]), xytext=(21, offset), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[3].annotate('Ostern', ha='center', xy=(31+12, ax[3].get_ylim()[0]), xytext=(31+12, offset), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-    ax[3].annotate('Ende Ferien', ha='center', xy=(31+20, ax[3].get_ylim()[0]), xytext=(31+20, offset), 
-                    arrowprops=dict(arrowstyle= '-|>', color='grey', lw=2, ls='-'), alpha=0.6)
-
-    ax[3].text(ax[3].get_xlim()[1] * 1.02, 
-               ax[3].get_ylim()[1] * 1.,
-               'zu Abb. 1: \nBei Kreisen mit sehr kurzen Verdopplungszeiten wird \nder Verlauf nicht/kaum flacher; mit sehr langen \nVerdopplungszeiten (wenigen Neuerkrankten) \nist der Verlauf fast horizontal. \n(Ziel: horizontale Linie).')
-    
-    ax[3].text(ax[3].get_xlim()[1] * 1.02, 
-               ax[3].get_ylim()[1] * 0.75, 
-               'zu Abb. 2: \nBalkendiagramm der taeglich gemeldeten Fallzahlen. \n(Ziel: keine gelben und weissen Balken.)'
-               )
-       
-    ax[3].text(ax[3].get_xlim()[1] * 1.02,
-               ax[3].get_ylim()[1] * 0.35, 
-               'zu Abb. 3: \nVerdopplungszahl gibt die Zeit an in der sich die \nFallzahlen verdoppeln. Verdopplungszeiten kleiner \nals 10 oder abnehmend sind bedenklich. \n(Ziel: keine verkuerzenden Verdopplungszeiten \nund viel groesser als 10).'
-               )
-    
-    ax[3].text(ax[3].get_xlim()[1] * 1.02, 
-               ax[3].get_ylim()[0], 
-               'zu Abb. 4: \nReproduktionszahl gibt die Anzahl der \nWeiteransteckungen durch einen Infizierten an. \nReproduktionszahl groesser als 1 ist bedenklich. \n(Ziel: Reproduktionszahl viel kleiner als 1).'
-               )
-    
-    fig.savefig('expert/' + name + '_expert.pdf', dpi=300, overwrite=True, bbox_inches='tight', bbox_extra_artists=(lgd, tx1, tx2, tx3, tx4, tx5))
-    
-    
-    ##################
-    # save plot ax[0]
-    ##################
-    
-    ax[1].remove()
-    ax[2].remove()
-    ax[3].remove()
-    #for a in ax:
-    #    print 'ax'
-    #fig.set_size_inches(10, 8)
-    #ax[0].set_aspect(aspect=0.5)
-    #fig.set_gridspec_kw({'height_ratios': [1, 0, 0, ]})
-    #fig.gridspec_kw({'height_ratios': [1]})
-    
-    #extent = ax[0].get_window_extent().transformed(fig.dpi_scale_trans.inverted())
-    # Pad the saved area by 10% in the x-direction and 20% in the y-direction
-    fig.savefig('plots/' + name + '.pdf', dpi=300, overwrite=True, bbox_extra_artists=(lgd, tx1, tx2, tx3, tx4, tx5), bbox_inches='tight')
+    R_number_interp = metrics['R_interp']
+    
+    figure.R_line.set_data(day, R_number_interp)
+    # no R during the first days (NaN)
+    high = np.isfinite(R_number_interp)
+    high[high] = R_number_interp[high] >= 1
+    figure.R_high.set_data(day[high], R_number_interp[high])
+    figure.update_ylim(3)
+    timer.lap('draw')
+    
+    figure.save(name)
+    if close:
+        plt.close(fig)
+    timer.lap('save')
                     
-    rates = {'death_rate': num_tod / num * 100, 
-             'recover_rate': num_gesund / num * 100, 
-             'ill_rate': (num - num_gesund - num_tod) / num * 100,
-              'day': day}
-              
+    return [name, day[7:], DTs, Ntot_today, Ntot_week, metrics['rates'], R4s, pass_all, DT_ci]
+
+##################################
+# Metrics Export (Kennzahlen)    #
+##################################
+
+def metrics_columns(metrics, incidence=None):
+    '''
+    Puts the metrics of many counties (``county_metrics``) into one table with a row per 
+    county and notification day. Values not defined on a day (e.g. the doubling time before 
+    the 8th day) are NaN.
+    
+    Input
+    =====
+    
+    metrics : dict
+            ``county_metrics`` of every county ID
+    
+    incidence : dict, default = None
+            7-day incidence of every county ID ({'day', 'fall', 'tod', 'gesund'} on calendar 
+            days in the March time frame), added as columns if given
+    
+    return
+    ======
+    
+    columns : dict of np.array
+            Columns of all rows, sorted by county and day, and the index of the counties 
+            ('county_ID', 'county_name', 'county_offset': first row of each county)
+    '''
+    import numpy as np
+    
+    def pad(values, n, start):
+        out = np.full(n, np.nan)
+        out[start:start + len(values)] = values
+        return out
+    
+    IDs = sorted(metrics)
+    parts = []
+    for ID in IDs:
+        m = metrics[ID]
+        n = len(m['day'])
+        popt, pcov = m['popt'].reshape(-1, 2), m['pcov'].reshape(-1, 2, 2)
+        
+        col = {'ID': np.array([ID] * n), 'date': m['date'], 'day': m['day']}
+        for key in ['fall', 'tod', 'gesund']:
+            col[key] = m[key]
+            col[key + '_daily'] = m['daily'][key]
+            col[key + '_7d_mean'] = pad(m['smooth'][key], n, 6)
+        
+        col['DT'] = pad(m['DT'], n, 7)
+        col['DT_low'] = pad(m['DT_ci'][:, 0], n, 7)
+        col['DT_high'] = pad(m['DT_ci'][:, 1], n, 7)
+        col['a'] = pad(popt[:, 0], n, 7)
+        col['b'] = pad(popt[:, 1], n, 7)
+        col['a_err'] = pad(pcov[:, 0, 0] ** 0.5, n, 7)
+        col['b_err'] = pad(pcov[:, 1, 1] ** 0.5, n, 7)
+        col['R4'] = pad(m['R4'], n, 7)
+        col['Ntot_week'] = pad(m['Ntot_week'], n, 7)
+        col['R_interp'] = m['R_interp']
+        for key in ['death_rate', 'recover_rate', 'ill_rate']:
+            col[key] = m['rates'][key]
+        
+        if incidence is not None:
+            inc = incidence[ID]
+            pos = np.searchsorted(inc['day'], m['day'])
+            for key, name in [('fall', 'incidence_7d'), ('tod', 'death_incidence_7d'), ('gesund', 'recovered_incidence_7d')]:
+                col[name] = inc[key][pos]
+        parts.append(col)
+    
+    lengths = [len(col['day']) for col in parts]
+    columns = {}
+    if parts:
+        for key in parts[0]:
+            columns[key] = np.concatenate([col[key] for col in parts])
+    columns['county_ID'] = np.array(IDs)
+    columns['county_name'] = np.array([metrics[ID]['name'] for ID in IDs])
+    columns['county_offset'] = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+    return columns
+
+
+def write_metrics(filename, metrics, incidence=None):
+    '''
+    Writes the metrics of all counties as columns of an (uncompressed) npz file, see 
+    ``metrics_columns`` and ``load_metrics``.
+    '''
+    import numpy as np
+    
+    np.savez(filename, **metrics_columns(metrics, incidence))
+
+
+def write_age_metrics(filename, metrics, IDs):
+    '''
+    Writes the metrics by age group of the counties ``IDs`` (``RKISnapshot.ages``) to an 
+    (uncompressed) npz file, with the IDs as 'county_ID'.
+    '''
+    import numpy as np
+    
+    np.savez(filename, county_ID=np.asarray(IDs), **metrics)
+
+
+def load_metrics(filename, ID=None):
+    '''
+    Reads the columns written by ``write_metrics``, all counties or only the rows of the 
+    county ``ID``.
+    '''
+    import numpy as np
+    
+    with np.load(filename) as f:
+        columns = dict((key, f[key]) for key in f.files)
+    
+    if ID is not None:
+        i = list(columns['county_ID']).index(ID)
+        rows = slice(columns['county_offset'][i], columns['county_offset'][i + 1])
+        columns = dict((key, value[rows]) for key, value in columns.items() if not key.startswith('county_'))
+    return columns
+
+##############################################################
+# Incremental Runs (nur geaenderte Landkreise neu zeichnen)  #
+##############################################################
+
+# digests and plot_corona results of the plotted counties, kept next to the plots
+PLOT_CACHE_DIR = '.cache_plots'
+
+# version of the plots and metrics of plot_corona, part of the digests:
+# increase it with every change of their appearance or computation
+PLOT_CACHE_VERSION = 1
+
+
+def county_digest(num_dic, day, month, name, ID, last_day=None, **params):
+    '''
+    SHA1 hash of everything the plots of a county depend on: the cumulative case numbers, 
+    the reporting days, the time axis, the plotting parameters (e.g. ``geraet_min``, 
+    ``geraet_max``, ``anteil_beatmung``) and ``PLOT_CACHE_VERSION``.
+    
+    Input
+    =====
+    
+    num_dic :  dictionary {'fall': array, 'tod':array, 'gesund': array}
+           Array of cumulative number of cases
+    
+    day, month : np.array
+           Day and month of the data points
+    
+    name : str
+            Name of specific region
+    
+    ID : str 
+            ID of county in Germany e.g. '09182' for LK Miesbach
+    
+    last_day : float, default = None
+            Last day of the snapshot (``last_day`` of ``CountyFigure``), the end of the time 
+            axis (``axis_day_max``) is part of the digest
+    
+    params : 
+            Keyword arguments passed to ``plot_corona``
+    
+    return
+    ======
+    
+    digest : str
+            Hexadecimal SHA1 hash
+    '''
+    import hashlib
+    import numpy as np
+    
+    sha1 = hashlib.sha1()
+    sha1.update(repr((PLOT_CACHE_VERSION, name, ID, None if last_day is None else axis_day_max(last_day), sorted(params.items()))))
+    for arr in [num_dic['fall'], num_dic['tod'], num_dic['gesund'], day, month]:
+        sha1.update(np.ascontiguousarray(arr, dtype=float).tostring())
+    return sha1.hexdigest()
+
+
+class PlotManifest(object):
+    '''
+    Manifest of the county digests (``manifest.json``) and the ``plot_corona`` results and 
+    ``county_metrics`` (one pickle file per county) of the last runs. Counties whose digest 
+    did not change need not be plotted or computed again; their results are taken from the 
+    manifest.
+    
+    Input
+    =====
+    
+    cache_dir : str, default = PLOT_CACHE_DIR
+            Directory of the manifest
+    '''
+    
+    def __init__(self, cache_dir=PLOT_CACHE_DIR):
+        import os
+        import json
+        
+        self.cache_dir = cache_dir
+        self.results = {}
+        
+        try:
+            with open(os.path.join(cache_dir, 'manifest.json')) as f:
+                self.digests = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.digests = {}
+    
+    def _result_file(self, ID):
+        import os
+        return os.path.join(self.cache_dir, ID + '.pkl')
+    
+    def is_current(self, ID, digest, outputs=()):
+        '''
+        True if the county was plotted with the same digest and its result and the 
+        files in ``outputs`` still exist.
+        '''
+        import os
+        
+        if self.digests.get(ID) != digest:
+            return False
+        return all([os.path.isfile(f) for f in (self._result_file(ID),) + tuple(outputs)])
     
-    return [name, day[7:], DTs, Ntot_today, Ntot_week, rates, R4s, pass_all]
+    def _load(self, ID):
+        import cPickle as pickle
+        
+        if ID not in self.results:
+            with open(self._result_file(ID), 'rb') as f:
+                self.results[ID] = pickle.load(f)
+        return self.results[ID]
+    
+    def get(self, ID):
+        '''
+        Result of ``plot_corona`` of the county.
+        '''
+        return self._load(ID)[0]
+    
+    def metrics(self, ID):
+        '''
+        ``county_metrics`` of the county stored with the result.
+        '''
+        return self._load(ID)[1]
+    
+    def put(self, ID, digest, result, metrics=None):
+        '''
+        Stores the result of ``plot_corona`` and the ``county_metrics`` of the county with 
+        its digest.
+        '''
+        import os
+        import tempfile
+        import cPickle as pickle
+        
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix='tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((result, metrics), f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self._result_file(ID))
+        
+        self.results[ID] = (result, metrics)
+        self.digests[ID] = digest
+    
+    def save(self):
+        '''
+        Writes the manifest.
+        '''
+        import os
+        import json
+        import tempfile
+        
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix='tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.digests, f, indent=1, sort_keys=True)
+        os.rename(tmp, os.path.join(self.cache_dir, 'manifest.json'))
+
 
 #####################################
 # Doubeling Time (Verdopplungszeit) #
 #####################################
 
-def plot_DT(DT, state, ncol=4, nrow=3):
+def plot_DT(DT, state, ncol=4, nrow=None, per_panel=8, writer=None, close=False, incidence=None):
     '''
     Plots day-dependent doubling time against time for the selected counties.
     
@@ -722,11 +3999,24 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     state : list
             output from load_RKI
     
-    ncol : int
-        Number of columns in plot (should not be changed for now.)
+    ncol : int, default = 4
+        Number of columns in plot
 
-    nrow : int
-        Number of rows in plot (should not be changed for now.)
+    nrow : int, default = None
+        Number of rows in plot (default: as many as needed for all counties)
+    
+    per_panel : int, default = 8
+        Number of counties per panel
+    
+    writer : PDFWriter, default = None
+        Output files, e.g. ``PreviewWriter`` (default: pdf files)
+    
+    close : bool, default = False
+        Close the figures after saving
+    
+    incidence : dict, default = None
+        7-day incidence {'day', 'fall', ...} of the counties of ``DT`` (see 
+        ``RKISnapshot.incidence``), default: no incidence plot
     
     returns
     =======
@@ -734,6 +4024,10 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     Saves diagram as PDF.
     
     '''
+    plt = _pyplot()
+    
+    timer = TRACE.timer(state[2])
+    
     ######################################
     # DT for state
     #######################
@@ -742,21 +4036,12 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     # move to March time frame
     #########
     
-    day_max = 150.
-    day_ticks = [14, 18, 22, 26, 30, 3, 7, 11, 15, 19, 23, 27, 1, 5, 9, 13, 17, 21, 25, 29, 2, 6, 10, 14, 18, 22, 26, 30, 3, 7, 11, 15, 19, 23, 27]
+    state_day = epoch_days(state[1])
     
-    dat_states = state[1]
-    
-    state_day = []
-    for i in range(len(dat_states)):
-        y, m, d = dat_states[i].split('/')
-        if m == '01': state_day.append(int(d) - 29 - 31)
-        if m == '02': state_day.append(int(d) - 29)
-        if m == '03': state_day.append(int(d))
-        if m == '04': state_day.append(int(d) + 31) 
-        if m == '05': state_day.append(int(d) + 31 + 30) 
-        if m == '06': state_day.append(int(d) + 31 + 30 + 31) 
-        if m == '07': state_day.append(int(d) + 31 + 30 + 31 + 30) 
+    # time axis long enough for the state and all counties
+    day_max = axis_day_max(max([state_day[-1]] + [DT[key][1][-1] for key in DT if len(DT[key][1])]))
+    ticks, tick_labels = day_ticks(day_max)
+    months, month_labels = month_ticks(day_max, names=MONTH_NAMES_DE_EN)
     
     #########
     # fit
@@ -770,13 +4055,12 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     
     # fit only when there are more than 8 data points and cases every day.
     data_points = range(8, len(state_day)+1)
-    state_day = np.array(state_day)
     state_num = np.array(state[0])
     DTs_state = []
     
-    from scipy.optimize import curve_fit
+    popts_state = rolling_loglinear_fit(state_day, np.log(state_num), window=8)[0]
     for cut in data_points:
-        popt, pcov = curve_fit(func, state_day[cut-8:cut], np.log(state_num[cut-8:cut]))
+        popt = popts_state[cut-8]
         
         #########
         # doubling time
@@ -784,15 +4068,22 @@ def plot_DT(DT, state, ncol=4, nrow=3):
         DT_state = np.round(np.log(2) / popt[1],2)
         DTs_state.append(DT_state)
 
-    fig, axs = plt.subplots(nrow, ncol, figsize=(28,21))
-    fig2, axs2 = plt.subplots(nrow, ncol, figsize=(28,21))
-    fig3, axs3 = plt.subplots(nrow, ncol, figsize=(28,21))
-    fig4, axs4 = plt.subplots(nrow, ncol, figsize=(28,21))
+    # enough panels for all counties
+    npanel = max(int(np.ceil(len(DT) / float(per_panel))), 1)
+    ncol = min(ncol, npanel)
+    if nrow is None:
+        nrow = int(np.ceil(npanel / float(ncol)))
+    
+    fig, axs = plt.subplots(nrow, ncol, figsize=(7*ncol,7*nrow), squeeze=False)
+    fig2, axs2 = plt.subplots(nrow, ncol, figsize=(7*ncol,7*nrow), squeeze=False)
+    fig3, axs3 = plt.subplots(nrow, ncol, figsize=(7*ncol,7*nrow), squeeze=False)
+    fig4, axs4 = plt.subplots(nrow, ncol, figsize=(7*ncol,7*nrow), squeeze=False)
+    fig5, axs5 = plt.subplots(nrow, ncol, figsize=(7*ncol,7*nrow), squeeze=False)
     plt.subplots_adjust(left=None, bottom=None, right=None, top=None, wspace=0.1, hspace=0.1)
-    axs[0,0].set_title('Entwicklung der Verdopplungszeiten auf Kreisebene')
-    axs[0,1].set_title('Evolution of the Doubeling Time for German Counties')
-    axs[0,2].set_title('Entwicklung der Verdopplungszeiten auf Kreisebene')
-    axs[0,3].set_title('Evolution of the Doubling Time for German Counties')
+    for j in range(ncol):
+        if j % 2 == 0: axs[0,j].set_title('Entwicklung der Verdopplungszeiten auf Kreisebene')
+        elif j == 1: axs[0,j].set_title('Evolution of the Doubeling Time for German Counties')
+        else: axs[0,j].set_title('Evolution of the Doubling Time for German Counties')
 
 
     
@@ -824,103 +4115,40 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     
     for i in range(len(sorted_keys)):
         
-        if i in range(0, 8): 
-            ax = axs[0,0]
-            ax2 = axs2[0,0]
-            ax3 = axs3[0,0]
-            ax4 = axs4[0,0]
-            line_col = 20 + 30 * (8 - i)
-
-        if i in range(8, 16): 
-            ax = axs[0,1]
-            ax2 = axs2[0,1]
-            ax3 = axs3[0,1]
-            ax4 = axs4[0,1]
-            line_col = 20 + 30 * (16 - i)
-
-        if i in range(16,24): 
-            ax = axs[0,2]
-            ax2 = axs2[0,2]
-            ax3 = axs3[0,2]
-            ax4 = axs4[0,2]
-            line_col = 20 + 30 * (24 - i)
-
-        if i in range(24,32): 
-            ax = axs[0,3]
-            ax2 = axs2[0,3]
-            ax3 = axs3[0,3]
-            ax4 = axs4[0,3]
-            line_col = 20 + 30 * (32 - i)
-
-        if i in range(32,40): 
-            ax = axs[1,0]
-            ax2 = axs2[1,0]
-            ax3 = axs3[1,0]
-            ax4 = axs4[1,0]
-            line_col = 20 + 30 * (40 - i)
-
-        if i in range(40,48): 
-            ax = axs[1,1]
-            ax2 = axs2[1,1]
-            ax3 = axs3[1,1]
-            ax4 = axs4[1,1]
-            line_col = 20 + 30 * (48 - i)
-
-        if i in range(48,56): 
-            ax = axs[1,2]
-            ax2 = axs2[1,2]
-            ax3 = axs3[1,2]
-            ax4 = axs4[1,2]
-            line_col = 20 + 30 * (56 - i)
-
-        if i in range(56,64): 
-            ax = axs[1,3]
-            ax2 = axs2[1,3]
-            ax3 = axs3[1,3]
-            ax4 = axs4[1,3]
-            line_col = 20 + 30 * (64 - i)
-
-        if i in range(64,72): 
-            ax = axs[2,0]
-            ax2 = axs2[2,0]
-            ax3 = axs3[2,0]
-            ax4 = axs4[2,0]
-            line_col = 20 + 30 * (72 - i)
-
-        if i in range(72,80): 
-            ax = axs[2,1]
-            ax2 = axs2[2,1]
-            ax3 = axs3[2,1]
-            ax4 = axs4[2,1]
-            line_col = 20 + 30 * (80 - i)
-
-        if i in range(80,88): 
-            ax = axs[2,2]
-            ax2 = axs2[2,2]
-            ax3 = axs3[2,2]
-            ax4 = axs4[2,2]
-            line_col = 20 + 30 * (88 - i)
-
-        if i in range(88,96): 
-            ax = axs[2,3]
-            ax2 = axs2[2,3]
-            ax3 = axs3[2,3]
-            ax4 = axs4[2,3]
-            line_col = 20 + 30 * (96 - i)
+        # panel of 8 counties
+        panel = i // per_panel
+        ax = axs.flat[panel]
+        ax2 = axs2.flat[panel]
+        ax3 = axs3.flat[panel]
+        ax4 = axs4.flat[panel]
+        ax5 = axs5.flat[panel]
+        line_col = 20 + 30 * (per_panel * (panel + 1) - i)
             
         key = sorted_keys[i]
-        if i in [0, 8 ,16, 24, 32, 40, 48, 56, 64, 72, 80, 88, 96]:
+        if i % per_panel == 0:
             ax.semilogy(state_day[7:], DTs_state, '.:k', label= state[2] + ' average')
             print '-' * 20
             print state[2], DTs_state[-1], int(state_day[7:][-1])
             print '-' * 20
         
         ax.semilogy(DT[key][1], DT[key][2], '.-', c = cmap(line_col), label=DT[key][0])
+        # bootstrap interval of the doubling times, if in the results (see ``bootstrap_DT``)
+        if len(DT[key]) > 8:
+            ax.fill_between(DT[key][1], DT[key][8][:, 0], np.minimum(DT[key][8][:, 1], 1e3), 
+                            color=cmap(line_col), alpha=0.15, lw=0)
         ax2.loglog(DT[key][3], DT[key][4], '.-', c = cmap(line_col), label=DT[key][0])
-        print DT[key][2][-1], int(DT[key][1][-1]), DT[key][0]
+        # no doubling time with less reported days than the 8-day window
+        if len(DT[key][2]):
+            print DT[key][2][-1], int(DT[key][1][-1]), DT[key][0]
+        else:
+            print 'no doubling time', DT[key][0]
         
         ax3.plot(DT[key][5]['day'], DT[key][5]['death_rate'], '*-', c = cmap(line_col), label=DT[key][0])
         ax4.plot(DT[key][1], DT[key][6], '.-', c = cmap(line_col), label=DT[key][0])
+        
+        # 7-day incidence (see ``RKISnapshot.incidence``)
+        if incidence is not None and key in incidence:
+            ax5.plot(incidence[key]['day'], incidence[key]['fall'], '.-', c = cmap(line_col), label=DT[key][0])
         #ax3.plot(DT[key][5]['day'], DT[key][5]['recover_rate'], 'o-', c = cmap(line_col), label=DT[key][0])
         #ax3.plot(DT[key][5]['day'], DT[key][5]['ill_rate'], 'x-', c = cmap(line_col), label=DT[key][0])
         
@@ -933,39 +4161,37 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     
     credit2 = 'Christine Greif\nhttp://www.usm.uni-muenchen.de/~koepferl\nThis work is licensed under CC-BY-SA 4.0\nData: NPGEO-DE'
     
-    link = axs[2,3].text(x_pos, 0.7, credit2, fontsize=8, va = 'top')    
-    link = axs3[2,3].text(x_pos, -2, credit2, fontsize=8)
-    link = axs4[2,3].text(x_pos, -1., credit2, fontsize=8)
-    link = axs2[2,3].text(3.5, 0.5, credit2, fontsize=8, va='top')
+    link = axs[-1,-1].text(x_pos, 0.7, credit2, fontsize=8, va = 'top')    
+    link = axs3[-1,-1].text(x_pos, -2, credit2, fontsize=8)
+    link = axs4[-1,-1].text(x_pos, -1., credit2, fontsize=8)
+    link = axs5[-1,-1].text(x_pos, 0., credit2, fontsize=8, va='top')
+    link = axs2[-1,-1].text(3.5, 0.5, credit2, fontsize=8, va='top')
     
     link.set_url('http://www.usm.uni-muenchen.de/~koepferl')
 
     
-    axs[0,0].set_ylabel('Verdopplungszeiten (Tage)')
-    axs[1,0].set_ylabel('Doubling Time DT (days)')
-    axs[2,0].set_ylabel('Verdopplungszeiten (Tage)')
+    for j in range(nrow):
+        if j % 2 == 0: axs[j,0].set_ylabel('Verdopplungszeiten (Tage)')
+        else: axs[j,0].set_ylabel('Doubling Time DT (days)')
 
     
     for ax in axs.reshape(-1):
         ax.set_ylim(1.5,500.9)
-        ax.set_xlim(13,day_max)
+        ax.set_xlim(AXIS_DAY_MIN, day_max)
     
         from matplotlib.ticker import ScalarFormatter
         for axis in [ax.xaxis, ax.yaxis]:
             axis.set_major_formatter(ScalarFormatter())
         ax.grid(True, which="both")
 
-        ax.set_xticks(np.arange(14, day_max, 4))
-        ax.set_xticklabels(day_ticks)
+        ax.set_xticks(ticks)
+        ax.set_xticklabels(tick_labels)
     
         ax.legend(loc='upper left')
     
         #if ax in [axs[2,0], axs[2,1], axs[2,2], axs[2,3]]:
-        ax.text(13, 0.8, 'Maerz/March')
-        ax.text(31, 0.8, 'April')
-        ax.text(31+30, 0.8, 'Mai/May')
-        ax.text(31+30+31, 0.8, 'Juni/June')
-        ax.text(31+30+31+30, 0.8, 'Juli/July')
+        for pos, label in zip(months, month_labels):
+            ax.text(pos, 0.8, label)
     
             
     for ax2 in axs2.reshape(-1):
@@ -979,20 +4205,20 @@ def plot_DT(DT, state, ncol=4, nrow=3):
         ax2.set_xlim(1.5,10000)
         ax2.legend(loc='upper left')
         
-        if ax2 in [axs2[2,0], axs2[2,1], axs2[2,2], axs2[2,3]]:
+        if ax2 in axs2[-1]:
             ax2.set_xlabel('Totale Fallzahlen (total number of cases)')
-        if ax2 in [axs2[0,0], axs2[1,0], axs2[2,0]]:
+        if ax2 in axs2[:,0]:
             ax2.set_ylabel('Fallzahlen in der letzten Woche (number of new cases last week)')
         
     for ax3 in axs3.reshape(-1):
         ax3.set_ylim(0,20.9)
-        ax3.set_xlim(13,day_max)
+        ax3.set_xlim(AXIS_DAY_MIN, day_max)
     
         ax3.grid(True, which="both")
-        ax3.set_xticks(np.arange(14, day_max, 4))
-        ax3.set_xticklabels(day_ticks)
+        ax3.set_xticks(ticks)
+        ax3.set_xticklabels(tick_labels)
         
-        if ax3 in [axs3[0,0], axs3[1,0], axs3[2,0]]:
+        if ax3 in axs3[:,0]:
             ax3.set_ylabel('Sterberaten in %')
         
     
@@ -1000,40 +4226,63 @@ def plot_DT(DT, state, ncol=4, nrow=3):
     
         #if ax in [axs[2,0], axs[2,1], axs[2,2], axs[2,3]]:
         offset3 = - 0.07 * ax3.get_ylim()[1]
-        ax3.text(13, offset3, 'Maerz/March')
-        ax3.text(31, offset3, 'April')
-        ax3.text(31+30, offset3, 'Mai/May')
-        ax3.text(31+30+31, offset3, 'Juni/June')
-        ax3.text(31+30+31+30, offset3, 'Juli/July')
+        for pos, label in zip(months, month_labels):
+            ax3.text(pos, offset3, label)
         
     
     for ax4 in axs4.reshape(-1):
         ax4.set_ylim(0,4.9)
-        ax4.set_xlim(13,day_max)
+        ax4.set_xlim(AXIS_DAY_MIN, day_max)
     
         ax4.grid(True, which="both")
-        ax4.set_xticks(np.arange(14, day_max, 4))
-        ax4.set_xticklabels(day_ticks)
+        ax4.set_xticks(ticks)
+        ax4.set_xticklabels(tick_labels)
     
         ax4.legend(loc='upper left')
     
         #if ax in [axs[2,0], axs[2,1], axs[2,2], axs[2,3]]:
         offset4 = - 0.07 * ax4.get_ylim()[1]
-        ax4.text(13, offset4, 'Maerz/March')
-        ax4.text(31, offset4, 'April')
-        ax4.text(31+30, offset4, 'Mai/May')
-        ax4.text(31+30+31, offset4, 'Juni/June')
-        ax4.text(31+30+31+30, offset4, 'Juli/July')
+        for pos, label in zip(months, month_labels):
+            ax4.text(pos, offset4, label)
         
-        if ax4 in [axs4[1,0]]:
+        if ax4 is axs4[nrow//2,0]:
             ax4.set_ylabel('geschaetzte Reproduktionszahl R (Anzahl letzten 4 Meldungen / Anzahl der letzten 4 Meldungen davor)')
         
     
+    for ax5 in axs5.reshape(-1):
+        ax5.axhline(50, color='r', ls='--', label='50 / 100.000')
+        ax5.axhline(35, color='orange', ls='--', label='35 / 100.000')
+        ax5.set_ylim(0, None)
+        ax5.set_xlim(AXIS_DAY_MIN, day_max)
+    
+        ax5.grid(True, which="both")
+        ax5.set_xticks(ticks)
+        ax5.set_xticklabels(tick_labels)
+    
+        ax5.legend(loc='upper left')
+    
+        offset5 = - 0.07 * ax5.get_ylim()[1]
+        for pos, label in zip(months, month_labels):
+            ax5.text(pos, offset5, label)
+        
+        if ax5 is axs5[nrow//2,0]:
+            ax5.set_ylabel('7-Tage-Inzidenz pro 100.000 Einwohner (7-day incidence per 100,000 inhabitants)')
+    
+    timer.lap('overview_draw')
+    
     #plt.show()
-    fig.savefig('DT_' + state[2] + '.pdf', dpi=300, overwrite=True, bbox_inches='tight')
-    fig2.savefig('loglog_' + state[2] + '.pdf', dpi=300, overwrite=True, bbox_inches='tight')
-    fig3.savefig('rate_' + state[2] + '.pdf', dpi=300, overwrite=True, bbox_inches='tight')    
-    fig4.savefig('R_' + state[2] + '.pdf', dpi=300, overwrite=True, bbox_inches='tight')    
+    if writer is None:
+        writer = PDFWriter()
+    writer.save(fig, 'DT_' + state[2], bbox_inches='tight')
+    writer.save(fig2, 'loglog_' + state[2], bbox_inches='tight')
+    writer.save(fig3, 'rate_' + state[2], bbox_inches='tight')
+    writer.save(fig4, 'R_' + state[2], bbox_inches='tight')
+    writer.save(fig5, 'incidence_' + state[2], bbox_inches='tight')
+    
+    if close:
+        for f in [fig, fig2, fig3, fig4, fig5]:
+            plt.close(f)
+    timer.lap('overview_save')
 
 def docu(LK_ID, DT):
     print '*' * 30
@@ -1046,6 +4295,9 @@ def docu(LK_ID, DT):
     for lkid in LK_ID:
         #print DT[lkid]
         #print DT[lkid][2]
+        # no doubling time with less reported days than the 8-day window
+        if not len(DT[lkid][2]):
+            continue
         DT_print.append(DT[lkid][2][-1])
         day_print.append(DT[lkid][1][-1])
         name_print.append(DT[lkid][0])
@@ -1066,10 +4318,8 @@ def docu(LK_ID, DT):
             print '    * 5 counties with highest DTs (the larger the better):'
 
         if (i < 5) or (i > len(name_print) - 6) :   
-            if day_print[i]-31 <= 30: #April
-                print '        *', '%6.2f'%DT_print[i], str(int(day_print[i]-31)) + '.4', name_print[i]
-            if day_print[i]-31 > 30: #Mai
-                print '        *', '%6.2f'%DT_print[i], str(int(day_print[i]-31 - 30)) + '.5', name_print[i]
+            date = epoch_dates(day_print[i]).astype(object)
+            print '        *', '%6.2f'%DT_print[i], '%d.%d' % (date.day, date.month), name_print[i]
 
     print '*' * 30
     print 'German Documentation'
@@ -1084,8 +4334,51 @@ def docu(LK_ID, DT):
             print '    * 5 Kreise mit den hoechsten Verdopplungszeiten (umso groesser desto besser):'
 
         if (i < 5) or (i > len(name_print) - 6) :   
-            if day_print[i]-31 <= 30: #April
-                print '        *', '%6.2f'%DT_print[i], str(int(day_print[i]-31)) + '.4', name_print[i]
-            if day_print[i]-31 > 30: #Mai
-                print '        *', '%6.2f'%DT_print[i], str(int(day_print[i]-31 - 30)) + '.5', name_print[i]
-        
\ No newline at end of file
+            date = epoch_dates(day_print[i]).astype(object)
+            print '        *', '%6.2f'%DT_print[i], '%d.%d' % (date.day, date.month), name_print[i]
+        
+
+
+def docu_ages(metrics, name):
+    '''
+    Prints the numbers of every age group on the last day (``age_metrics`` of one region).
+    '''
+    date = metrics['date'][-1].astype(object)
+    incidence = metrics.get('incidence_7d', np.full(metrics['fall'].shape, np.nan))
+    
+    print '+' * 30
+    print name, '%d.%d' % (date.day, date.month)
+    print 'Alter      Faelle    Tote  Sterberate(%)    DTs  Inzidenz'
+    for i, age in enumerate(metrics['age_group']):
+        print '%-10s %6d %7d %14.2f %6.2f %9.2f' % (age, metrics['fall'][-1, i], metrics['tod'][-1, i], 
+                                                  metrics['death_rate'][-1, i], metrics['DT'][-1, i], incidence[-1, i])
+
+
+def docu_changes(changes, name):
+    '''
+    Prints the new and retracted numbers since the previous Datenstand (``RKISnapshot.update``).
+    '''
+    new = changes['new'].sum(axis=(0, 1))
+    retracted = changes['retracted'].sum(axis=(0, 1))
+    
+    print '+' * 30
+    print name, 'Aenderungen zum Vortag'
+    print '              neu  zurueckgezogen  gesamt'
+    for k, field in enumerate(['Faelle', 'Tote', 'Genesene']):
+        print '%-10s %7d %15d %7d' % (field, new[k], retracted[k], new[k] + retracted[k])
+
+
+def docu_nowcast(nowcast, name):
+    '''
+    Prints the known and the corrected cases of the last days summed over all counties 
+    (``nowcast``).
+    '''
+    date = np.datetime64(nowcast['datenstand'], 'D').astype(object)
+    
+    print '+' * 30
+    print name, 'Nowcast (Meldeverzug), Datenstand', '%d.%d' % (date.day, date.month)
+    print 'Tag    gemeldet  Nowcast  (%d%%)' % round(nowcast['level'] * 100)
+    for i, day in enumerate(nowcast['days']):
+        day = day.astype(object)
+        print '%-6s %8d %8d  (%d - %d)' % ('%d.%d' % (day.day, day.month), nowcast['total_reported'][i], 
+                                            round(nowcast['total_nowcast'][i]), nowcast['total_low'][i], nowcast['total_high'][i])
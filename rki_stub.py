@@ -0,0 +1,289 @@
+'''
+Local stand-in for the feature service of the RKI database (NPGEO) to test the download
+offline.
+
+Replays a csv file of data_RKI like the query endpoint of the feature service: filters
+(where, e.g. IdBundesland=9), fields (outFields), order (orderByFields), pages
+(resultOffset, resultRecordCount, at most ``MAX_RECORD_COUNT`` rows) and counts
+(returnCountOnly), dates as milliseconds since 1970, over keep-alive connections, e.g.
+
+    python rki_stub.py --port 8080 --input data_RKI/RKI_COVID19_Bayern_2020-04-26.csv
+    python run.py --download http://localhost:8080/RKI_COVID19/FeatureServer/0/query
+
+The replayed file is in the April layout, so the download is written next to it as
+data_RKI/RKI_COVID19_Bayern_2020-04-26_download.csv (see ``download_RKI``).
+'''
+import argparse
+import BaseHTTPServer
+import calendar
+import csv
+import glob
+import json
+import os
+import re
+import SocketServer
+import threading
+import urlparse
+
+import numpy as np
+
+from cov19_local import read_datenstand
+
+# rows per query (maxRecordCount of the service)
+MAX_RECORD_COUNT = 5000
+
+# path of the query endpoint
+QUERY_PATH = '/RKI_COVID19/FeatureServer/0/query'
+
+# columns with object IDs, numbers and dates, all other columns are strings
+OBJECT_ID_FIELDS = ('ObjectId', 'FID')
+INTEGER_FIELDS = ('IdBundesland', 'AnzahlFall', 'AnzahlTodesfall', 'NeuerFall', 'NeuerTodesfall', 'NeuGenesen',
+                  'AnzahlGenesen', 'IstErkrankungsbeginn')
+DATE_FIELDS = ('Meldedatum', 'Refdatum')
+
+
+def latest_file(directory='data_RKI'):
+    '''
+    File of the RKI database with the latest Datenstand in ``directory``.
+    '''
+    files = glob.glob(os.path.join(directory, 'RKI_COVID19*.csv'))
+    if not files:
+        raise IOError('No files of the RKI database in ' + directory)
+    return max(files, key=read_datenstand)
+
+
+def read_features(filename):
+    '''
+    Rows of a csv file of the RKI database with the values of the service (numbers, dates
+    in milliseconds since 1970, unicode strings), ordered by the object ID.
+
+    return
+    ======
+
+    fields : list of dict {'name', 'type'}
+            Columns of the file
+
+    rows : list of tuple
+            Values of every row in the order of ``fields``
+
+    object_id : str
+            Column of the object ID
+    '''
+    with open(filename, 'rb') as f:
+        reader = csv.reader(f)
+        header = [name.replace('\xef\xbb\xbf', '') for name in next(reader)]
+        rows = list(reader)
+
+    object_id = [name for name in header if name in OBJECT_ID_FIELDS][0]
+    fields = []
+    for name in header:
+        if name == object_id:
+            kind = 'esriFieldTypeOID'
+        elif name in INTEGER_FIELDS:
+            kind = 'esriFieldTypeInteger'
+        elif name in DATE_FIELDS:
+            kind = 'esriFieldTypeDate'
+        else:
+            kind = 'esriFieldTypeString'
+        fields.append({'name': name, 'type': kind})
+
+    def value(name, text):
+        if name == object_id or name in INTEGER_FIELDS:
+            return int(text)
+        if name in DATE_FIELDS:
+            # 'YYYY/MM/DD hh:mm:ss' or 'YYYY-MM-DDThh:mm:ss.sssZ'
+            return calendar.timegm((int(text[:4]), int(text[5:7]), int(text[8:10]), 0, 0, 0)) * 1000
+        return text.decode('utf-8')
+
+    rows = [tuple(value(name, text) for name, text in zip(header, row)) for row in rows]
+    rows.sort(key=lambda row: row[header.index(object_id)])
+    return fields, rows, object_id
+
+
+def parse_where(where):
+    '''
+    Conditions of a where clause of equal comparisons joined by AND ('1=1' for all rows),
+    e.g. "IdBundesland=9 AND IdLandkreis='09182'".
+
+    return
+    ======
+
+    conditions : list of (field, value)
+    '''
+    conditions = []
+    for term in re.split(r'\s+and\s+', where.strip(), flags=re.IGNORECASE):
+        match = re.match(r"^\s*(\w+)\s*=\s*(?:'([^']*)'|(-?\d+))\s*$", term)
+        if match is None:
+            raise ValueError('Unsupported where clause ' + where)
+        field, text, number = match.groups()
+        if field == '1' and number == '1':
+            continue
+        conditions.append((field, text.decode('utf-8') if text is not None else int(number)))
+    return conditions
+
+
+class _QueryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # keep-alive connections (responses with Content-Length), every response sent at once
+    # (no delayed acknowledgement of small packets)
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        if url.path != QUERY_PATH:
+            self._send(404, {'error': {'code': 404, 'message': 'Not found: ' + url.path}})
+        elif self.server.fail():
+            self._send(503, {'error': {'code': 503, 'message': 'Service unavailable (simulated)'}})
+        else:
+            try:
+                result = self.server.query(dict(urlparse.parse_qsl(url.query)))
+            except (ValueError, KeyError) as error:
+                # errors of the service are returned with status 200
+                result = {'error': {'code': 400, 'message': 'Unable to perform query', 'details': [str(error)]}}
+            self._send(200, result)
+
+    def _send(self, status, result):
+        body = json.dumps(result)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class RKIStubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''
+    HTTP server answering queries of the feature service from a csv file of the RKI database
+    (one thread per connection).
+
+    Input
+    =====
+
+    filename : str
+            csv file of the RKI database (April or July 2020 layout)
+
+    address : (str, int), default = ('localhost', 0)
+            Host and port (0: any free port, see ``url``)
+
+    max_records : int, default = MAX_RECORD_COUNT
+            Rows per query
+
+    fail_rate : float, default = 0.
+            Share of the queries answered with HTTP 503 (test of retries and resume)
+
+    seed : int, default = 0
+            Seed of the failing queries
+
+    verbose : bool, default = False
+            Log every request
+    '''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, filename, address=('localhost', 0), max_records=MAX_RECORD_COUNT, fail_rate=0., seed=0,
+                 verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, _QueryHandler)
+        self.fields, self.rows, self.object_id = read_features(filename)
+        self.names = [field['name'] for field in self.fields]
+        self.max_records = max_records
+        self.fail_rate = fail_rate
+        self.verbose = verbose
+        self._random = np.random.RandomState(seed)
+        self._selected = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        '''
+        Query endpoint, e.g. for ``download_RKI``.
+        '''
+        return 'http://%s:%d%s' % (self.server_address[0], self.server_address[1], QUERY_PATH)
+
+    def fail(self):
+        with self._lock:
+            return self.fail_rate > 0 and self._random.uniform() < self.fail_rate
+
+    def column(self, field):
+        if field not in self.names:
+            raise KeyError('Unknown field ' + field)
+        return self.names.index(field)
+
+    def select(self, where, order):
+        '''
+        Rows of the where clause in the order of the field ``order`` (cached per query).
+        '''
+        key = (where, order)
+        with self._lock:
+            if key not in self._selected:
+                conditions = [(self.column(field), value) for field, value in parse_where(where)]
+                selected = [row for row in self.rows if all(row[i] == value for i, value in conditions)]
+                if order:
+                    field, direction = (order.split() + ['ASC'])[:2]
+                    i = self.column(field)
+                    selected.sort(key=lambda row: row[i], reverse=direction.upper() == 'DESC')
+                self._selected[key] = selected
+            return self._selected[key]
+
+    def query(self, params):
+        '''
+        Result of a query with the parameters ``params``.
+        '''
+        if params.get('f', 'json') != 'json':
+            raise ValueError('Only f=json is supported')
+        selected = self.select(params.get('where', '1=1'), params.get('orderByFields', ''))
+        if params.get('returnCountOnly', 'false').lower() == 'true':
+            return {'count': len(selected)}
+
+        offset = int(params.get('resultOffset', 0))
+        records = min(int(params.get('resultRecordCount', self.max_records)), self.max_records)
+        page = selected[offset:offset + records]
+
+        out_fields = params.get('outFields', '*')
+        columns = range(len(self.names))
+        if out_fields != '*':
+            columns = [self.column(name.strip()) for name in out_fields.split(',')]
+
+        return {'objectIdFieldName': self.object_id, 'fields': [self.fields[i] for i in columns],
+                'features': [{'attributes': dict((self.names[i], row[i]) for i in columns)} for row in page],
+                'exceededTransferLimit': offset + records < len(selected)}
+
+    def start(self):
+        '''
+        Serves in a background thread, returns the server.
+        '''
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the feature service of the RKI database.')
+    parser.add_argument('--input', '-i',
+                        help='csv file of the RKI database to replay (default: latest Datenstand in data_RKI)')
+    parser.add_argument('--host', default='localhost', help='host name (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=8080, help='port (default: %(default)s)')
+    parser.add_argument('--max-records', type=int, default=MAX_RECORD_COUNT,
+                        help='rows per query (default: %(default)s)')
+    parser.add_argument('--fail-rate', type=float, default=0.,
+                        help='share of the queries answered with HTTP 503 (default: %(default)s)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    server = RKIStubServer(args.input or latest_file(), (args.host, args.port), max_records=args.max_records,
+                           fail_rate=args.fail_rate, verbose=args.verbose)
+    print 'replaying %d rows at %s' % (len(server.rows), server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
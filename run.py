@@ -1,8 +1,17 @@
-from cov19_local import load_RKI, plot_corona, plot_DT, docu
+from cov19_local import (RKISnapshot, RKIArchive, ReportingTriangle, epoch_days, 
+                         RKI_SERVICE_URL, DOWNLOAD_THREADS, download_RKI, 
+                         CountyFigure, PlotManifest, PDFWriter, PreviewWriter, ReportWriter, 
+                         STATE_NAMES, TRACE, TRACE_ENV, BOOTSTRAP_RESAMPLES, NOWCAST_GROUPS, 
+                         county_digest, batch_county_metrics, write_metrics, write_age_metrics, 
+                         plot_corona, plot_DT, docu, docu_ages, docu_changes, docu_nowcast)
 
+import argparse
+import multiprocessing
+import os
 import numpy as np
 
 date = '2020-07-23'
+filename = 'data_RKI/RKI_COVID19_Bayern_' + date + '.csv'
 
 # County ID for Bavaria - Landkreis ID fuer Bayern
 LK_ID = np.array(['09771', '09171', '09371', '09571', '09671', '09772', '09672',
@@ -20,35 +29,357 @@ LK_ID = np.array(['09771', '09171', '09371', '09571', '09671', '09772', '09672',
        '09261', '09764', '09162', '09564', '09262', '09362', '09163',
        '09565', '09662', '09263', '09363', '09663'])
 
-# creating a dict for the doubleling time entries
-DT = {}
+# loaded snapshot, inherited by the worker processes
+snapshot = None
 
-# loop over all counties - Ausfuehren fuer alle Landkreise
-for lkid in LK_ID:
-    if True:#lkid == '09273':#x'09182':## # ## to check only one county - nur fuer einen Landkreis
-        
-        # load from specific csv file
-        num, day, month, name, LK_ids, state = load_RKI('data_RKI/RKI_COVID19_Bayern_' + date + '.csv', lkid, state_name='Bavaria')
-        #print 'fall  ', num['fall']
-        #print 'tod   ', num['tod']
-        #print 'gesund', num['gesund']
-        #print num, day
-        # specify capacity of intensive care for the individual counties - Beatmungskapazitaet
-
-        # Kapazitaet Beatmung Landkreis Miesbach
-        if lkid == '09182': kapazitaet = [14, 28]
-        else: kapazitaet = [None, None]
-        
-        # create plots for every county - Diagramme fuer alle Landkreise  
-        DT[lkid] = plot_corona(num, day, month, name=name, ID=lkid, 
-                               geraet_min=kapazitaet[0], geraet_max=kapazitaet[1], anteil_beatmung=0.05)
+# figure layout reused for all counties of a process
+county_figure = None
+
+# output files of the plots (pdf or previews)
+writer = PDFWriter()
+
+# report of every county (--report)
+report_of = {}
+
+# 7-day incidence of all counties, computed once per process
+county_incidence = None
+
+# bootstrap of the intervals of the doubling times (--resamples, --seed)
+bootstrap = {'resamples': BOOTSTRAP_RESAMPLES, 'seed': 0}
+
+def init_worker(filename, stream=False, state_ID=9, date=None, trace=False, output=None, resampling=None, previous=None, 
+                correction=None):
+    '''
+    Initialises a worker process. With fork the workers share the snapshot of the main 
+    process (copy-on-write), otherwise it is loaded memory-mapped from the binary cache.
+    '''
+    global snapshot, writer
+    TRACE.enabled = trace
+    if output is not None:
+        writer = output
+    if resampling is not None:
+        bootstrap.update(resampling)
+    # records copied from the main process by fork
+    TRACE.pop()
+    if snapshot is None:
+        if previous is not None:
+            snapshot = RKISnapshot(previous, stream=stream, state_ID=state_ID, date=date)
+            snapshot.update(filename)
+        else:
+            snapshot = RKISnapshot(filename, stream=stream, state_ID=state_ID, date=date)
+        # an inherited snapshot is already corrected
+        if correction is not None:
+            snapshot.correct(correction)
+
+def region_data(ID):
+    '''
+    Data of a county (5 digit ID) or of all counties of a state (2 digit ID) in the 
+    format of ``load_RKI``.
+    '''
+    if len(ID) == 2:
+        return snapshot.region(snapshot.state_counties(int(ID)), STATE_NAMES[int(ID)])
+    return snapshot.county(ID)
+
+def region_counties(IDs):
+    '''
+    County IDs of a list of counties (5 digit IDs) and states (2 digit IDs).
+    '''
+    return np.concatenate([snapshot.state_counties(int(ID)) if len(ID) == 2 else [ID] for ID in IDs])
+
+def region_incidence(ID):
+    '''
+    7-day incidence per 100,000 inhabitants of a county or state on every day of the snapshot 
+    (``plot_DT`` and ``write_metrics``). Computed on every run, it changes with the last day 
+    of the snapshot also for counties without new notifications.
+    '''
+    global county_incidence
+    if len(ID) == 2:
+        incidence = snapshot.incidence(snapshot.state_counties(int(ID)))
+    else:
+        if county_incidence is None:
+            county_incidence = snapshot.incidence()
+        incidence = county_incidence[snapshot.index(ID)]
+    
+    # days in the March time frame of plot_corona (1 = 1 March 2020)
+    day = epoch_days(snapshot.days)
+    return {'day': day, 'fall': incidence[:, 0], 'tod': incidence[:, 1], 'gesund': incidence[:, 2]}
 
-# doubeling time plot - Verdopplungszeitdiagramm
-plot_DT(DT, state)
+def county_params(lkid):
+    '''
+    Plotting parameters of a county passed to ``plot_corona``.
+    '''
+    # specify capacity of intensive care for the individual counties - Beatmungskapazitaet
 
-# print out for documentation
-docu(LK_ID, DT)
+    # Kapazitaet Beatmung Landkreis Miesbach
+    if lkid == '09182': kapazitaet = [14, 28]
+    else: kapazitaet = [None, None]
+    
+    return {'geraet_min': kapazitaet[0], 'geraet_max': kapazitaet[1], 'anteil_beatmung': 0.05, 
+            'resamples': bootstrap['resamples'], 'seed': bootstrap['seed']}
+
+def run_county(lkid, metrics=None):
+    '''
+    Creates the plots of one county and returns the output of ``plot_corona``. The 
+    ``metrics`` of the county (``batch_county_metrics``) are computed here if not given.
+    '''
+    global county_figure
+    if county_figure is None:
+        county_figure = CountyFigure(writer, last_day=epoch_days(snapshot.days[-1]))
+    if lkid in report_of:
+        writer.report = report_of[lkid]
+    
+    # select county from the loaded csv file
+    num, day, month, name, LK_ids, state = region_data(lkid)
+    #print 'fall  ', num['fall']
+    #print 'tod   ', num['tod']
+    #print 'gesund', num['gesund']
+    #print num, day
+    
+    # create plots for every county - Diagramme fuer alle Landkreise  
+    return plot_corona(num, day, month, name=name, ID=lkid, figure=county_figure, metrics=metrics, 
+                       **county_params(lkid))
+
+def run_county_traced(lkid_metrics):
+    '''
+    ``run_county`` of a county and its metrics returning also the trace records of the 
+    process (see ``StageTrace.pop``).
+    '''
+    return run_county(*lkid_metrics), TRACE.pop()
+
+def run_overview(DT_state):
+    '''
+    Creates the overview plots of the counties of one state (``plot_DT``) and returns the 
+    trace records of the process.
+    '''
+    DT, state, incidence = DT_state
+    if report_of:
+        writer.report = state[2]
+    plot_DT(DT, state, writer=writer, close=True, incidence=incidence)
+    return TRACE.pop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analysis of the COVID19 case numbers of the Bavarian (or all German) counties.')
+    parser.add_argument('--jobs', '-j', type=int, default=1, 
+                        help='number of processes creating the county plots (default: 1)')
+    parser.add_argument('--force', '-f', action='store_true', 
+                        help='plot all counties, also those whose data did not change')
+    parser.add_argument('--stream', action='store_true', 
+                        help='read the csv file in chunks, e.g. the nationwide RKI_COVID19.csv')
+    parser.add_argument('--input', '-i', default=filename, 
+                        help='csv file of the RKI or archive directory (default: %(default)s)')
+    parser.add_argument('--date', 
+                        help='Datenstand (YYYY-MM-DD) to plot if the input is an archive (default: latest)')
+    parser.add_argument('--download', nargs='?', const=RKI_SERVICE_URL, metavar='URL', 
+                        help='download the current file from the feature service of the RKI (default: %(const)s) '
+                             'to data_RKI and use it as input, interrupted downloads are resumed')
+    parser.add_argument('--download-threads', type=int, default=DOWNLOAD_THREADS, 
+                        help='parallel connections of the download (default: %(default)s)')
+    parser.add_argument('--archive', 
+                        help='add the csv file to this archive before plotting')
+    parser.add_argument('--previous', 
+                        help='csv file or archive of the previous Datenstand: read only the rows of the input '
+                             'changed since then (delta mode)')
+    parser.add_argument('--nowcast', nargs='+', metavar='HISTORY', 
+                        help='correct the last days for the reporting delay learnt from this archive or these csv '
+                             'files of earlier Datenstand')
+    parser.add_argument('--nowcast-by', choices=NOWCAST_GROUPS, default='state', 
+                        help='counties sharing one reporting delay (default: %(default)s)')
+    parser.add_argument('--nowcast-output', default='nowcast.npz', 
+                        help='npz file with the known and corrected cases of the last days (default: %(default)s)')
+    parser.add_argument('--germany', action='store_true', 
+                        help='all states and counties found in the csv file, with an overview per state and for Germany')
+    parser.add_argument('--trace', default=os.environ.get(TRACE_ENV), 
+                        help='record time and memory of every stage to this json or csv file '
+                             '(default: environment variable %s)' % TRACE_ENV)
+    parser.add_argument('--profile', metavar='ID', 
+                        help='run cProfile for this county and write profile_<ID>.prof')
+    parser.add_argument('--preview', nargs='?', const='preview', metavar='DIR', 
+                        help='write low resolution png files to this directory instead of the pdf files (default: preview)')
+    parser.add_argument('--preview-dpi', type=int, default=30, 
+                        help='resolution of the previews (default: %(default)s)')
+    parser.add_argument('--metrics', default='metrics.npz', 
+                        help='npz file with the metrics of all counties and days (default: %(default)s)')
+    parser.add_argument('--ages', default='ages.npz', 
+                        help='npz file with the metrics by age group of all counties and days (default: %(default)s)')
+    parser.add_argument('--report', nargs='?', const='.', metavar='DIR', 
+                        help='write one multi-page pdf per state (and one of the expert plots) to this directory '
+                             'instead of single files, all counties in one process')
+    parser.add_argument('--resamples', type=int, default=BOOTSTRAP_RESAMPLES, 
+                        help='bootstrap resamples per doubling time interval, 0 for none (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, 
+                        help='seed of the bootstrap (default: %(default)s)')
+    args = parser.parse_args()
+    filename = args.input
+    TRACE.enabled = bool(args.trace)
+    bootstrap.update(resamples=args.resamples, seed=args.seed)
+    if args.preview:
+        writer = PreviewWriter(args.preview, dpi=args.preview_dpi)
+    elif args.report:
+        writer = ReportWriter(args.report)
+    
+    # only the rows of Bavaria (IdBundesland 9) unless --germany
+    state_ID = None if args.germany else 9
+    
+    # download the current file - aktuelle Datei herunterladen
+    if args.download:
+        filename = download_RKI('data_RKI', url=args.download, state_ID=state_ID, threads=args.download_threads)
+    
+    # keep every file in the archive - Archiv der RKI Dateien
+    if args.archive:
+        RKIArchive(args.archive).add(filename)
+    
+    # read the csv file only once - Datei nur einmal einlesen
+    if args.previous:
+        # add only the changes - nur die Aenderungen zum Vortag
+        snapshot = RKISnapshot(args.previous, state_name='Germany' if args.germany else 'Bavaria', 
+                               stream=args.stream, state_ID=state_ID, date=args.date)
+        docu_changes(snapshot.update(filename), snapshot.state_name)
+    else:
+        snapshot = RKISnapshot(filename, state_name='Germany' if args.germany else 'Bavaria', 
+                               stream=args.stream, state_ID=state_ID, date=args.date)
+    
+    # reporting delay - Meldeverzug der letzten Tage
+    correction = None
+    if args.nowcast:
+        timer = TRACE.timer()
+        correction = snapshot.nowcast(ReportingTriangle(args.nowcast), by=args.nowcast_by, seed=args.seed)
+        np.savez(args.nowcast_output, **correction)
+        docu_nowcast(correction, snapshot.state_name)
+        snapshot.correct(correction)
+        timer.lap('nowcast')
+    
+    if args.germany:
+        # states and counties from the data - Bundeslaender und Kreise aus den Daten
+        overviews = [(snapshot.state_counties(sid), snapshot.aggregate(snapshot.state_counties(sid), STATE_NAMES[sid])) 
+                     for sid in snapshot.states()]
+        
+        # states as regions of the overview of Germany
+        state_regions = np.array(['%02d' % sid for sid in snapshot.states()])
+        overviews.append((state_regions, snapshot.state))
+        
+        run_ID = np.concatenate([ids for ids, state in overviews])
+    else:
+        # counties to run - nur fuer einzelne Landkreise z.B. ['09182']
+        run_ID = LK_ID
+        overviews = [(run_ID, snapshot.state)]
+    
+    # every report contains all of its counties - Bericht mit allen Landkreisen
+    if args.report:
+        for ids, state in overviews:
+            for lkid in ids:
+                report_of[lkid] = state[2]
+        args.force = True
+        args.jobs = 1
+    
+    # only counties with new data - nur Landkreise mit neuen Daten
+    timer = TRACE.timer()
+    # previews and reports are tracked separately from the pdf files
+    if args.preview or args.report:
+        manifest = PlotManifest(os.path.join(args.preview or args.report, '.cache_plots'))
+    else:
+        manifest = PlotManifest()
+    digests = {}
+    todo_ID = []
+    # time axis of the county plots (see run_county)
+    last_day = epoch_days(snapshot.days[-1])
+    for lkid in run_ID:
+        num, day, month, name = region_data(lkid)[:4]
+        digests[lkid] = county_digest(num, day, month, name, lkid, last_day=last_day, **county_params(lkid))
+        outputs = [writer.path('expert/' + name + '_expert')]
+        if writer.panel_files:
+            outputs.append(writer.path('plots/' + name))
+        if args.force or not manifest.is_current(lkid, digests[lkid], outputs):
+            todo_ID.append(lkid)
+    timer.lap('digest')
+    print 'plotting %d of %d counties' % (len(todo_ID), len(run_ID))
+    
+    # numbers of all counties to plot at once, the bootstrap in --jobs processes 
+    # Kennzahlen aller neu zu zeichnenden Landkreise
+    timer = TRACE.timer()
+    todo_metrics = dict(zip(todo_ID, batch_county_metrics([region_data(lkid)[:4] for lkid in todo_ID], jobs=args.jobs, 
+                                                          **bootstrap)))
+    timer.lap('county_metrics')
+    
+    # profile of a single county - Profil eines Landkreises
+    if args.profile:
+        import cProfile
+        import pstats
+        
+        profiler = cProfile.Profile()
+        result = profiler.runcall(run_county, args.profile, todo_metrics.get(args.profile))
+        profiler.dump_stats('profile_' + args.profile + '.prof')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+        
+        if args.profile in todo_ID:
+            todo_ID.remove(args.profile)
+            manifest.put(args.profile, digests[args.profile], result, todo_metrics[args.profile])
+    
+    # loop over all counties - Ausfuehren fuer alle Landkreise
+    pool = None
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(args.jobs, initializer=init_worker, 
+                                    initargs=(filename, args.stream, state_ID, args.date, TRACE.enabled, writer, bootstrap, 
+                                              args.previous, correction))
+    
+    if pool is not None and len(todo_ID) > 1:
+        results = pool.map(run_county_traced, [(lkid, todo_metrics[lkid]) for lkid in todo_ID], chunksize=1)
+    else:
+        results = [run_county_traced((lkid, todo_metrics[lkid])) for lkid in todo_ID]
+    
+    for lkid, (result, records) in zip(todo_ID, results):
+        manifest.put(lkid, digests[lkid], result, todo_metrics[lkid])
+        TRACE.extend(records)
+    manifest.save()
+    
+    # creating a dict for the doubleling time entries
+    DT = dict((lkid, manifest.get(lkid)) for lkid in run_ID)
+    
+    # 7-day incidence up to the last day, not cached - 7-Tage-Inzidenz
+    incidence = dict((lkid, region_incidence(lkid)) for lkid in run_ID)
+    
+    # metrics of all counties as columns, stored with the plots - Kennzahlen aller Landkreise
+    timer = TRACE.timer()
+    metrics = dict((lkid, manifest.metrics(lkid)) for lkid in run_ID)
+    write_metrics(args.metrics, metrics, incidence)
+    timer.lap('metrics')
+    
+    # age groups and sex of all counties - Altersgruppen und Geschlecht
+    write_age_metrics(args.ages, snapshot.ages(), snapshot.ID)
+    timer.lap('ages')
+    
+    # doubeling time plot - Verdopplungszeitdiagramm
+    DT_states = [(dict((lkid, DT[lkid]) for lkid in ids), state, dict((lkid, incidence[lkid]) for lkid in ids)) 
+                 for ids, state in overviews]
+    if pool is not None and len(DT_states) > 1:
+        records = pool.map(run_overview, DT_states, chunksize=1)
+    else:
+        records = [run_overview(DT_state) for DT_state in DT_states]
+    for r in records:
+        TRACE.extend(r)
+    
+    if pool is not None:
+        pool.close()
+        pool.join()
     
+    # print out for documentation
+    timer = TRACE.timer()
+    for ids, state in overviews:
+        if args.germany:
+            print '#' * 30
+            print state[2]
+        docu(ids, DT)
+        docu_ages(snapshot.ages(region_counties(ids)), state[2])
+    timer.lap('docu')
     
+    # table of contents sorted by the doubling time like docu
+    if args.report:
+        # counties without doubling time (less than 8 reported days) are listed first
+        writer.close(dict((DT[lkid][0], (DT[lkid][2][-1], '%6.2f d' % DT[lkid][2][-1])) 
+                          for lkid in run_ID if len(DT[lkid][2])))
     
-    
\ No newline at end of file
+    if args.trace:
+        TRACE.write(args.trace)
+        print '#' * 30
+        print 'stages (trace written to %s)' % args.trace
+        print TRACE.summary()
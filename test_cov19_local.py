@@ -0,0 +1,249 @@
+'''
+Tests of cov19_local with synthetic RKI files and random series, e.g.
+
+    python -m pytest -q test_cov19_local.py
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from cov19_local import RKISnapshot, RKIArchive, rolling_loglinear_fit, bootstrap_DT, window_statistics, _interval
+from benchmark import county_IDs, write_synthetic_RKI, write_synthetic_update
+
+
+class TestUpdate(unittest.TestCase):
+    '''
+    ``RKISnapshot.update`` with the file of the following Datenstand.
+    '''
+    rows, counties, days = 3000, 20, 60
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='test_RKI')
+        self.previous = os.path.join(self.workdir, 'RKI_COVID19_previous.csv')
+        self.next = os.path.join(self.workdir, 'RKI_COVID19_next.csv')
+        self.changes = os.path.join(self.workdir, 'RKI_COVID19_changes.csv')
+        write_synthetic_RKI(self.previous, self.rows, self.counties, self.days)
+        write_synthetic_update(self.next, self.rows, self.counties, self.days, new=0.05, retracted=0.02)
+        write_synthetic_update(self.changes, self.rows, self.counties, self.days, new=0.05, retracted=0.02,
+                               changes_only=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def assertSnapshotEqual(self, snapshot, full):
+        self.assertTrue(np.array_equal(snapshot.ID, full.ID))
+        self.assertTrue(np.array_equal(snapshot.days, full.days))
+        for name in ('cube', 'strata', 'rows'):
+            self.assertTrue(np.array_equal(getattr(snapshot, name), getattr(full, name)), name)
+
+    def test_complete_file(self):
+        for stream in (False, True):
+            snapshot = RKISnapshot(self.previous, state_name='Germany', stream=stream)
+            changes = snapshot.update(self.next)
+            self.assertFalse(changes['reread'])
+            self.assertSnapshotEqual(snapshot, RKISnapshot(self.next, state_name='Germany', stream=stream))
+
+    def test_changes_only(self):
+        for stream in (False, True):
+            snapshot = RKISnapshot(self.previous, state_name='Germany', stream=stream)
+            changes = snapshot.update(self.changes)
+            self.assertFalse(changes['reread'])
+            self.assertSnapshotEqual(snapshot, RKISnapshot(self.next, state_name='Germany', stream=stream))
+
+    def test_moved_case(self):
+        # unflagged correction of the county of a case: the whole file is read
+        with open(self.next) as f:
+            lines = f.readlines()
+        row = lines[1].split(',')
+        moved = [i for i in county_IDs(self.counties) if i != row[9]][0]
+        row[9] = moved
+        lines[1] = ','.join(row)
+        with open(self.next, 'w') as f:
+            f.writelines(lines)
+
+        snapshot = RKISnapshot(self.previous, state_name='Germany')
+        self.assertTrue(snapshot.update(self.next)['reread'])
+        self.assertSnapshotEqual(snapshot, RKISnapshot(self.next, state_name='Germany'))
+
+
+class TestArchive(unittest.TestCase):
+    '''
+    ``RKIArchive`` of consecutive synthetic files.
+    '''
+    rows, counties, days = 2000, 10, 40
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix='test_RKI')
+        self.files = [os.path.join(self.workdir, 'RKI_COVID19_%d.csv' % i) for i in range(3)]
+        write_synthetic_RKI(self.files[0], self.rows, self.counties, self.days)
+        write_synthetic_update(self.files[1], self.rows, self.counties, self.days)
+        write_synthetic_update(self.files[2], self.rows, self.counties, self.days, datenstand='28.04.2020, 00:00 Uhr',
+                               seed=1, new=0.05, retracted=0.01)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_row_index(self):
+        path = os.path.join(self.workdir, 'archive')
+        archive = RKIArchive(path)
+        for filename in self.files:
+            self.assertTrue(archive.add(filename))
+        self.assertFalse(archive.add(self.files[-1]))
+        for date, filename in zip(archive.dates(), self.files):
+            archived = RKISnapshot(path, state_name='Germany', date=date)
+            self.assertTrue(np.array_equal(archived.cube, RKISnapshot(filename, state_name='Germany').cube))
+
+        # archive without the row index (older version): rebuilt from the stored rows
+        rebuilt = RKIArchive(os.path.join(self.workdir, 'rebuilt'))
+        rebuilt.add(self.files[0])
+        os.remove(os.path.join(rebuilt.path, RKIArchive.ROW_INDEX))
+        for filename in self.files[1:]:
+            rebuilt.add(filename)
+        self.assertEqual(rebuilt.index, archive.index)
+        self.assertTrue(np.array_equal(rebuilt.counts(), archive.counts()))
+
+
+def random_series(rng, n, start=13):
+    '''
+    Notification days with gaps (days without cases) and cumulative case numbers of ``n``
+    notification days, as in ``plot_corona`` in the March time frame.
+    '''
+    day = start + np.cumsum(rng.randint(1, 4, n)).astype(float)
+    cum = np.cumsum(rng.poisson(rng.uniform(1, 30), n) + 1).astype(float)
+    return day, cum
+
+
+class TestRollingFit(unittest.TestCase):
+    '''
+    ``rolling_loglinear_fit`` against ``scipy.optimize.curve_fit`` of every window (the loop
+    of the original ``plot_corona``).
+    '''
+    def curve_fit_windows(self, x, y, window=8):
+        from scipy.optimize import curve_fit
+
+        def func(x, a, b):
+            return np.log(a) + b * x
+
+        fits = [curve_fit(func, x[cut - window:cut], y[cut - window:cut]) for cut in range(window, len(x) + 1)]
+        return np.array([popt for popt, pcov in fits]), np.array([pcov for popt, pcov in fits])
+
+    def test_irregular_days(self):
+        rng = np.random.RandomState(1)
+        for n in (8, 9, 30):
+            day, cum = random_series(rng, n)
+            popt, pcov = rolling_loglinear_fit(day, np.log(cum))
+            popt_ref, pcov_ref = self.curve_fit_windows(day, np.log(cum))
+            self.assertEqual(popt.shape, (n - 7, 2))
+            np.testing.assert_allclose(popt, popt_ref, rtol=1e-5)
+            np.testing.assert_allclose(pcov, pcov_ref, rtol=1e-3)
+
+    def test_padded_rows(self):
+        rng = np.random.RandomState(2)
+        lengths = [30, 8, 15, 7]
+        x = np.full((len(lengths), max(lengths)), np.nan)
+        y = np.full(x.shape, np.nan)
+        for i, n in enumerate(lengths):
+            x[i, :n], cum = random_series(rng, n)
+            y[i, :n] = np.log(cum)
+
+        popt, pcov = rolling_loglinear_fit(x, y)
+        self.assertEqual(popt.shape, (len(lengths), max(lengths) - 7, 2))
+        for i, n in enumerate(lengths):
+            fits = max(n - 7, 0)
+            self.assertTrue(np.isnan(popt[i, fits:]).all())
+            self.assertTrue(np.isnan(pcov[i, fits:]).all())
+            if fits:
+                popt_ref, pcov_ref = self.curve_fit_windows(x[i, :n], y[i, :n])
+                np.testing.assert_allclose(popt[i, :fits], popt_ref, rtol=1e-5)
+                np.testing.assert_allclose(pcov[i, :fits], pcov_ref, rtol=1e-3)
+
+
+def baseline_R4_week(num, day):
+    '''
+    ``R4s`` and ``Ntot_week`` of the loop over the fits of the original ``plot_corona``
+    (with true division).
+    '''
+    R4s, Ntot_week = [], []
+    for cut in range(8, len(day) + 1):
+        cond_week = day[cut-8:cut] > day[cut-1] - 7
+        num_week = num[cut-8:cut][cond_week]
+        Ntot_week.append(num_week[-1] - num_week[0])
+
+        if cut-9 < 0:
+            num_before_int = num[cut-8:cut][0]
+        else: num_before_int = num[cut-8] - num[cut-9]
+        num_diff_8 = np.append(num_before_int, np.diff(num[cut-8:cut]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            R4s.append(np.sum(num_diff_8[4:]) / np.sum(num_diff_8[0:4]))
+    return np.array(R4s), np.array(Ntot_week)
+
+
+class TestWindowStatistics(unittest.TestCase):
+    '''
+    ``window_statistics`` of a matrix of counties against the loop over the notification days
+    of the original ``plot_corona``.
+    '''
+    def test_baseline(self):
+        rng = np.random.RandomState(3)
+        lengths = [40, 8, 20, 12, 5]
+        day = np.full((len(lengths), max(lengths)), np.nan)
+        cum = np.full(day.shape, np.nan)
+        for i, n in enumerate(lengths):
+            day[i, :n], cum[i, :n] = random_series(rng, n)
+        # no new cases on 4 and more notification days: R4 without cases before
+        cum[0, 10:16] = cum[0, 9]
+        cum[0, 16:] += cum[0, 9] - cum[0, 16] + 5
+        cum[3, 1:] = cum[3, 0]
+
+        stats = window_statistics(cum, day)
+        zeros = 0
+        for i, n in enumerate(lengths):
+            R4s, Ntot_week = baseline_R4_week(cum[i, :n], day[i, :n])
+            R, increment = stats['R'][i, 7:n], stats['increment'][i, 7:n]
+
+            # undefined reproduction numbers are NaN instead of inf or nan
+            defined = np.isfinite(R4s)
+            zeros += (~defined).sum()
+            np.testing.assert_allclose(R[defined], R4s[defined], rtol=1e-12)
+            self.assertTrue(np.isnan(R[~defined]).all())
+            np.testing.assert_array_equal(increment, Ntot_week)
+            self.assertTrue(np.isnan(stats['R'][i, n:]).all())
+        self.assertTrue(zeros > 0)
+
+
+class TestBootstrap(unittest.TestCase):
+    '''
+    Percentile intervals and resampling of ``bootstrap_DT``.
+    '''
+    def test_interval(self):
+        rng = np.random.RandomState(4)
+        for n in (1, 2, 3, 5, 7, 10, 41, 2000):
+            values = rng.normal(size=(6, n))
+            # ties
+            values[0] = np.round(values[0])
+            for level in (0.5, 0.9, 0.95, 0.99):
+                ref = np.percentile(values, [50 * (1 - level), 50 * (1 + level)], axis=-1).T
+                np.testing.assert_allclose(_interval(values.copy(), level), ref, rtol=1e-12, atol=1e-14)
+
+    def test_jobs_and_block(self):
+        rng = np.random.RandomState(5)
+        lengths = [30, 8, 20, 5]
+        x = np.full((len(lengths), max(lengths)), np.nan)
+        y = np.full(x.shape, np.nan)
+        for i, n in enumerate(lengths):
+            x[i, :n], cum = random_series(rng, n)
+            y[i, :n] = np.log(cum)
+
+        DT_ci = bootstrap_DT(x, y, resamples=200)
+        self.assertEqual(DT_ci.shape, (len(lengths), max(lengths) - 7, 2))
+        for jobs, block in [(1, 1), (1, 7), (2, 3), (2, 512)]:
+            np.testing.assert_array_equal(bootstrap_DT(x, y, resamples=200, jobs=jobs, block=block), DT_ci)
+        # the same resamples for a single county
+        np.testing.assert_array_equal(bootstrap_DT(x[0], y[0], resamples=200), DT_ci[0])
+
+
+if __name__ == '__main__':
+    unittest.main()